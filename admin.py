@@ -1,12 +1,15 @@
-import base64
+import os
 import pandas as pd
 import streamlit as st
 import requests
 from datetime import date, datetime
 
 from utils import supa
+from pdf_zip import export_pdf_zip, safe_name, serve_once
+from plan_pdf import fetch_plan_pdf, pdf_memo, pdf_pool
 
 BUCKET_PLANS = "plans"
+ZIP_WORKERS = 4
 
 
 def today_iso() -> str:
@@ -32,8 +35,10 @@ def list_users_df() -> pd.DataFrame:
     return df
 
 
-def set_user_status(user_key: str, status: str, approved_by: str | None = None):
-    sb = supa()
+def set_users_status(user_keys: list[str], status: str, approved_by: str | None = None):
+    """Um só UPDATE para todos os utilizadores seleccionados."""
+    if not user_keys:
+        return
     payload = {"status": status}
 
     if status == "approved":
@@ -44,15 +49,28 @@ def set_user_status(user_key: str, status: str, approved_by: str | None = None):
         payload["approved_at"] = None
         payload["approved_by"] = None
 
-    sb.table("app_users").update(payload).eq("user_key", user_key).execute()
+    supa().table("app_users").update(payload).in_("user_key", list(user_keys)).execute()
+
+
+def set_user_status(user_key: str, status: str, approved_by: str | None = None):
+    set_users_status([user_key], status, approved_by=approved_by)
+
+
+def set_daily_limits(user_keys: list[str], daily_limit: int):
+    if user_keys:
+        supa().table("app_users").update({"daily_limit": int(daily_limit)}).in_("user_key", list(user_keys)).execute()
 
 
 def set_daily_limit(user_key: str, daily_limit: int):
-    supa().table("app_users").update({"daily_limit": int(daily_limit)}).eq("user_key", user_key).execute()
+    set_daily_limits([user_key], daily_limit)
 
 
-def delete_user(user_key: str):
-    supa().table("app_users").delete().eq("user_key", user_key).execute()
+def delete_user(user_key: str, delete_plans: bool = True):
+    # os PDFs no Storage (pdf_path) ficam na fila de limpeza (sql/007_storage_gc.sql, storage_gc.py)
+    sb = supa()
+    if delete_plans:
+        sb.table("user_plans").delete().eq("user_key", user_key).execute()
+    sb.table("app_users").delete().eq("user_key", user_key).execute()
 
 
 # -------------------------
@@ -70,24 +88,37 @@ def list_pending_requests_df() -> pd.DataFrame:
     return pd.DataFrame(r.data or [])
 
 
-def approve_request(req_id: int, user_key: str, processed_by: str):
+def process_requests(req_ids: list[int], approve: bool, processed_by: str) -> int:
+    """Aprova/rejeita vários pedidos numa só transacção (RPC process_access_requests,
+    sql/006_access_requests.sql). Sem a função: dois UPDATE em lote, sem atomicidade."""
+    if not req_ids:
+        return 0
     sb = supa()
-    sb.table("access_requests").update({
-        "status": "approved",
+    decision = "approved" if approve else "rejected"
+    try:
+        r = sb.rpc("process_access_requests", {
+            "p_ids": [int(x) for x in req_ids], "p_decision": decision, "p_by": processed_by,
+        }).execute()
+        return int(r.data or 0)
+    except Exception:
+        pass
+    r = sb.table("access_requests").update({
+        "status": decision,
         "processed_at": datetime.now().isoformat(),
         "processed_by": processed_by
-    }).eq("id", req_id).execute()
-    set_user_status(user_key, "approved", approved_by=processed_by)
+    }).in_("id", [int(x) for x in req_ids]).eq("status", "pending").execute()
+    done = r.data or []
+    set_users_status([x["user_key"] for x in done], "approved" if approve else "trial",
+                     approved_by=processed_by if approve else None)
+    return len(done)
+
+
+def approve_request(req_id: int, user_key: str, processed_by: str):
+    process_requests([req_id], True, processed_by)
 
 
 def reject_request(req_id: int, user_key: str, processed_by: str):
-    sb = supa()
-    sb.table("access_requests").update({
-        "status": "rejected",
-        "processed_at": datetime.now().isoformat(),
-        "processed_by": processed_by
-    }).eq("id", req_id).execute()
-    set_user_status(user_key, "trial")
+    process_requests([req_id], False, processed_by)
 
 
 # -------------------------
@@ -129,7 +160,7 @@ def list_plans_all_df() -> pd.DataFrame:
     sb = supa()
     r = (
         sb.table("user_plans")
-        .select("id,created_at,plan_day,disciplina,classe,tema,unidade,turma,user_key,pdf_path,pdf_b64")
+        .select("id,created_at,plan_day,disciplina,classe,tema,unidade,turma,user_key,pdf_path")
         .order("created_at", desc=True)
         .execute()
     )
@@ -141,11 +172,12 @@ def list_plans_all_df() -> pd.DataFrame:
     return df
 
 
-def get_plan_pdf_bytes_any(user_key: str, plan_id: int) -> bytes | None:
+def get_plan_pdf_bytes_any(user_key: str, plan_id: int, memo=None, pool=None) -> bytes | None:
+    # fora do thread do script (ZIP), memo e pool vêm já resolvidos
     sb = supa()
     r = (
         sb.table("user_plans")
-        .select("pdf_path,pdf_b64")
+        .select("pdf_path")
         .eq("user_key", user_key)
         .eq("id", plan_id)
         .limit(1)
@@ -155,7 +187,6 @@ def get_plan_pdf_bytes_any(user_key: str, plan_id: int) -> bytes | None:
         return None
 
     pdf_path = r.data[0].get("pdf_path")
-    pdf_b64 = r.data[0].get("pdf_b64")
 
     if pdf_path:
         signed = sb.storage.from_(BUCKET_PLANS).create_signed_url(pdf_path, 600)
@@ -165,13 +196,12 @@ def get_plan_pdf_bytes_any(user_key: str, plan_id: int) -> bytes | None:
             if resp.status_code == 200:
                 return resp.content
 
-    if pdf_b64:
-        try:
-            return base64.b64decode(pdf_b64)
-        except Exception:
-            return None
-
-    return None
+    # pdf_b64 (também de planos arquivados) ou, no modo on_demand, gerado de plan_json
+    try:
+        return fetch_plan_pdf(sb, plan_id, memo or pdf_memo(), pool or pdf_pool(), user_key=user_key,
+                              slot_wait_s=None if pool is None else pool.timeout_s)
+    except Exception:
+        return None
 
 
 # -------------------------
@@ -205,44 +235,56 @@ def admin_panel(admin_name: str = "Admin"):
 
             users = users.copy()
             users["label"] = users["name"].astype(str) + " — " + users["school"].astype(str) + " (" + users["status"].astype(str) + ")"
-            sel = st.selectbox("Selecionar utilizador", users["label"].tolist())
-            row = users[users["label"] == sel].iloc[0]
-            user_key = row["user_key"]
-
-            new_limit = st.number_input(
-                "Limite diário (trial)",
-                min_value=0,
-                max_value=50,
-                value=int(row.get("daily_limit", 2) or 2),
-                step=1,
-            )
-
+            labels = dict(zip(users["user_key"], users["label"]))
+
+            st.markdown("#### Estado / limite (vários)")
+            f1, f2 = st.columns(2)
+            with f1:
+                esc = st.selectbox("Escola", ["Todas"] + sorted(users["school"].dropna().astype(str).unique().tolist()), key="adm_u_esc")
+            with f2:
+                est = st.selectbox("Estado", ["Todos", "trial", "approved", "blocked"], key="adm_u_est")
+            vis = users
+            if esc != "Todas":
+                vis = vis[vis["school"].astype(str) == esc]
+            if est != "Todos":
+                vis = vis[vis["status"].astype(str) == est]
+            st.button(f"Seleccionar os {len(vis)} da lista", key="adm_u_all",
+                      on_click=lambda ks=vis["user_key"].tolist(): st.session_state.update({"adm_u_sel": ks}))
+            st.session_state["adm_u_sel"] = [k for k in st.session_state.get("adm_u_sel", []) if k in set(vis["user_key"])]
+            sel_keys = st.multiselect("Utilizadores", vis["user_key"].tolist(), format_func=labels.get, key="adm_u_sel")
+
+            new_limit = st.number_input("Limite diário (trial)", min_value=0, max_value=50, value=2, step=1)
+
+            n = len(sel_keys)
             c1, c2, c3, c4 = st.columns(4)
             with c1:
-                if st.button("✅ Aprovar", use_container_width=True):
-                    set_user_status(user_key, "approved", approved_by=admin_name)
-                    st.success("Aprovado.")
+                if st.button("✅ Aprovar", disabled=not n, use_container_width=True):
+                    set_users_status(sel_keys, "approved", approved_by=admin_name)
+                    st.success(f"{n} aprovado(s).")
                     st.rerun()
             with c2:
-                if st.button("↩️ Trial", use_container_width=True):
-                    set_user_status(user_key, "trial")
-                    st.success("Voltou para trial.")
+                if st.button("↩️ Trial", disabled=not n, use_container_width=True):
+                    set_users_status(sel_keys, "trial")
+                    st.success(f"{n} em trial.")
                     st.rerun()
             with c3:
-                if st.button("⛔ Bloquear", use_container_width=True):
-                    set_user_status(user_key, "blocked")
-                    st.success("Bloqueado.")
+                if st.button("⛔ Bloquear", disabled=not n, use_container_width=True):
+                    set_users_status(sel_keys, "blocked")
+                    st.success(f"{n} bloqueado(s).")
                     st.rerun()
             with c4:
-                if st.button("💾 Guardar limite", use_container_width=True):
-                    set_daily_limit(user_key, int(new_limit))
+                if st.button("💾 Guardar limite", disabled=not n, use_container_width=True):
+                    set_daily_limits(sel_keys, int(new_limit))
                     st.success("Limite actualizado.")
                     st.rerun()
 
             st.divider()
+            sel = st.selectbox("Selecionar utilizador (apagar)", users["label"].tolist())
+            user_key = users[users["label"] == sel].iloc[0]["user_key"]
+            del_plans = st.checkbox("Apagar também os planos deste utilizador", value=True)
             confirm = st.checkbox("Confirmo apagar utilizador (irreversível).")
             if st.button("🗑️ Apagar utilizador", disabled=not confirm, use_container_width=True):
-                delete_user(user_key)
+                delete_user(user_key, delete_plans=del_plans)
                 st.success("Utilizador apagado.")
                 st.rerun()
 
@@ -264,21 +306,22 @@ def admin_panel(admin_name: str = "Admin"):
             pending["label"] = pending["name"].astype(str) + " — " + pending["school"].astype(str) + " (ID " + pending["id"].astype(str) + ")"
             st.dataframe(pending[["id","name","school","created_at"]], hide_index=True, use_container_width=True)
 
-            sel = st.selectbox("Selecionar pedido", pending["label"].tolist())
-            row = pending[pending["label"] == sel].iloc[0]
-            req_id = int(row["id"])
-            user_key = row["user_key"]
+            labels = dict(zip(pending["id"].astype(int), pending["label"]))
+            st.button(f"Seleccionar todos ({len(pending)})", key="adm_req_all",
+                      on_click=lambda ids=list(labels): st.session_state.update({"adm_req_sel": ids}))
+            st.session_state["adm_req_sel"] = [i for i in st.session_state.get("adm_req_sel", []) if i in labels]
+            req_ids = st.multiselect("Pedidos", list(labels), format_func=labels.get, key="adm_req_sel")
 
             a, b = st.columns(2)
             with a:
-                if st.button("✅ Aprovar pedido", type="primary", use_container_width=True):
-                    approve_request(req_id, user_key, processed_by=admin_name)
-                    st.success("Pedido aprovado.")
+                if st.button("✅ Aprovar pedidos", type="primary", disabled=not req_ids, use_container_width=True):
+                    n = process_requests(req_ids, True, processed_by=admin_name)
+                    st.success(f"{n} pedido(s) aprovado(s).")
                     st.rerun()
             with b:
-                if st.button("❌ Rejeitar pedido", use_container_width=True):
-                    reject_request(req_id, user_key, processed_by=admin_name)
-                    st.success("Pedido rejeitado.")
+                if st.button("❌ Rejeitar pedidos", disabled=not req_ids, use_container_width=True):
+                    n = process_requests(req_ids, False, processed_by=admin_name)
+                    st.success(f"{n} pedido(s) rejeitado(s).")
                     st.rerun()
 
     # -------------------------
@@ -373,3 +416,38 @@ def admin_panel(admin_name: str = "Admin"):
                     mime="application/pdf",
                     use_container_width=True,
                 )
+
+        st.divider()
+        st.markdown("#### 📦 PDFs filtrados (ZIP)")
+        st.caption(f"{len(p)} plano(s) com os filtros acima.")
+        if st.button("📦 Gerar ZIP dos PDFs", disabled=p.empty, use_container_width=True):
+            items = [
+                {"id": int(r.id), "user_key": r.user_key,
+                 "nome": f"{r.plan_day}_{r.name}_{r.disciplina}_{r.classe}_{r.tema}"}
+                for r in p.itertuples(index=False)
+            ]
+            bar = st.progress(0.0, text="A juntar os PDFs...")
+            memo, pool = pdf_memo(), pdf_pool()  # resolvidos aqui: os fetch correm noutros threads
+            old = st.session_state.pop("adm_zip", None)
+            if old and old[1] and os.path.exists(old[1]):  # ZIP anterior nunca descarregado
+                os.remove(old[1])
+            nome = "_".join(x for x in [escola_f, nome_f] if x) or "todos"
+            dest = f"exports/{datetime.now().strftime('%Y%m%d-%H%M%S')}_{safe_name(nome, 40)}.zip"
+            url, path, stats = export_pdf_zip(
+                supa(), items, lambda it: get_plan_pdf_bytes_any(it["user_key"], it["id"], memo, pool), BUCKET_PLANS, dest,
+                workers=ZIP_WORKERS, on_progress=lambda i, n: bar.progress(i / n, text=f"{i}/{n} PDFs"),
+            )
+            st.session_state["adm_zip"] = (url, path, stats, dest.split("/")[-1])
+
+        got = st.session_state.get("adm_zip")
+        if got and not got[0] and not os.path.exists(got[1]):  # já descarregado (serve_once)
+            del st.session_state["adm_zip"]
+            got = None
+        if got:
+            url, path, stats, fname = got
+            st.caption(f"{stats['ok']} PDF(s), {stats['bytes'] / 1024 / 1024:.1f} MB · {len(stats['falhas'])} em falta")
+            if url:
+                st.link_button("⬇️ Baixar ZIP", url, type="primary", use_container_width=True)
+            else:
+                st.download_button("⬇️ Baixar ZIP", data=serve_once(path), file_name=fname, mime="application/zip",
+                                   use_container_width=True, key="adm_zip_dl")
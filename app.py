@@ -19,10 +19,14 @@
 # - Gestão de utilizadores: aprovar/bloquear/trial, limite diário (2/6), reset PIN, apagar utilizador
 # =========================================================
 
+import os
 import re
 import json
+import time
 import base64
 import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
 
 import streamlit as st
@@ -32,7 +36,20 @@ from supabase import create_client
 
 import google.generativeai as genai
 from pydantic import BaseModel, Field, ValidationError, conlist
-from fpdf import FPDF
+
+from plan_model import PlanoAula, TABLE_COLS, objetivos_alvo_por_duracao
+from pdf_render import PDF_TEMPLATE_VERSION
+from pdf_pool import PdfPoolBusy, PdfPoolTimeout
+from pdf_booklet import create_booklet
+from pdf_zip import export_pdf_zip, safe_name, serve_once
+from plan_archive import with_cold
+from plan_pdf import PDF_COMPACT, PDF_FONT_MODE, fetch_plan_pdf, pdf_memo, pdf_memo_key, pdf_pool
+from plan_html import plan_html
+from plan_thumb import iter_plan_jsons, render_plan_gallery
+from plan_catalog import CatalogSync
+from plan_export import FORMATOS, export_plans, iter_plan_pages, with_users
+from plan_cube import DIMS, cube_from_catalog, monthly_series, normalize_cube, rolling, slice_cube, year_over_year
+from offline_plan import gerar_plano_offline
 
 
 # =========================
@@ -59,13 +76,16 @@ REQ_SECRETS = [
     "SUPABASE_SERVICE_ROLE_KEY",
     "ADMIN_PASSWORD",
     "PIN_PEPPER",
-    "GOOGLE_API_KEY",
 ]
 missing = [k for k in REQ_SECRETS if k not in st.secrets]
 if missing:
     st.error(f"Faltam Secrets: {', '.join(missing)}")
     st.stop()
 
+# PDF_FONT_MODE / PDF_COMPACT: ver plan_pdf.py
+# "stored": guarda o PDF em pdf_b64; "on_demand": guarda só plan_json e gera o PDF ao descarregar
+PDF_STORAGE = st.secrets.get("PDF_STORAGE", "stored")
+
 # =========================
 # SUPABASE
 # =========================
@@ -224,13 +244,14 @@ def verify_login(name: str, pin: str):
         return None, "PIN inválido."
     return u, ""
 
-def set_user_status(user_key: str, status: str):
-    sb = supa()
-    sb.table("app_users").update({"status": status}).eq("user_key", user_key).execute()
+def set_users_status(user_keys: list[str], status: str):
+    # um só UPDATE para todos os seleccionados
+    if user_keys:
+        supa().table("app_users").update({"status": status}).in_("user_key", list(user_keys)).execute()
 
-def update_user_daily_limit(user_key: str, daily_limit: int):
-    sb = supa()
-    sb.table("app_users").update({"daily_limit": int(daily_limit)}).eq("user_key", user_key).execute()
+def update_users_daily_limit(user_keys: list[str], daily_limit: int):
+    if user_keys:
+        supa().table("app_users").update({"daily_limit": int(daily_limit)}).in_("user_key", list(user_keys)).execute()
 
 def list_users_df() -> pd.DataFrame:
     sb = supa()
@@ -248,6 +269,7 @@ def delete_user_and_data(user_key: str, delete_plans: bool = True):
     if delete_plans:
         sb.table("user_plans").delete().eq("user_key", user_key).execute()
     sb.table("app_users").delete().eq("user_key", user_key).execute()
+    catalog_sync().forget_user(user_key, plans=delete_plans)
 
 def update_last_login(user_key: str):
     try:
@@ -264,7 +286,7 @@ def list_plans_user(user_key: str) -> pd.DataFrame:
     r = (
         sb.table("user_plans")
         .select(
-            "id,created_at,plan_day,disciplina,classe,unidade,tema,turma,tipo_aula,duracao,metodos,meios,pdf_b64,upload_name,upload_type,upload_details,user_key"
+            "id,created_at,plan_day,disciplina,classe,unidade,tema,turma,tipo_aula,duracao,metodos,meios,upload_name,upload_type,upload_details,user_key"
         )
         .eq("user_key", user_key)
         .order("created_at", desc=True)
@@ -277,23 +299,6 @@ def list_plans_user(user_key: str) -> pd.DataFrame:
     df["plan_day"] = pd.to_datetime(df["plan_day"], errors="coerce").dt.date
     return df
 
-def list_plans_all() -> pd.DataFrame:
-    sb = supa()
-    r = (
-        sb.table("user_plans")
-        .select(
-            "id,created_at,plan_day,disciplina,classe,unidade,tema,turma,tipo_aula,duracao,metodos,meios,pdf_b64,upload_name,upload_type,upload_details,user_key"
-        )
-        .order("created_at", desc=True)
-        .execute()
-    )
-    df = pd.DataFrame(r.data or [])
-    if df.empty:
-        return df
-    df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce")
-    df["plan_day"] = pd.to_datetime(df["plan_day"], errors="coerce").dt.date
-    return df
-
 def count_plans_today(user_key: str) -> int:
     sb = supa()
     today = date.today().isoformat()
@@ -316,19 +321,69 @@ def tema_ja_existe(user_key: str, tema: str) -> bool:
 def delete_plan(plan_id: int):
     sb = supa()
     sb.table("user_plans").delete().eq("id", plan_id).execute()
+    catalog_sync().forget([plan_id])
+    load_cube.clear()
+
+@st.cache_resource
+def catalog_sync() -> CatalogSync:
+    # catálogo do administrador partilhado entre reruns/sessões; só lê o que mudou
+    return CatalogSync(supa())
+
+@st.cache_data(ttl=120)
+def monthly_report(ano: int, mes: int) -> tuple[pd.DataFrame, pd.DataFrame] | None:
+    """Relatório mensal calculado na base de dados (sql/004); None se as funções não existirem."""
+    sb = supa()
+    args = {"p_year": ano, "p_month": mes}
+    try:
+        rep = sb.rpc("report_month_escola", args).execute().data or []
+        rep_prof = sb.rpc("report_month_escola_prof", args).execute().data or []
+    except Exception:
+        return None
+    return (
+        pd.DataFrame(rep, columns=["escola","total_planos","professores_ativos","media_planos_por_prof","primeiro_plano","ultimo_plano"]),
+        pd.DataFrame(rep_prof, columns=["escola","professor","total_planos"]),
+    )
+
+def missing_relation(e: Exception) -> bool:
+    """Erro do PostgREST para tabela/função inexistente (sql/ ainda não aplicado)."""
+    code = str(getattr(e, "code", "") or "")
+    return code in ("42P01", "42883", "PGRST202", "PGRST205") or "does not exist" in str(e)
+
+@st.cache_data(ttl=120)
+def load_cube() -> pd.DataFrame | None:
+    """Tabela plan_cube (sql/005); None se não existir."""
+    sb = supa()
+    rows, start, page = [], 0, 1000
+    try:
+        while True:
+            # ordenado pela chave primária: sem ORDER BY, as páginas por offset não são estáveis
+            r = (
+                sb.table("plan_cube").select("mes,escola,disciplina,classe,tipo_aula,n_planos")
+                .order("mes").order("escola").order("disciplina").order("classe").order("tipo_aula")
+                .range(start, start + page - 1).execute()
+            )
+            rows.extend(r.data or [])
+            if len(r.data or []) < page:
+                break
+            start += page
+    except Exception as e:
+        if missing_relation(e):
+            return None
+        raise
+    return normalize_cube(pd.DataFrame(rows))
 
 def save_plan(
     user_key: str,
     ctx: dict,
     plano_json: dict,
-    pdf_bytes: bytes,
+    pdf_bytes: bytes | None,
     upload_name: str | None,
     upload_b64: str | None,
     upload_type: str | None,
     upload_details: str | None,
-):
+) -> int | None:
     sb = supa()
-    sb.table("user_plans").insert(
+    r = sb.table("user_plans").insert(
         {
             "user_key": user_key,
             "plan_day": ctx["plan_day"],  # dia de uso (hoje) para limite diário
@@ -342,14 +397,24 @@ def save_plan(
             "metodos": ctx.get("metodos", ""),
             "meios": ctx.get("meios", ""),
             "plan_json": plano_json,
-            "pdf_b64": base64.b64encode(pdf_bytes).decode("utf-8"),
+            "pdf_b64": base64.b64encode(pdf_bytes).decode("utf-8") if pdf_bytes else None,
+            "pdf_template_version": PDF_TEMPLATE_VERSION,
             "upload_name": upload_name,
             "upload_b64": upload_b64,
             "upload_type": upload_type,
             "upload_details": upload_details,
-            "created_at": datetime.now().isoformat(),
+            # created_at: default now() na base de dados (sql/009), marca de água do catálogo
         }
     ).execute()
+    load_cube.clear()
+    return r.data[0].get("id") if r.data else None
+
+def get_plan_json(plan_id: int) -> dict | None:
+    r = supa().table("user_plans").select("plan_json,archive_path").eq("id", plan_id).limit(1).execute()
+    if not r.data:
+        return None
+    pj = with_cold(supa(), r.data[0]).get("plan_json")
+    return json.loads(pj) if isinstance(pj, str) else pj
 
 def pdf_from_b64(b64: str) -> bytes | None:
     try:
@@ -361,13 +426,6 @@ def pdf_from_b64(b64: str) -> bytes | None:
 # =========================
 # PLANO (MODELO)
 # =========================
-class PlanoAula(BaseModel):
-    objetivo_geral: str
-    objetivos_especificos: list[str] = Field(min_length=1)
-    tabela: list[conlist(str, min_length=6, max_length=6)]
-
-TABLE_COLS = ["Tempo", "Função Didáctica", "Actividade do Professor", "Actividade do Aluno", "Métodos", "Meios"]
-
 def safe_extract_json(text: str) -> dict:
     text = (text or "").strip()
     try:
@@ -379,39 +437,15 @@ def safe_extract_json(text: str) -> dict:
             return json.loads(text[start:end + 1])
         raise
 
-def objetivos_alvo_por_duracao(duracao: str) -> int:
-    d = normalize_text(duracao)
-    if "45" in d:
-        return 3
-    return 5
-
-def build_prompt(ctx: dict, upload_hint: str) -> str:
-    n_obj = objetivos_alvo_por_duracao(ctx["duracao"])
-    return f"""
+# Parte fixa (igual em todos os pedidos): vai como system_instruction do modelo,
+# criada uma vez por modelo no registo Gemini. O pedido leva só os dados do plano.
+SYSTEM_INSTRUCTION_PLANO = """
 És um(a) pedagogo(a) especialista do Sistema Nacional de Educação de Moçambique.
 Escreve em Português de Moçambique. Devolve APENAS JSON válido.
 
-DADOS DO PLANO:
-- Escola: {ctx["escola"]}
-- Disciplina: {ctx["disciplina"]}
-- Classe: {ctx["classe"]}
-- Unidade Temática: {ctx["unidade"]}
-- Tema: {ctx["tema"]}
-- Turma: {ctx["turma"]}
-- Duração: {ctx["duracao"]}
-- Tipo de Aula: {ctx["tipo_aula"]}
-- Data: {ctx["data"]}
-
-OPCIONAL (se informado):
-- Métodos sugeridos: {ctx.get("metodos") or "-"}
-- Meios/Materiais sugeridos: {ctx.get("meios") or "-"}
-
-FICHEIRO (opcional):
-{upload_hint if upload_hint else "- (Sem ficheiro)"}
-
 REGRAS:
 1) Objectivo geral: 1 (um) apenas, frase clara e mensurável.
-2) Objectivos específicos: exactamente {n_obj} itens.
+2) Objectivos específicos: exactamente o número indicado nos dados do plano.
 3) Nos objectivos NÃO incluir nomes de localidades.
 4) Na tabela, NÃO mencionar nome do professor. Usar sempre expressões como:
    "Orienta...", "Explica...", "Demonstra...", "Solicita...", "Distribui...", "Acompanha...", "Regista...", "Avalia...".
@@ -425,7 +459,7 @@ REGRAS:
 8) Na última função incluir indicação de trabalho de casa com orientação clara.
 
 FORMATO JSON:
-{{
+{
   "objetivo_geral": "...",
   "objetivos_especificos": ["...","...","..."],
   "tabela": [
@@ -434,134 +468,435 @@ FORMATO JSON:
     ["15","Domínio e Consolidação","...","...","...","..."],
     ["5","Controlo e Avaliação","...","...","...","..."]
   ]
-}}
+}
 
 Garante que cada linha da tabela tem exactamente 6 células.
 """.strip()
 
+def build_prompt(ctx: dict, upload_hint: str) -> str:
+    n_obj = objetivos_alvo_por_duracao(ctx["duracao"])
+    return f"""
+DADOS DO PLANO:
+- Escola: {ctx["escola"]}
+- Disciplina: {ctx["disciplina"]}
+- Classe: {ctx["classe"]}
+- Unidade Temática: {ctx["unidade"]}
+- Tema: {ctx["tema"]}
+- Turma: {ctx["turma"]}
+- Duração: {ctx["duracao"]}
+- Tipo de Aula: {ctx["tipo_aula"]}
+- Data: {ctx["data"]}
+- Número de objectivos específicos: {n_obj}
+
+OPCIONAL (se informado):
+- Métodos sugeridos: {ctx.get("metodos") or "-"}
+- Meios/Materiais sugeridos: {ctx.get("meios") or "-"}
+
+FICHEIRO (opcional):
+{upload_hint if upload_hint else "- (Sem ficheiro)"}
+""".strip()
+
+class ObjectivoRegenerado(BaseModel):
+    objetivo: str = Field(min_length=1)
+
+class LinhaRegenerada(BaseModel):
+    linha: conlist(str, min_length=6, max_length=6)
+
+def _ctx_resumo(ctx: dict) -> str:
+    return f"""
+DADOS DO PLANO:
+- Disciplina: {ctx["disciplina"]}
+- Classe: {ctx["classe"]}
+- Unidade Temática: {ctx["unidade"]}
+- Tema: {ctx["tema"]}
+- Duração: {ctx["duracao"]}
+- Tipo de Aula: {ctx["tipo_aula"]}
+- Métodos sugeridos: {ctx.get("metodos") or "-"}
+- Meios/Materiais sugeridos: {ctx.get("meios") or "-"}
+""".strip()
+
+def build_prompt_objetivo(ctx: dict, plan: dict, idx: int) -> str:
+    oes = plan.get("objetivos_especificos", [])
+    outros = "\n".join(f"- {x}" for i, x in enumerate(oes) if i != idx and str(x).strip()) or "- (nenhum)"
+    return f"""
+És um(a) pedagogo(a) especialista do Sistema Nacional de Educação de Moçambique.
+Escreve em Português de Moçambique. Devolve APENAS JSON válido.
+
+{_ctx_resumo(ctx)}
+
+Objectivo geral: {plan.get("objetivo_geral") or "-"}
+
+Outros objectivos específicos (manter, não repetir):
+{outros}
+
+Objectivo a substituir: {oes[idx] if idx < len(oes) and str(oes[idx]).strip() else "-"}
+
+REGRAS:
+1) Escreve UM novo objectivo específico, claro e mensurável, diferente dos outros.
+2) NÃO incluir nomes de localidades.
+
+FORMATO JSON:
+{{"objetivo": "..."}}
+""".strip()
+
+def build_prompt_linha(ctx: dict, plan: dict, idx: int) -> str:
+    tabela = plan.get("tabela", [])
+    linha = list(tabela[idx]) if idx < len(tabela) else ["", "", "", "", "", ""]
+    outras = "\n".join(
+        f"- {r[1]} ({r[0]} min): Professor: {r[2]} | Aluno: {r[3]}"
+        for i, r in enumerate(tabela) if i != idx and len(r) == 6
+    ) or "- (nenhuma)"
+    return f"""
+És um(a) pedagogo(a) especialista do Sistema Nacional de Educação de Moçambique.
+Escreve em Português de Moçambique. Devolve APENAS JSON válido.
+
+{_ctx_resumo(ctx)}
+
+Objectivo geral: {plan.get("objetivo_geral") or "-"}
+
+Outras funções didácticas do plano (manter coerência):
+{outras}
+
+Linha a substituir (Tempo: {linha[0]}, Função Didáctica: {linha[1]}):
+{json.dumps(linha, ensure_ascii=False)}
+
+REGRAS:
+1) Reescreve APENAS esta linha, com 6 células na ordem: {", ".join(TABLE_COLS)}.
+2) Manter o mesmo Tempo e a mesma Função Didáctica.
+3) NÃO mencionar nome do professor. Usar expressões como "Orienta...", "Explica...", "Solicita...", "Acompanha...".
+
+FORMATO JSON:
+{{"linha": ["{linha[0]}","{linha[1]}","...","...","...","..."]}}
+""".strip()
+
+# regenerar é pedir outra resposta: chamada nova ao modelo, sem a cache de cached_generate
+def regenerate_objetivo(ctx: dict, plan: dict, idx: int) -> str:
+    raw_text, _ = generate_with_fallback(build_prompt_objetivo(ctx, plan, idx), gemini_registry().generate)
+    return ObjectivoRegenerado(**safe_extract_json(raw_text)).objetivo.strip()
+
+def regenerate_linha(ctx: dict, plan: dict, idx: int) -> list[str]:
+    raw_text, _ = generate_with_fallback(build_prompt_linha(ctx, plan, idx), gemini_registry().generate)
+    nova = [str(x).strip() for x in LinhaRegenerada(**safe_extract_json(raw_text)).linha]
+    atual = plan["tabela"][idx]
+    # Tempo e Função Didáctica ficam como estavam
+    nova[0], nova[1] = str(atual[0]), str(atual[1])
+    return nova
+
+# =========================
+# GEMINI (cliente partilhado pelo processo)
+# configure() uma vez, um GenerativeModel por modelo (reutiliza a ligação).
+# Criado na 1.ª geração (não no import: login e admin não dependem do Gemini) e
+# aquecido nessa altura com um pedido leve (count_tokens). Sem GOOGLE_API_KEY não há
+# aquecimento e as gerações falham logo (o modo automático usa o gerador local).
+# =========================
+GEMINI_MODELS = ["models/gemini-2.5-flash", "models/gemini-1.5-flash"]
+
+class GeminiRegistry:
+    def __init__(self, api_key: str | None):
+        self.api_key = api_key
+        if api_key:
+            genai.configure(api_key=api_key)
+        self._lock = threading.Lock()
+        self._models = {}
+        self.health = {}
+
+    def model(self, model_name: str, system_instruction: str | None = None):
+        with self._lock:
+            m = self._models.get((model_name, system_instruction))
+            if m is None:
+                m = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+                self._models[(model_name, system_instruction)] = m
+            return m
+
+    def generate(self, prompt: str, model_name: str, system_instruction: str | None = None) -> str:
+        if not self.api_key:
+            raise RuntimeError("GOOGLE_API_KEY em falta nos Secrets")
+        resp = self.model(model_name, system_instruction).generate_content(prompt)
+        return resp.text
+
+    def probe(self, model_name: str) -> dict:
+        t0 = time.time()
+        try:
+            self.model(model_name, SYSTEM_INSTRUCTION_PLANO).count_tokens("ok")
+            res = {"ok": True, "ms": int((time.time() - t0) * 1000), "erro": ""}
+        except Exception as e:
+            res = {"ok": False, "ms": int((time.time() - t0) * 1000), "erro": str(e)}
+        self.health[model_name] = res
+        return res
+
+    def warm(self):
+        for model_name in GEMINI_MODELS:
+            self.probe(model_name)
+
+@st.cache_resource
+def gemini_registry() -> GeminiRegistry:
+    reg = GeminiRegistry(st.secrets.get("GOOGLE_API_KEY"))
+    if reg.api_key:
+        threading.Thread(target=reg.warm, name="gemini_warm", daemon=True).start()
+    return reg
+
 @st.cache_data(ttl=3600)
-def cached_generate(prompt: str, model_name: str) -> str:
-    model = genai.GenerativeModel(model_name)
-    resp = model.generate_content(prompt)
-    return resp.text
+def cached_generate(prompt: str, model_name: str, system_instruction: str | None = None) -> str:
+    return gemini_registry().generate(prompt, model_name, system_instruction)
+
+def generate_with_fallback(prompt: str, generate=cached_generate, system_instruction: str | None = None) -> tuple[str, str]:
+    # tenta um modelo e fallback
+    try:
+        return generate(prompt, GEMINI_MODELS[0], system_instruction), GEMINI_MODELS[0].split("/")[-1]
+    except Exception:
+        return generate(prompt, GEMINI_MODELS[1], system_instruction), GEMINI_MODELS[1].split("/")[-1]
 
 
 # =========================
-# PDF (FPDF)
+# GERADOR LOCAL (sem rede)
+# Alternativa automática quando o Gemini falha, ou modo "Local" escolhido pelo professor.
 # =========================
-def clean_text(text) -> str:
-    if text is None:
-        return "-"
-    t = str(text).strip()
-    for k, v in {"–": "-", "—": "-", "“": '"', "”": '"', "‘": "'", "’": "'", "…": "...", "•": "-"}.items():
-        t = t.replace(k, v)
-    return " ".join(t.replace("\r", " ").replace("\n", " ").split())
-
-class PDF(FPDF):
-    def header(self):
-        self.set_font("Arial", "B", 12)
-        self.cell(0, 5, "REPÚBLICA DE MOÇAMBIQUE", 0, 1, "C")
-        self.set_font("Arial", "B", 10)
-        self.cell(0, 5, "GOVERNO DO DISTRITO", 0, 1, "C")
-        self.cell(0, 5, "SERVIÇO DISTRITAL DE EDUCAÇÃO, JUVENTUDE E TECNOLOGIA", 0, 1, "C")
-        self.ln(5)
-        self.set_font("Arial", "B", 14)
-        self.cell(0, 10, "PLANO DE AULA", 0, 1, "C")
-        self.ln(2)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font("Arial", "I", 7)
-        self.cell(0, 10, "SDEJT - Documento para validação e uso em sala de aula", 0, 0, "C")
-
-    def draw_table_header(self, widths):
-        headers = ["TEMPO", "F. DIDÁTICA", "ACTIV. PROFESSOR", "ACTIV. ALUNO", "MÉTODOS", "MEIOS"]
-        self.set_font("Arial", "B", 7)
-        self.set_fill_color(220, 220, 220)
-        for i, h in enumerate(headers):
-            self.cell(widths[i], 6, h, 1, 0, "C", True)
-        self.ln()
-
-    def table_row(self, data, widths):
-        row = [clean_text(x) for x in data]
-        self.set_font("Arial", "", 8)
-        max_lines = 1
-        for i, txt in enumerate(row):
-            lines = self.multi_cell(widths[i], 4, txt, split_only=True)
-            max_lines = max(max_lines, len(lines))
-        height = max_lines * 4 + 4
-
-        if self.get_y() + height > 270:
-            self.add_page()
-            self.draw_table_header(widths)
-
-        x0 = 10
-        y0 = self.get_y()
-        x = x0
-        for i, txt in enumerate(row):
-            self.set_xy(x, y0)
-            self.multi_cell(widths[i], 4, txt, border=0, align="L")
-            x += widths[i]
-
-        x = x0
-        for w in widths:
-            self.rect(x, y0, w, height)
-            x += w
-
-        self.set_y(y0 + height)
-
-def create_pdf(ctx: dict, plano: PlanoAula) -> bytes:
-    pdf = PDF()
-    pdf.set_auto_page_break(auto=False)
-    pdf.add_page()
-
-    pdf.set_font("Arial", "", 10)
-    pdf.cell(130, 7, f"Escola: {clean_text(ctx['escola'])}", 0, 0)
-    pdf.cell(0, 7, f"Data: {clean_text(ctx['data'])}", 0, 1)
-
-    pdf.cell(
-        0, 7,
-        f"Disciplina: {clean_text(ctx['disciplina'])}   Classe: {clean_text(ctx['classe'])}   Turma: {clean_text(ctx['turma'])}",
-        0, 1
-    )
-    pdf.cell(0, 7, f"Unidade Temática: {clean_text(ctx['unidade'])}", 0, 1)
-    pdf.set_font("Arial", "B", 10)
-    pdf.cell(0, 7, f"Tema: {clean_text(ctx['tema'])}", 0, 1)
+MODO_AUTO = "Gemini (com alternativa local)"
+MODO_GEMINI = "Só Gemini"
+MODO_LOCAL = "Local (sem internet)"
+MODOS_GERACAO = [MODO_AUTO, MODO_GEMINI, MODO_LOCAL]
+
+@st.cache_data(ttl=600)
+def list_curriculum_snippets_for(disciplina: str, classe: str) -> list[dict]:
+    try:
+        r = (
+            supa().table("curriculum_snippets")
+            .select("unidade,tema,snippet")
+            .eq("disciplina", disciplina.strip())
+            .eq("classe", classe.strip())
+            .order("created_at", desc=True)
+            .execute()
+        )
+        return r.data or []
+    except Exception:
+        # tabela opcional / sem rede
+        return []
+
+
+# =========================
+# GERAÇÃO ANTECIPADA (opcional)
+# Quando o formulário fica estável (o prompt inteiro), gera em background, uma de cada
+# vez por utilizador. O resultado fica guardado pelo prompt exacto; o clique em "Gerar
+# plano" usa-o se coincidir. Não conta para o daily_limit (o limite conta planos
+# guardados), mas tem tecto próprio por utilizador/dia, na base de dados (sql/010).
+# =========================
+SPEC_DEBOUNCE_S = 4
+SPEC_MAX_PER_DAY = 10
+SPEC_TTL_S = 3600
+SPEC_WAIT_S = 90
+
+@st.cache_resource
+def spec_store() -> dict:
+    return {"lock": threading.Lock(), "jobs": {}, "starting": set()}
+
+@st.cache_resource
+def spec_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="spec_gen")
+
+def spec_key(user_key: str, prompt: str) -> str:
+    return hashlib.sha256((user_key + "|" + prompt).encode("utf-8")).hexdigest()
+
+def spec_take_quota(user_key: str) -> bool:
+    # tecto por utilizador/dia na base de dados (sql/010): vale para todos os processos e
+    # sobrevive a reinícios; sem a função, não há pré-geração
+    try:
+        return bool(supa().rpc("spec_usage_take", {"p_user_key": user_key, "p_max": SPEC_MAX_PER_DAY}).execute().data)
+    except Exception:
+        return False
+
+def spec_submit(user_key: str, prompt: str) -> bool:
+    store = spec_store()
+    key = spec_key(user_key, prompt)
+    now = time.time()
+    with store["lock"]:
+        for k in [k for k, j in store["jobs"].items() if now - j["created"] > SPEC_TTL_S]:
+            store["jobs"].pop(k, None)
+        if key in store["jobs"]:
+            return False
+        # uma pré-geração de cada vez por utilizador
+        if user_key in store["starting"] or any(
+            j["user_key"] == user_key and not j["future"].done() for j in store["jobs"].values()
+        ):
+            return False
+        store["starting"].add(user_key)
+    try:
+        if not spec_take_quota(user_key):
+            return False
+        # fora do thread do script: usa o registo directamente (sem st.cache_data)
+        fut = spec_executor().submit(generate_with_fallback, prompt, gemini_registry().generate, SYSTEM_INSTRUCTION_PLANO)
+        with store["lock"]:
+            store["jobs"][key] = {"future": fut, "created": now, "user_key": user_key}
+        return True
+    finally:
+        with store["lock"]:
+            store["starting"].discard(user_key)
+
+def spec_take(user_key: str, prompt: str) -> tuple[str, str] | None:
+    """Devolve (texto, modelo) da geração antecipada para este prompt, se existir e tiver sucesso."""
+    store = spec_store()
+    key = spec_key(user_key, prompt)
+    with store["lock"]:
+        job = store["jobs"].pop(key, None)
+    if not job or time.time() - job["created"] > SPEC_TTL_S:
+        return None
+    try:
+        return job["future"].result(timeout=SPEC_WAIT_S)
+    except Exception:
+        return None
 
-    pdf.set_font("Arial", "", 10)
-    pdf.cell(0, 7, f"Duração: {clean_text(ctx['duracao'])}   Tipo: {clean_text(ctx['tipo_aula'])}", 0, 1)
+def spec_maybe_start(user_key: str, prompt: str):
+    # debounce sobre o prompt inteiro: qualquer campo (também os opcionais) tem de estar
+    # igual há SPEC_DEBOUNCE_S antes de se gastar uma pré-geração
+    now = time.time()
+    sig = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    if st.session_state.get("spec_sig") != sig:
+        st.session_state["spec_sig"] = sig
+        st.session_state["spec_sig_since"] = now
+        return
+    if now - st.session_state.get("spec_sig_since", now) < SPEC_DEBOUNCE_S:
+        return
+    if st.session_state.get("spec_prompt_started") == sig:
+        return
+    if spec_submit(user_key, prompt):
+        st.session_state["spec_prompt_started"] = sig
 
-    if ctx.get("metodos"):
-        pdf.multi_cell(0, 6, f"Métodos sugeridos: {clean_text(ctx['metodos'])}")
-    if ctx.get("meios"):
-        pdf.multi_cell(0, 6, f"Meios/Materiais sugeridos: {clean_text(ctx['meios'])}")
-    if ctx.get("upload_details"):
-        pdf.multi_cell(0, 6, f"Detalhes do ficheiro (opcional): {clean_text(ctx['upload_details'])}")
 
-    pdf.line(10, pdf.get_y() + 2, 200, pdf.get_y() + 2)
-    pdf.ln(5)
+# =========================
+# PDF (pool de processos, plan_pdf.py)
+# =========================
+def render_pdf_bytes(ctx: dict, plano: PlanoAula) -> bytes:
+    # só no pool (PdfPoolBusy/PdfPoolTimeout sobem para quem chama)
+    return pdf_pool().render(ctx, plano.model_dump(), font_mode=PDF_FONT_MODE, compact=PDF_COMPACT)
 
-    pdf.set_font("Arial", "B", 10)
-    pdf.cell(0, 6, "OBJECTIVO GERAL:", 0, 1)
-    pdf.set_font("Arial", "", 10)
-    pdf.multi_cell(0, 6, clean_text(plano.objetivo_geral))
-    pdf.ln(2)
 
-    pdf.set_font("Arial", "B", 10)
-    pdf.cell(0, 6, "OBJECTIVOS ESPECÍFICOS:", 0, 1)
-    pdf.set_font("Arial", "", 10)
-    for i, oe in enumerate(plano.objetivos_especificos, 1):
-        pdf.multi_cell(0, 6, f"{i}. {clean_text(oe)}")
-    pdf.ln(4)
+# =========================
+# PDF A PEDIDO (modo "on_demand") + cache
+# =========================
+def plan_pdf_bytes(row) -> bytes | None:
+    # só aqui se lê pdf_b64 (as listas do histórico não o trazem)
+    try:
+        return fetch_plan_pdf(supa(), int(row["id"]), pdf_memo(), pdf_pool())
+    except Exception:
+        return None
 
-    widths = [12, 32, 52, 52, 21, 21]
-    pdf.draw_table_header(widths)
-    for row in plano.tabela:
-        pdf.table_row(row, widths)
+def plan_pdf_download(row):
+    """data= para st.download_button: gera só no clique; se falhar, o Streamlit mostra
+    um erro de download em vez de entregar um PDF vazio."""
+    def data() -> bytes:
+        pdf = plan_pdf_bytes(row)
+        if not pdf:
+            raise RuntimeError(f"PDF do plano {int(row['id'])} indisponível")
+        return pdf
+    return data
 
-    return pdf.output(dest="S").encode("latin-1", "replace")
+
+@st.cache_data(ttl=600)
+def plan_view_html(plan_id: int) -> str | None:
+    try:
+        pj = get_plan_json(plan_id)
+        return plan_html(pj["ctx"], pj["plano"])
+    except Exception:
+        return None
 
 
+# =========================
+# CADERNO MENSAL (vários planos num só PDF)
+# =========================
+MESES_PT = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho", "Julho",
+            "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"]
+
+def booklet_pdf_bytes(ids: list[int], titulo: str) -> tuple[bytes, int]:
+    planos = []
+    for pj in iter_plan_jsons(supa(), ids):
+        try:
+            planos.append((pj["ctx"], PlanoAula(**pj["plano"])))
+        except Exception:
+            continue
+    return create_booklet(planos, titulo, font_mode=PDF_FONT_MODE, compact=PDF_COMPACT), len(planos)
+
+def render_booklet_export(df: pd.DataFrame, nome: str, key: str):
+    hoje = date.today()
+    anos = list(range(hoje.year - 2, hoje.year + 1))
+    c1, c2 = st.columns(2)
+    with c1:
+        ano = st.selectbox("Ano", anos, index=anos.index(hoje.year), key=f"{key}_ano")
+    with c2:
+        mes = st.selectbox("Mês", list(range(1, 13)), index=hoje.month - 1, format_func=lambda m: MESES_PT[m - 1], key=f"{key}_mes")
+
+    dias = pd.to_datetime(df["plan_day"], errors="coerce")
+    dm = df[(dias.dt.year == int(ano)) & (dias.dt.month == int(mes))].sort_values(["plan_day", "created_at"])
+    st.caption(f"{len(dm)} plano(s) em {MESES_PT[mes - 1]} de {ano}.")
+
+    sig = (tuple(int(x) for x in dm["id"]), nome)
+    if st.button("📘 Gerar caderno", key=f"{key}_btn", disabled=dm.empty):
+        titulo = f"Caderno de Planos - {nome} - {MESES_PT[mes - 1]} {ano}"
+        with st.spinner("A gerar o caderno..."):
+            pdf, n = booklet_pdf_bytes(list(sig[0]), titulo)
+        st.session_state[f"{key}_pdf"] = (sig, pdf, n)
+
+    got = st.session_state.get(f"{key}_pdf")
+    if got and got[0] == sig:
+        _, pdf, n = got
+        st.download_button(
+            f"⬇️ Baixar caderno ({n} planos)",
+            data=pdf,
+            file_name=f"Caderno_{normalize_text(nome).replace(' ', '_')[:30]}_{ano}-{str(mes).zfill(2)}.pdf",
+            mime="application/pdf",
+            key=f"{key}_dl",
+        )
+
+
+
+# =========================
+# ZIP DE PDFs (vários planos, descarregados em paralelo)
+# =========================
+BUCKET_PLANS = "plans"
+ZIP_WORKERS = 4
+
+def zip_fetcher():
+    # os workers correm fora do thread do script: recursos resolvidos aqui, não via st.cache_*
+    sb, memo, pool = supa(), pdf_memo(), pdf_pool()
+
+    def fetch(item: dict) -> bytes | None:
+        # thread do ZIP (não o do script): pode esperar pela fila o tempo de um PDF
+        return fetch_plan_pdf(sb, item["id"], memo, pool, slot_wait_s=pool.timeout_s)
+
+    return fetch
+
+def render_zip_export(df: pd.DataFrame, nome: str, key: str):
+    """df: id, plan_day, professor, disciplina, classe, tema."""
+    st.caption(f"{len(df)} plano(s) seleccionados pelos filtros.")
+    if st.button("📦 Gerar ZIP dos PDFs", key=f"{key}_btn", disabled=df.empty):
+        items = [
+            {"id": int(r.id), "nome": f"{str(r.plan_day)[:10]}_{r.professor}_{r.disciplina}_{r.classe}_{r.tema}"}
+            for r in df.itertuples(index=False)
+        ]
+        bar = st.progress(0.0, text="A juntar os PDFs...")
+        old = st.session_state.pop(f"{key}_zip", None)
+        if old and old[1] and os.path.exists(old[1]):  # ZIP anterior nunca descarregado
+            os.remove(old[1])
+        dest = f"exports/{datetime.now().strftime('%Y%m%d-%H%M%S')}_{safe_name(nome, 40)}.zip"
+        url, path, stats = export_pdf_zip(
+            supa(), items, zip_fetcher(), BUCKET_PLANS, dest, workers=ZIP_WORKERS,
+            on_progress=lambda i, n: bar.progress(i / n, text=f"{i}/{n} PDFs"),
+        )
+        st.session_state[f"{key}_zip"] = (url, path, stats, dest.split("/")[-1])
+
+    got = st.session_state.get(f"{key}_zip")
+    if got:
+        url, path, stats, fname = got
+        if not url and not os.path.exists(path):  # já descarregado (serve_once)
+            del st.session_state[f"{key}_zip"]
+            return
+        msg = f"{stats['ok']} PDF(s), {stats['bytes'] / 1024 / 1024:.1f} MB"
+        if stats["falhas"]:
+            msg += f" · {len(stats['falhas'])} em falta (ver _em_falta.txt)"
+        st.caption(msg)
+        if url:
+            st.link_button("⬇️ Baixar ZIP", url, type="primary")
+        else:
+            st.download_button("⬇️ Baixar ZIP", data=serve_once(path), file_name=fname, mime="application/zip", key=f"{key}_dl")
+
 # =========================
 # SESSION HELPERS
 # =========================
@@ -609,6 +944,16 @@ with st.sidebar:
 
     if st.session_state.get("is_admin"):
         st.success("✅ Sessão administrativa activa")
+        if "GOOGLE_API_KEY" not in st.secrets:
+            st.caption("🔴 Gemini: GOOGLE_API_KEY em falta (só o gerador local funciona)")
+        for m, h in gemini_registry().health.items():
+            st.caption(f"{'🟢' if h['ok'] else '🔴'} {m.split('/')[-1]} — {h['ms']} ms {h['erro'][:80]}")
+        pm = pdf_pool().metrics()
+        st.caption(
+            f"PDF: {pm['workers']} processos, {pm['em_curso']} em curso, {pm['concluidos']} feitos, "
+            f"{pm['timeouts']} timeouts, {pm['recusados']} recusados, {pm['reinicios']} reinícios, {pm['locais']} gerados fora do pool — render {pm['render_ms_medio']} ms, "
+            f"espera {pm['espera_ms_media']} ms (máx {pm['espera_ms_max']})"
+        )
         if st.button("Sair (Admin)"):
             logout()
 
@@ -745,20 +1090,25 @@ def render_user_history():
         use_container_width=True
     )
 
+    with st.expander("🖼️ Galeria", expanded=True):
+        render_plan_gallery(df2, "usr_sel_plan", "usr_gal", lambda ids: iter_plan_jsons(supa(), ids))
+
     sel = st.selectbox("Seleccionar plano", df2["label"].tolist(), key="usr_sel_plan")
     row = df2[df2["label"] == sel].iloc[0]
-    pdf_bytes = pdf_from_b64(row["pdf_b64"])
+    html = plan_view_html(int(row["id"]))
+    if html:
+        with st.expander("👁️ Ver plano", expanded=True):
+            st.markdown(html, unsafe_allow_html=True)
 
     c1, c2 = st.columns([0.6, 0.4])
     with c1:
-        if pdf_bytes:
-            st.download_button(
-                "⬇️ Baixar PDF",
-                data=pdf_bytes,
-                file_name=f"Plano_{row['disciplina']}_{row['classe']}_{row['tema']}.pdf".replace(" ", "_"),
-                mime="application/pdf",
-                type="primary",
-            )
+        st.download_button(
+            "⬇️ Baixar PDF (para imprimir)",
+            data=plan_pdf_download(row),  # só gera/descarrega ao clicar
+            file_name=f"Plano_{row['disciplina']}_{row['classe']}_{row['tema']}.pdf".replace(" ", "_"),
+            mime="application/pdf",
+            type="primary",
+        )
     with c2:
         confirm_del = st.checkbox("Confirmar apagar este plano", key="usr_conf_del_plan")
         if st.button("🗑️ Apagar plano", disabled=not confirm_del, key="usr_del_plan"):
@@ -766,6 +1116,9 @@ def render_user_history():
             st.success("Plano apagado.")
             st.rerun()
 
+    with st.expander("📘 Caderno mensal (todos os planos do mês num só PDF)"):
+        render_booklet_export(df, st.session_state.get("user_name") or "Professor", "usr_bk")
+
 
 # =========================
 # PROFESSOR: GERAR -> EDITAR -> GUARDAR (com limite diário)
@@ -829,6 +1182,59 @@ def render_generate():
     if missing_fields:
         st.warning("Preencha: " + ", ".join(missing_fields))
 
+    def pedido() -> tuple[dict, str]:
+        # ctx + prompt só quando são precisos (pré-geração ou clique), não em cada rerun
+        upload_hint = ""
+        if upload is not None:
+            upload_name = upload.name
+            upload_type = upload.type or ""
+            det = (upload_details or "").strip()
+            if det:
+                upload_hint = (
+                    f"- Ficheiro enviado: {upload_name} ({upload_type}).\n"
+                    f"- Detalhes: {det}\n"
+                    f"Use com moderação para enriquecer exemplos e exercícios."
+                )
+            else:
+                upload_hint = f"- Ficheiro enviado: {upload_name} ({upload_type}). Use com moderação para enriquecer exemplos e exercícios."
+
+        ctx = {
+            "escola": user_school,
+            "professor": user_name,
+            "disciplina": disciplina.strip(),
+            "classe": classe,
+            "unidade": unidade.strip(),
+            "tema": tema.strip(),
+            "turma": turma.strip(),
+            "duracao": duracao,
+            "tipo_aula": tipo_aula,
+            "metodos": metodos.strip(),
+            "meios": meios.strip(),
+            "data": data_plano.strftime("%d/%m/%Y"),
+            "plan_day": date.today().isoformat(),  # limite diário pelo dia de uso
+            "upload_details": (upload_details or "").strip(),
+        }
+        return ctx, build_prompt(ctx, upload_hint)
+
+    modo = st.selectbox(
+        "Modo de geração",
+        MODOS_GERACAO,
+        key="g_modo",
+        help="Local: gerador sem internet, instantâneo (para escolas com pouca rede).",
+    )
+
+    # geração antecipada (opcional)
+    spec_on = st.checkbox(
+        "⚡ Pré-gerar enquanto preencho (mais rápido ao clicar em Gerar)",
+        value=False,
+        key="g_spec",
+        help=f"Não conta para o limite diário. Máximo {SPEC_MAX_PER_DAY} pré-gerações por dia.",
+        disabled=(modo == MODO_LOCAL),
+    )
+    if spec_on and modo != MODO_LOCAL and not missing_fields and remaining > 0 and not st.session_state.get("btn_gerar"):
+        ctx, prompt = pedido()
+        spec_maybe_start(user_key, prompt)
+
     # Botão: gerar rascunho
     if st.button("Gerar plano", type="primary", disabled=bool(missing_fields) or remaining <= 0, key="btn_gerar"):
         if remaining <= 0:
@@ -840,60 +1246,28 @@ def render_generate():
             st.error("Já existe um plano guardado com este tema. Altere o tema ou apague o plano anterior.")
             st.stop()
 
+        ctx, prompt = pedido()
         with st.spinner("A gerar o rascunho..."):
             try:
-                genai.configure(api_key=st.secrets["GOOGLE_API_KEY"])
-
-                upload_name = None
-                upload_b64 = None
-                upload_type = None
-                upload_hint = ""
-
-                if upload is not None:
-                    upload_name = upload.name
-                    upload_type = upload.type or ""
-                    upload_bytes = upload.getvalue()
-                    upload_b64 = base64.b64encode(upload_bytes).decode("utf-8")
-
-                    det = (upload_details or "").strip()
-                    if det:
-                        upload_hint = (
-                            f"- Ficheiro enviado: {upload_name} ({upload_type}).\n"
-                            f"- Detalhes: {det}\n"
-                            f"Use com moderação para enriquecer exemplos e exercícios."
-                        )
-                    else:
-                        upload_hint = f"- Ficheiro enviado: {upload_name} ({upload_type}). Use com moderação para enriquecer exemplos e exercícios."
-
-                ctx = {
-                    "escola": user_school,
-                    "professor": user_name,
-                    "disciplina": disciplina.strip(),
-                    "classe": classe,
-                    "unidade": unidade.strip(),
-                    "tema": tema.strip(),
-                    "turma": turma.strip(),
-                    "duracao": duracao,
-                    "tipo_aula": tipo_aula,
-                    "metodos": metodos.strip(),
-                    "meios": meios.strip(),
-                    "data": data_plano.strftime("%d/%m/%Y"),
-                    "plan_day": date.today().isoformat(),  # limite diário pelo dia de uso
-                    "upload_details": (upload_details or "").strip(),
-                }
-
-                prompt = build_prompt(ctx, upload_hint)
-
-                # tenta um modelo e fallback
-                try:
-                    raw_text = cached_generate(prompt, "models/gemini-2.5-flash")
-                    modelo = "gemini-2.5-flash"
-                except Exception:
-                    raw_text = cached_generate(prompt, "models/gemini-1.5-flash")
-                    modelo = "gemini-1.5-flash"
-
-                raw_json = safe_extract_json(raw_text)
-                plano = PlanoAula(**raw_json)
+                if modo == MODO_LOCAL:
+                    plano = gerar_plano_offline(ctx, list_curriculum_snippets_for(ctx["disciplina"], ctx["classe"]))
+                    modelo = "local"
+                else:
+                    try:
+                        spec = spec_take(user_key, prompt) if spec_on else None
+                        if spec:
+                            raw_text, modelo = spec
+                        else:
+                            raw_text, modelo = generate_with_fallback(prompt, system_instruction=SYSTEM_INSTRUCTION_PLANO)
+
+                        raw_json = safe_extract_json(raw_text)
+                        plano = PlanoAula(**raw_json)
+                    except Exception as e:
+                        if modo != MODO_AUTO:
+                            raise
+                        st.warning(f"Gemini indisponível ({type(e).__name__}). Foi usado o gerador local.")
+                        plano = gerar_plano_offline(ctx, list_curriculum_snippets_for(ctx["disciplina"], ctx["classe"]))
+                        modelo = "local"
 
                 alvo = objetivos_alvo_por_duracao(duracao)
                 if len(plano.objetivos_especificos) != alvo:
@@ -906,9 +1280,11 @@ def render_generate():
 
                 st.session_state["draft_ctx"] = ctx
                 st.session_state["draft_plan"] = plano.model_dump()
-                st.session_state["draft_upload_name"] = upload_name
-                st.session_state["draft_upload_b64"] = upload_b64
-                st.session_state["draft_upload_type"] = upload_type
+                # o ficheiro só é lido/codificado aqui, ao gerar
+                has_up = upload is not None
+                st.session_state["draft_upload_name"] = upload.name if has_up else None
+                st.session_state["draft_upload_b64"] = base64.b64encode(upload.getvalue()).decode("utf-8") if has_up else None
+                st.session_state["draft_upload_type"] = (upload.type or "") if has_up else None
                 st.session_state["draft_modelo"] = modelo
 
                 st.success("Rascunho gerado. Pode editar abaixo e depois guardar.")
@@ -925,6 +1301,8 @@ def render_generate():
     if st.session_state.get("draft_ctx") and st.session_state.get("draft_plan"):
         st.divider()
         st.subheader("✍️ Editar rascunho")
+        if st.session_state.get("draft_modelo") == "local":
+            st.caption("Rascunho do gerador local (sem internet). Reveja e ajuste antes de guardar.")
 
         ctx = st.session_state["draft_ctx"]
         plan = st.session_state["draft_plan"]
@@ -937,8 +1315,14 @@ def render_generate():
 
         st.markdown(f"**Objectivos específicos ({alvo})**")
         edited_oes = []
+        regen_oe = None
         for i in range(alvo):
-            edited_oes.append(st.text_input(f"{i+1}.", value=oes[i], key=f"ed_oe_{i}"))
+            c_oe, c_regen = st.columns([0.9, 0.1])
+            with c_oe:
+                edited_oes.append(st.text_input(f"{i+1}.", value=oes[i], key=f"ed_oe_{i}"))
+            with c_regen:
+                if st.button("🔁", key=f"ed_regen_oe_{i}", help="Regenerar só este objectivo"):
+                    regen_oe = i
 
         tabela = list(plan.get("tabela", []))
         while len(tabela) < 4:
@@ -949,6 +1333,36 @@ def render_generate():
         st.markdown("**Tabela de actividades**")
         df_edit = st.data_editor(df_tab, use_container_width=True, num_rows="fixed", key="ed_table")
 
+        regen_row = None
+        regen_cols = st.columns(len(tabela))
+        for i, c in enumerate(regen_cols):
+            with c:
+                if st.button(f"🔁 Linha {i+1}", key=f"ed_regen_row_{i}", help="Regenerar só esta linha da tabela"):
+                    regen_row = i
+
+        if regen_oe is not None or regen_row is not None:
+            # junta as edições actuais ao rascunho antes de substituir o item
+            current = {
+                "objetivo_geral": obj_geral,
+                "objetivos_especificos": list(edited_oes),
+                "tabela": df_edit.values.tolist(),
+            }
+            with st.spinner("A regenerar..."):
+                try:
+                    if regen_oe is not None:
+                        current["objetivos_especificos"][regen_oe] = regenerate_objetivo(ctx, current, regen_oe)
+                        st.session_state.pop(f"ed_oe_{regen_oe}", None)
+                    else:
+                        current["tabela"][regen_row] = regenerate_linha(ctx, current, regen_row)
+                    st.session_state.pop("ed_table", None)
+                    st.session_state["draft_plan"] = current
+                    st.rerun()
+                except ValidationError as ve:
+                    st.error("A resposta não respeitou o formato esperado (JSON/estrutura).")
+                    st.code(str(ve))
+                except Exception as e:
+                    st.error(f"Erro ao regenerar: {e}")
+
         c1, c2 = st.columns([0.6, 0.4])
         with c1:
             if st.button("Guardar e baixar PDF", type="primary", key="btn_guardar"):
@@ -982,19 +1396,29 @@ def render_generate():
                     st.code(str(ve))
                     st.stop()
 
-                pdf_bytes = create_pdf(ctx, plano_obj)
+                try:
+                    pdf_bytes = render_pdf_bytes(ctx, plano_obj)
+                except (PdfPoolBusy, PdfPoolTimeout):
+                    st.error("Servidor ocupado a gerar PDFs. Tente guardar de novo dentro de momentos.")
+                    st.stop()
+                except Exception as e:
+                    st.error(f"Não foi possível gerar o PDF: {e}")
+                    st.stop()
 
-                save_plan(
+                plan_id = save_plan(
                     user_key=user_key,
                     ctx=ctx,
                     plano_json={"ctx": ctx, "plano": plano_obj.model_dump(), "modelo": st.session_state.get("draft_modelo", "")},
-                    pdf_bytes=pdf_bytes,
+                    pdf_bytes=pdf_bytes if PDF_STORAGE == "stored" else None,
                     upload_name=st.session_state.get("draft_upload_name"),
                     upload_b64=st.session_state.get("draft_upload_b64"),
                     upload_type=st.session_state.get("draft_upload_type"),
                     upload_details=ctx.get("upload_details"),
                 )
 
+                if PDF_STORAGE != "stored" and plan_id:
+                    pdf_memo().put(pdf_memo_key(plan_id), pdf_bytes)
+
                 for k in ["draft_ctx", "draft_plan", "draft_upload_name", "draft_upload_b64", "draft_upload_type", "draft_modelo"]:
                     st.session_state.pop(k, None)
 
@@ -1022,54 +1446,43 @@ def render_generate():
 # =========================
 def render_admin_history():
     st.subheader("📚 Planos (Administrador)")
-    df = list_plans_all()
-    if df.empty:
+    sync = catalog_sync()
+    cat = sync.catalog()
+    cS1, cS2 = st.columns([0.8, 0.2])
+    with cS1:
+        st.caption(
+            f"Catálogo: {len(cat)} planos · sincronizado às {sync.stats['ultima_sync']} · "
+            f"{sync.stats['novos']} lidos, {sync.stats['apagados']} removidos desde o arranque"
+        )
+    with cS2:
+        if st.button("🔄 Recarregar tudo", key="adm_cat_reset"):
+            sync.reset()
+            st.rerun()
+    if cat.empty:
         st.info("Ainda não há planos no sistema.")
         return
 
-    users = list_users_df()
-    users_map = {}
-    if not users.empty:
-        for _, r in users.iterrows():
-            users_map[r["user_key"]] = {"name": r["name"], "school": r["school"]}
-
-    df2 = df.copy()
-    df2["professor"] = df2["user_key"].apply(lambda k: users_map.get(k, {}).get("name", k))
-    df2["escola"] = df2["user_key"].apply(lambda k: users_map.get(k, {}).get("school", "-"))
-
     # filtros
     c1, c2, c3 = st.columns(3)
     with c1:
-        escolas = ["Todas"] + sorted(df2["escola"].astype(str).unique().tolist())
-        escola_f = st.selectbox("Filtrar por escola", escolas, key="adm_f_escola")
+        escola_f = st.selectbox("Filtrar por escola", ["Todas"] + cat.options("escola"), key="adm_f_escola")
     with c2:
-        datas = ["Todas"] + sorted({str(d) for d in df2["plan_day"].dropna().tolist()})
-        data_f = st.selectbox("Filtrar por dia", datas, key="adm_f_data")
+        data_f = st.selectbox("Filtrar por dia", ["Todas"] + cat.days(), key="adm_f_data")
     with c3:
-        profs = ["Todos"] + sorted(df2["professor"].astype(str).unique().tolist())
-        prof_f = st.selectbox("Filtrar por professor", profs, key="adm_f_prof")
+        prof_f = st.selectbox("Filtrar por professor", ["Todos"] + cat.options("professor"), key="adm_f_prof")
 
-    dff = df2.copy()
-    if escola_f != "Todas":
-        dff = dff[dff["escola"].astype(str) == escola_f]
-    if data_f != "Todas":
-        dff = dff[dff["plan_day"].astype(str) == data_f]
-    if prof_f != "Todos":
-        dff = dff[dff["professor"].astype(str) == prof_f]
+    mask = cat.mask(
+        escola=None if escola_f == "Todas" else escola_f,
+        dia=None if data_f == "Todas" else data_f,
+        professor=None if prof_f == "Todos" else prof_f,
+    )
 
     # -------------------------
     # Exportar CSV (filtrado e todos)
     # -------------------------
-    st.markdown("### ⬇️ Exportar CSV")
-
-    export_df = dff.copy()
-    cols = [
-        "plan_day","escola","professor","disciplina","classe","unidade","tema","turma",
-        "tipo_aula","duracao","metodos","meios","upload_details","created_at","user_key","id"
-    ]
-    cols = [c for c in cols if c in export_df.columns]
-    export_df = export_df[cols]
-    csv_filtrado = export_df.to_csv(index=False, encoding="utf-8-sig").encode("utf-8-sig")
+    st.markdown("### ⬇️ Exportar")
+    formato = st.radio("Formato", list(FORMATOS), horizontal=True, key="adm_exp_fmt")
+    ext, mime = FORMATOS[formato]
 
     fname_parts = ["planos_filtrados"]
     if escola_f != "Todas":
@@ -1078,29 +1491,32 @@ def render_admin_history():
         fname_parts.append(str(data_f))
     if prof_f != "Todos":
         fname_parts.append(normalize_text(prof_f).replace(" ", "_")[:25])
-    filename_filtrado = "_".join(fname_parts) + ".csv"
+    filename_filtrado = "_".join(fname_parts) + f".{ext}"
 
-    all_df = df2.copy()
-    cols_all = [c for c in cols if c in all_df.columns]
-    all_df = all_df[cols_all]
-    csv_todos = all_df.to_csv(index=False, encoding="utf-8-sig").encode("utf-8-sig")
+    # gerados só ao clicar, por páginas da base de dados
+    def export_filtrado():
+        ids = None if mask.all() else [int(x) for x in cat.view(mask, ["id"])["id"]]
+        return export_plans(with_users(iter_plan_pages(supa(), ids=ids), sync.users), formato)
+
+    def export_todos():
+        return export_plans(with_users(iter_plan_pages(supa()), sync.users), formato)
 
     b1, b2 = st.columns(2)
     with b1:
         st.download_button(
-            "📄 Baixar CSV (filtrado)",
-            data=csv_filtrado,
+            f"📄 Baixar {formato} (filtrado)",
+            data=export_filtrado,
             file_name=filename_filtrado,
-            mime="text/csv",
+            mime=mime,
             type="primary",
             key="download_csv_admin_filtrado",
         )
     with b2:
         st.download_button(
-            "📄 Baixar CSV (todos)",
-            data=csv_todos,
-            file_name="planos_todos.csv",
-            mime="text/csv",
+            f"📄 Baixar {formato} (todos)",
+            data=export_todos,
+            file_name=f"planos_todos.{ext}",
+            mime=mime,
             key="download_csv_admin_todos",
         )
 
@@ -1120,44 +1536,18 @@ def render_admin_history():
     with cR2:
         mes_sel = st.selectbox("Mês", meses, index=meses.index(hoje.month), key="rep_mes")
 
-    df_rep = df2.copy()
-    df_rep = df_rep[df_rep["plan_day"].notna()]
-    df_rep["plan_day"] = pd.to_datetime(df_rep["plan_day"], errors="coerce")
-    df_rep = df_rep[df_rep["plan_day"].dt.year == int(ano_sel)]
-    df_rep = df_rep[df_rep["plan_day"].dt.month == int(mes_sel)]
+    rep_db = monthly_report(int(ano_sel), int(mes_sel))
+    rep, rep_prof = rep_db if rep_db is not None else cat.monthly_report(ano_sel, mes_sel)
 
-    if df_rep.empty:
+    if rep.empty:
         st.info("Sem planos no mês seleccionado.")
     else:
-        rep = (
-            df_rep.groupby("escola", dropna=False)
-            .agg(
-                total_planos=("id", "count"),
-                professores_ativos=("professor", "nunique"),
-                primeiro_plano=("plan_day", "min"),
-                ultimo_plano=("plan_day", "max"),
-            )
-            .reset_index()
-            .sort_values(["total_planos", "escola"], ascending=[False, True])
-        )
-        rep["media_planos_por_prof"] = (rep["total_planos"] / rep["professores_ativos"]).round(2)
-
         st.dataframe(
             rep[["escola","total_planos","professores_ativos","media_planos_por_prof","primeiro_plano","ultimo_plano"]],
             hide_index=True,
             use_container_width=True,
         )
 
-        rep_prof = (
-            df_rep.groupby(["escola", "professor"], dropna=False)
-            .agg(total_planos=("id", "count"))
-            .reset_index()
-            .sort_values(["escola", "total_planos", "professor"], ascending=[True, False, True])
-        )
-
-        csv_escola = rep.to_csv(index=False, encoding="utf-8-sig").encode("utf-8-sig")
-        csv_prof = rep_prof.to_csv(index=False, encoding="utf-8-sig").encode("utf-8-sig")
-
         f1 = f"relatorio_escolas_{ano_sel}-{str(mes_sel).zfill(2)}.csv"
         f2 = f"relatorio_escola_prof_{ano_sel}-{str(mes_sel).zfill(2)}.csv"
 
@@ -1165,7 +1555,7 @@ def render_admin_history():
         with bA:
             st.download_button(
                 "📄 Baixar relatório (por escola)",
-                data=csv_escola,
+                data=lambda: rep.to_csv(index=False).encode("utf-8-sig"),
                 file_name=f1,
                 mime="text/csv",
                 type="primary",
@@ -1174,48 +1564,92 @@ def render_admin_history():
         with bB:
             st.download_button(
                 "📄 Baixar relatório (escola + professor)",
-                data=csv_prof,
+                data=lambda: rep_prof.to_csv(index=False).encode("utf-8-sig"),
                 file_name=f2,
                 mime="text/csv",
                 key="dl_rel_prof",
             )
 
+    # -------------------------
+    # Tendências (cubo mês × escola × disciplina × classe × tipo de aula)
+    # -------------------------
+    st.divider()
+    st.subheader("📈 Tendências")
+    cube = load_cube()
+    if cube is None:
+        cube = cube_from_catalog(cat.df)
+        st.caption("Calculado a partir do catálogo (tabela plan_cube não encontrada; ver sql/005_plan_cube.sql).")
+
+    if cube.empty:
+        st.info("Sem dados para tendências.")
+    else:
+        t1, t2, t3 = st.columns(3)
+        with t1:
+            dim = st.selectbox("Dimensão", DIMS, format_func=lambda d: d.replace("_", " ").capitalize(), key="tr_dim")
+        with t2:
+            esc_t = st.selectbox("Escola", ["Todas"] + sorted(cube["escola"].cat.categories.tolist()), key="tr_escola")
+        with t3:
+            janela = st.selectbox("Média móvel (meses)", [1, 3, 6, 12], index=1, key="tr_janela")
+        sub = slice_cube(cube, {} if esc_t == "Todas" or dim == "escola" else {"escola": esc_t})
+
+        serie = monthly_series(sub, dim)
+        if not serie.empty:
+            st.line_chart(rolling(serie, janela))
+        st.caption(f"Comparação com o ano anterior (Janeiro a {MESES_PT[hoje.month - 1]})")
+        st.dataframe(year_over_year(sub, dim, hoje.year, hoje.month), hide_index=True, use_container_width=True)
+
+        if st.button("♻️ Reconstruir cubo", key="tr_rebuild"):
+            try:
+                supa().rpc("plan_cube_rebuild", {}).execute()
+                load_cube.clear()
+                st.success("Cubo reconstruído.")
+            except Exception as e:
+                st.error(f"Não foi possível reconstruir o cubo: {e}")
+
+    # -------------------------
+    # Caderno mensal (planos filtrados)
+    # -------------------------
+    st.divider()
+    st.subheader("📘 Caderno mensal (PDF)")
+    st.caption("Usa os filtros acima (escola/professor); junta os planos do mês num só PDF com índice.")
+    nome_bk = prof_f if prof_f != "Todos" else (escola_f if escola_f != "Todas" else "Todas as escolas")
+    render_booklet_export(cat.view(mask, ["id", "plan_day", "created_at"]), nome_bk, "adm_bk")
+
+    st.divider()
+    st.subheader("📦 PDFs filtrados (ZIP)")
+    render_zip_export(cat.view(mask, ["id", "plan_day", "professor", "disciplina", "classe", "tema"]), nome_bk, "adm_zip")
+
     # tabela (planos filtrados)
     st.divider()
     st.subheader("📋 Lista (com filtros)")
     st.dataframe(
-        dff[["plan_day","escola","professor","disciplina","classe","unidade","tema","turma","upload_details","created_at"]],
+        cat.view(mask, ["plan_day","escola","professor","disciplina","classe","unidade","tema","turma","upload_details","created_at"]),
         hide_index=True,
-        use_container_width=True
+        use_container_width=True,
+        column_config={"plan_day": st.column_config.DateColumn(format="YYYY-MM-DD")},
     )
 
-    if dff.empty:
+    if not mask.any():
         st.info("Nenhum plano para estes filtros.")
         return
 
-    dff = dff.copy()
-    dff["label"] = (
-        dff["plan_day"].astype(str) + " | " +
-        dff["escola"].astype(str) + " | " +
-        dff["professor"].astype(str) + " | " +
-        dff["disciplina"].astype(str) + " | " +
-        dff["classe"].astype(str) + " | " +
-        dff["tema"].astype(str)
-    )
-    sel = st.selectbox("Seleccionar plano", dff["label"].tolist(), key="adm_sel_plan")
-    row = dff[dff["label"] == sel].iloc[0]
-    pdf_bytes = pdf_from_b64(row["pdf_b64"])
+    labels = cat.labels(mask)
+    sel_id = st.selectbox("Seleccionar plano", list(labels), format_func=labels.get, key="adm_sel_plan")
+    row = cat.row(sel_id)
+    html = plan_view_html(int(row["id"]))
+    if html:
+        with st.expander("👁️ Ver plano", expanded=True):
+            st.markdown(html, unsafe_allow_html=True)
 
     c4, c5 = st.columns([0.6, 0.4])
     with c4:
-        if pdf_bytes:
-            st.download_button(
-                "⬇️ Baixar PDF",
-                data=pdf_bytes,
-                file_name=f"Plano_{row['disciplina']}_{row['classe']}_{row['tema']}.pdf".replace(" ", "_"),
-                mime="application/pdf",
-                type="primary",
-            )
+        st.download_button(
+            "⬇️ Baixar PDF (para imprimir)",
+            data=plan_pdf_download(row),  # só gera/descarrega ao clicar
+            file_name=f"Plano_{row['disciplina']}_{row['classe']}_{row['tema']}.pdf".replace(" ", "_"),
+            mime="application/pdf",
+            type="primary",
+        )
     with c5:
         confirm_del = st.checkbox("Confirmar apagar este plano", key="adm_conf_del_plan")
         if st.button("🗑️ Apagar plano", disabled=not confirm_del, key="adm_del_plan"):
@@ -1238,40 +1672,59 @@ def render_admin_users():
 
     users2 = users.copy()
     users2["label"] = users2["name"].astype(str) + " — " + users2["school"].astype(str) + " (" + users2["status"].astype(str) + ")"
-    sel = st.selectbox("Selecionar professor", users2["label"].tolist(), key="adm_user_sel")
-    row = users2[users2["label"] == sel].iloc[0]
-    uk = row["user_key"]
+    labels = dict(zip(users2["user_key"], users2["label"]))
+
+    # -------------------------
+    # Estado e limite diário (vários professores de uma vez)
+    # -------------------------
+    st.markdown("### Estado e limite diário")
+    f1, f2 = st.columns(2)
+    with f1:
+        esc = st.selectbox("Escola", ["Todas"] + sorted(users2["school"].dropna().astype(str).unique().tolist()), key="adm_bulk_esc")
+    with f2:
+        est = st.selectbox("Estado", ["Todos", "trial", "approved", "blocked"], key="adm_bulk_est")
+    vis = users2
+    if esc != "Todas":
+        vis = vis[vis["school"].astype(str) == esc]
+    if est != "Todos":
+        vis = vis[vis["status"].astype(str) == est]
+
+    st.button(f"Seleccionar os {len(vis)} da lista", key="adm_bulk_all",
+              on_click=lambda ks=vis["user_key"].tolist(): st.session_state.update({"adm_bulk_sel": ks}))
+    st.session_state["adm_bulk_sel"] = [k for k in st.session_state.get("adm_bulk_sel", []) if k in set(vis["user_key"])]
+    sel_keys = st.multiselect("Professores", vis["user_key"].tolist(), format_func=labels.get, key="adm_bulk_sel")
+    n = len(sel_keys)
 
-    st.markdown("### Estado")
     c1, c2, c3 = st.columns(3)
     with c1:
-        if st.button("✅ Aprovar", key="adm_approve"):
-            set_user_status(uk, "approved")
-            st.success("Aprovado.")
+        if st.button("✅ Aprovar", key="adm_approve", disabled=not n):
+            set_users_status(sel_keys, "approved")
+            st.success(f"{n} aprovado(s).")
             st.rerun()
     with c2:
-        if st.button("🚫 Bloquear", key="adm_block"):
-            set_user_status(uk, "blocked")
-            st.success("Bloqueado.")
+        if st.button("🚫 Bloquear", key="adm_block", disabled=not n):
+            set_users_status(sel_keys, "blocked")
+            st.success(f"{n} bloqueado(s).")
             st.rerun()
     with c3:
-        if st.button("↩️ Trial", key="adm_trial"):
-            set_user_status(uk, "trial")
-            st.success("Estado trial.")
+        if st.button("↩️ Trial", key="adm_trial", disabled=not n):
+            set_users_status(sel_keys, "trial")
+            st.success(f"{n} em trial.")
             st.rerun()
 
-    st.divider()
-    st.markdown("### Limite diário (planos por dia)")
-    current_daily = int(row.get("daily_limit") or 2)
-
-    daily_limit = st.selectbox("Escolher limite diário", [2, 6], index=0 if current_daily == 2 else 1, key="adm_daily_sel")
-
-    if st.button("💾 Guardar limite diário", key="adm_save_daily"):
-        update_user_daily_limit(uk, int(daily_limit))
+    daily_limit = st.selectbox("Limite diário (planos por dia)", [2, 6], key="adm_daily_sel")
+    if st.button("💾 Guardar limite diário", key="adm_save_daily", disabled=not n):
+        update_users_daily_limit(sel_keys, int(daily_limit))
         st.success("Limite diário actualizado.")
         st.rerun()
 
+    # -------------------------
+    # Um professor (PIN / apagar)
+    # -------------------------
     st.divider()
+    sel = st.selectbox("Selecionar professor", users2["label"].tolist(), key="adm_user_sel")
+    uk = users2[users2["label"] == sel].iloc[0]["user_key"]
+
     st.markdown("### Reset PIN")
     new_pin = st.text_input("Novo PIN", type="password", key="adm_new_pin")
     new_pin2 = st.text_input("Confirmar PIN", type="password", key="adm_new_pin2")
@@ -0,0 +1,134 @@
+# archive_job.py
+# Política de retenção: planos com mais de N meses passam para o arquivo frio.
+#
+# - lê user_plans por lotes (id crescente), só planos ainda não arquivados e criados
+#   antes do limite
+# - cada plano vira um objecto comprimido no bucket (plan_archive.py), que é descarregado
+#   e comparado antes de se apagarem os campos na tabela
+# - o UPDATE só apaga os campos se o plano não mudou desde a leitura (ainda não arquivado
+#   e mesmo pdf_template_version); se mudou (p.ex. rerender_job.py), o objecto é
+#   removido e o plano fica para a próxima passagem
+# - na tabela ficam os metadados, archived_at e archive_path; a app vai buscar
+#   plan_json/pdf_b64 ao arquivo quando são precisos
+# - retomável: planos já arquivados não voltam a ser lidos
+#
+# Uso (com .streamlit/secrets.toml; PLAN_RETENTION_MONTHS, por omissão 12):
+#   python archive_job.py --dry-run
+#   python archive_job.py --months 18 --batch 50
+#   python archive_job.py --restore 123 456      # volta a pôr planos na tabela
+
+import argparse
+import hashlib
+import time
+from datetime import date, datetime, timezone
+
+import streamlit as st
+
+from utils import supa
+from plan_archive import BUCKET_PLANS, COLD_COLS, archive_path, pack, read_cold
+
+
+def cutoff_date(months: int) -> str:
+    hoje = date.today()
+    k = hoje.year * 12 + hoje.month - 1 - months
+    return date(k // 12, k % 12 + 1, 1).isoformat()
+
+
+def fetch_batch(sb, after_id: int, cutoff: str, batch: int) -> list[dict]:
+    r = (
+        sb.table("user_plans").select("id,created_at,pdf_template_version," + ",".join(COLD_COLS))
+        .is_("archived_at", "null").lt("created_at", cutoff).gt("id", after_id)
+        .order("id").limit(batch).execute()
+    )
+    return r.data or []
+
+
+def row_bytes(row: dict) -> int:
+    return sum(len(str(row[c])) for c in COLD_COLS if row.get(c) is not None)
+
+
+def archive_plan(sb, row: dict) -> int | None:
+    """Arquiva um plano; devolve o tamanho do objecto, ou None se o plano mudou entretanto."""
+    path, blob = archive_path(row), pack(row)
+    store = sb.storage.from_(BUCKET_PLANS)
+    store.upload(path, blob, {"content-type": "application/gzip", "upsert": "true"})
+    if hashlib.sha256(store.download(path)).digest() != hashlib.sha256(blob).digest():
+        raise RuntimeError(f"arquivo {path} não confere depois do upload")
+    q = (
+        sb.table("user_plans")
+        .update({**{c: None for c in COLD_COLS}, "archived_at": datetime.now(timezone.utc).isoformat(), "archive_path": path})
+        .eq("id", row["id"]).is_("archived_at", "null")
+    )
+    v = row.get("pdf_template_version")
+    q = q.is_("pdf_template_version", "null") if v is None else q.eq("pdf_template_version", v)
+    if not q.execute().data:
+        store.remove([path])
+        return None
+    return len(blob)
+
+
+def restore(sb, ids: list[int]):
+    for pid in ids:
+        r = sb.table("user_plans").select("archive_path").eq("id", pid).limit(1).execute()
+        path = r.data[0].get("archive_path") if r.data else None
+        cold = read_cold(sb, path) if path else None
+        if cold is None:
+            print(f"  id {pid}: não arquivado ou arquivo em falta")
+            continue
+        sb.table("user_plans").update({**cold, "archived_at": None, "archive_path": None}).eq("id", pid).execute()
+        sb.storage.from_(BUCKET_PLANS).remove([path])
+        print(f"  id {pid}: reposto")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Passa planos antigos para o arquivo frio no Storage.")
+    ap.add_argument("--months", type=int, default=int(st.secrets.get("PLAN_RETENTION_MONTHS", 12)))
+    ap.add_argument("--batch", type=int, default=50, help="planos lidos por pedido")
+    ap.add_argument("--limit", type=int, default=0, help="máximo de lotes (0 = todos)")
+    ap.add_argument("--dry-run", action="store_true", help="só mostra quanto seria arquivado")
+    ap.add_argument("--restore", type=int, nargs="+", metavar="ID", help="repõe estes planos na tabela")
+    args = ap.parse_args()
+
+    sb = supa()
+    if args.restore:
+        restore(sb, args.restore)
+        return
+
+    cutoff = cutoff_date(args.months)
+    print(f"retenção: {args.months} meses — planos criados antes de {cutoff}")
+    stats = {"planos": 0, "lotes": 0, "bytes_quentes": 0, "bytes_arquivo": 0, "alterados": 0, "falhas": 0}
+    last_id, t0 = 0, time.time()
+    while not args.limit or stats["lotes"] < args.limit:
+        rows = fetch_batch(sb, last_id, cutoff, args.batch)
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+        stats["lotes"] += 1
+        planos, quentes, arquivo = 0, 0, 0
+        for r in rows:
+            try:
+                n = len(pack(r)) if args.dry_run else archive_plan(sb, r)
+            except Exception as e:
+                stats["falhas"] += 1
+                print(f"  id {r['id']}: {type(e).__name__}: {e}")
+                continue
+            if n is None:
+                stats["alterados"] += 1
+                continue
+            planos += 1
+            quentes += row_bytes(r)
+            arquivo += n
+        stats["planos"] += planos
+        stats["bytes_quentes"] += quentes
+        stats["bytes_arquivo"] += arquivo
+        print(f"ids {rows[0]['id']}-{last_id}: {planos} planos, {quentes / 1024:.0f} KB -> {arquivo / 1024:.0f} KB")
+
+    verbo = "seriam arquivados" if args.dry_run else "arquivados"
+    print(
+        f"terminado: {stats['planos']} planos {verbo} em {stats['lotes']} lotes "
+        f"({stats['bytes_quentes'] / 1024 / 1024:.1f} MB -> {stats['bytes_arquivo'] / 1024 / 1024:.1f} MB), "
+        f"{stats['alterados']} alterados durante a passagem, {stats['falhas']} falhas, {time.time() - t0:.0f}s"
+    )
+
+if __name__ == "__main__":
+    main()
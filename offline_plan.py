@@ -0,0 +1,136 @@
+# offline_plan.py
+# Gerador local (sem rede) de planos de aula.
+# Determinístico: o mesmo contexto dá sempre o mesmo plano.
+# Usa a estrutura didáctica fixa (4 funções), os snippets do currículo (se houver)
+# e o número de objectivos de objetivos_alvo_por_duracao().
+
+import re
+import unicodedata
+
+from plan_model import PlanoAula, FUNCOES_DIDACTICAS, objetivos_alvo_por_duracao
+
+# proporção do tempo por função didáctica (45 min -> 5/20/15/5)
+PROPORCAO_TEMPO = [1, 4, 3, 1]
+
+OBJ_GERAL = {
+    "Introdução de Matéria Nova": "Compreender {tema}, no âmbito da unidade \"{unidade}\".",
+    "Consolidação e Exercitação": "Consolidar os conhecimentos sobre {tema}, através de exercícios de aplicação.",
+    "Verificação e Avaliação": "Demonstrar o domínio dos conteúdos sobre {tema}.",
+    "Revisão": "Rever e sistematizar os conteúdos sobre {tema}, no âmbito da unidade \"{unidade}\".",
+}
+
+OBJ_ESPECIFICOS = {
+    "Introdução de Matéria Nova": [
+        "Identificar os conceitos fundamentais de {tema}.",
+        "Explicar, por palavras próprias, as principais ideias de {tema}.",
+        "Dar exemplos do quotidiano relacionados com {tema}.",
+        "Relacionar {tema} com os conteúdos anteriores da unidade.",
+        "Resolver exercícios simples sobre {tema}.",
+    ],
+    "Consolidação e Exercitação": [
+        "Aplicar os conceitos de {tema} na resolução de exercícios.",
+        "Corrigir, em grupo, os exercícios sobre {tema}.",
+        "Explicar os procedimentos usados na resolução dos exercícios.",
+        "Resolver problemas do quotidiano que envolvem {tema}.",
+        "Identificar e corrigir erros frequentes sobre {tema}.",
+    ],
+    "Verificação e Avaliação": [
+        "Responder correctamente às questões sobre {tema}.",
+        "Aplicar os conhecimentos de {tema} em situações novas.",
+        "Justificar as respostas dadas nas actividades de avaliação.",
+        "Resolver, individualmente, os exercícios propostos sobre {tema}.",
+        "Avaliar o próprio desempenho com base na correcção.",
+    ],
+    "Revisão": [
+        "Recordar os conceitos principais de {tema}.",
+        "Sistematizar, num resumo, os conteúdos de {tema}.",
+        "Resolver exercícios de revisão sobre {tema}.",
+        "Relacionar os conteúdos de {tema} com os da unidade \"{unidade}\".",
+        "Esclarecer dúvidas sobre {tema}.",
+    ],
+}
+
+METODOS_PADRAO = ["Conversação", "Expositivo e elaboração conjunta", "Trabalho independente", "Perguntas e respostas"]
+MEIOS_PADRAO = ["Quadro, giz", "Quadro, giz, livro do aluno", "Caderno, livro do aluno", "Quadro, caderno"]
+
+
+def _norm(s: str) -> str:
+    s = unicodedata.normalize("NFKD", (s or "").strip().lower())
+    s = "".join(c for c in s if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w\s]", " ", s).split())
+
+
+def distribuir_tempo(duracao: str) -> list[int]:
+    m = re.search(r"\d+", duracao or "")
+    total = int(m.group()) if m else 45
+    base = sum(PROPORCAO_TEMPO)
+    tempos = [round(total * p / base) for p in PROPORCAO_TEMPO]
+    tempos[1] += total - sum(tempos)  # o resto vai para a mediação
+    return tempos
+
+
+def escolher_snippet(ctx: dict, snippets: list[dict]) -> str:
+    """Snippet mais específico: tema > unidade > geral da disciplina/classe."""
+    tema, unidade = _norm(ctx.get("tema")), _norm(ctx.get("unidade"))
+    por_nivel = {0: [], 1: [], 2: []}
+    for sn in snippets or []:
+        texto = (sn.get("snippet") or "").strip()
+        if not texto:
+            continue
+        if tema and _norm(sn.get("tema")) == tema:
+            por_nivel[0].append(texto)
+        elif unidade and _norm(sn.get("unidade")) == unidade:
+            por_nivel[1].append(texto)
+        elif not sn.get("tema") and not sn.get("unidade"):
+            por_nivel[2].append(texto)
+    for nivel in (0, 1, 2):
+        if por_nivel[nivel]:
+            return " ".join(por_nivel[nivel][0].split())
+    return ""
+
+
+def gerar_plano_offline(ctx: dict, snippets: list[dict] | None = None) -> PlanoAula:
+    tema = ctx.get("tema") or "o tema da aula"
+    unidade = ctx.get("unidade") or "-"
+    tipo = ctx.get("tipo_aula") if ctx.get("tipo_aula") in OBJ_GERAL else "Introdução de Matéria Nova"
+    n_obj = objetivos_alvo_por_duracao(ctx.get("duracao", ""))
+
+    objetivo_geral = OBJ_GERAL[tipo].format(tema=tema, unidade=unidade)
+    especificos = [x.format(tema=tema, unidade=unidade) for x in OBJ_ESPECIFICOS[tipo][:n_obj]]
+
+    snippet = escolher_snippet(ctx, snippets or [])
+    if len(snippet) > 300:
+        snippet = snippet[:297].rstrip() + "..."
+    conteudo = f" com base no programa ({snippet.rstrip('. ')})" if snippet else ""
+
+    metodos = ctx.get("metodos") or ""
+    meios = ctx.get("meios") or ""
+    tempos = distribuir_tempo(ctx.get("duracao", ""))
+
+    linhas_prof = [
+        "Saúda a turma, faz o controlo de presenças e verifica o trabalho de casa. "
+        f"Motiva a turma com uma pergunta do quotidiano sobre {tema} e apresenta o tema e os objectivos.",
+        f"Explica e demonstra os conteúdos de {tema}{conteudo}. Orienta a elaboração conjunta de exemplos e regista os pontos principais no quadro.",
+        f"Distribui exercícios de aplicação sobre {tema}, acompanha o trabalho individual ou em grupo e esclarece dúvidas.",
+        "Solicita a correcção dos exercícios, avalia as respostas e faz a síntese da aula. "
+        f"Indica o trabalho de casa sobre {tema}, com orientação clara do que fazer e como apresentar.",
+    ]
+    linhas_aluno = [
+        "Responde à chamada, apresenta o trabalho de casa e participa na conversa inicial.",
+        "Acompanha a explicação, responde às perguntas, dá exemplos e regista no caderno.",
+        "Resolve os exercícios, individualmente ou em grupo, e apresenta as dúvidas.",
+        "Apresenta e corrige as respostas, participa na síntese e regista o trabalho de casa.",
+    ]
+
+    tabela = []
+    for i, funcao in enumerate(FUNCOES_DIDACTICAS):
+        tabela.append([
+            str(tempos[i]),
+            funcao,
+            linhas_prof[i],
+            linhas_aluno[i],
+            metodos or METODOS_PADRAO[i],
+            meios or MEIOS_PADRAO[i],
+        ])
+
+    return PlanoAula(objetivo_geral=objetivo_geral, objetivos_especificos=especificos, tabela=tabela)
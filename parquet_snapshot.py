@@ -0,0 +1,154 @@
+# parquet_snapshot.py
+# Arquivo Parquet dos metadados dos planos para análise fora da app (sem plan_json/PDF).
+# Dataset particionado year=/month=/escola=/ (hive), com os campos de app_users juntos
+# (professor, escola, estado). Cada execução só acrescenta meses completos que ainda não
+# estão no arquivo; os já escritos não são relidos da base de dados.
+#
+# Uso (com .streamlit/secrets.toml), p.ex. no cron no dia 1 de cada mês:
+#   python parquet_snapshot.py --out snapshot
+#   python parquet_snapshot.py --out snapshot --from 2024-01   # primeira carga a partir de um mês
+#
+# Leitura: pyarrow.dataset.dataset("snapshot", partitioning="hive") / pandas.read_parquet("snapshot")
+
+import argparse
+import json
+import os
+import time
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from utils import supa
+
+PLAN_COLS = "id,created_at,plan_day,disciplina,classe,unidade,tema,turma,tipo_aula,duracao,metodos,meios,upload_name,upload_type,pdf_template_version,user_key"
+USER_COLS = "user_key,name,school,status"
+SCHEMA = pa.schema(
+    [("id", pa.int64()), ("plan_day", pa.date32()), ("created_at", pa.timestamp("us", tz="UTC")),
+     ("pdf_template_version", pa.int32())]
+    + [(c, pa.string()) for c in ["disciplina", "classe", "unidade", "tema", "turma", "tipo_aula", "duracao",
+                                 "metodos", "meios", "upload_name", "upload_type", "user_key", "professor", "estado"]]
+    + [("year", pa.int16()), ("month", pa.int8()), ("escola", pa.string())]
+)
+PARTITIONING = ds.partitioning(pa.schema([("year", pa.int16()), ("month", pa.int8()), ("escola", pa.string())]), flavor="hive")
+
+
+def month_add(y: int, m: int, n: int = 1) -> tuple[int, int]:
+    k = y * 12 + (m - 1) + n
+    return k // 12, k % 12 + 1
+
+
+def existing_months(out: str) -> set[tuple[int, int]]:
+    found = set()
+    if not os.path.isdir(out):
+        return found
+    for yd in os.listdir(out):
+        if not yd.startswith("year="):
+            continue
+        for md in os.listdir(os.path.join(out, yd)):
+            if md.startswith("month="):
+                found.add((int(yd[5:]), int(md[6:])))
+    return found
+
+
+def first_plan_month(sb) -> tuple[int, int] | None:
+    r = sb.table("user_plans").select("plan_day").not_.is_("plan_day", "null").order("plan_day").limit(1).execute()
+    if not r.data:
+        return None
+    d = date.fromisoformat(str(r.data[0]["plan_day"])[:10])
+    return d.year, d.month
+
+
+def fetch_month(sb, y: int, m: int, page: int) -> pd.DataFrame:
+    ny, nm = month_add(y, m)
+    start, end = f"{y:04d}-{m:02d}-01", f"{ny:04d}-{nm:02d}-01"
+    rows, last = [], 0
+    while True:
+        r = (
+            sb.table("user_plans").select(PLAN_COLS)
+            .gte("plan_day", start).lt("plan_day", end).gt("id", last)
+            .order("id").limit(page).execute()
+        )
+        data = r.data or []
+        rows.extend(data)
+        if len(data) < page:
+            return pd.DataFrame(rows, columns=PLAN_COLS.split(","))
+        last = data[-1]["id"]
+
+
+def fetch_users(sb, page: int) -> pd.DataFrame:
+    # keyset por user_key: um só pedido fica cortado no max_rows do PostgREST
+    rows, last = [], ""
+    while True:
+        data = (
+            sb.table("app_users").select(USER_COLS).gt("user_key", last)
+            .order("user_key").limit(page).execute().data or []
+        )
+        rows.extend(data)
+        if len(data) < page:
+            return pd.DataFrame(rows, columns=USER_COLS.split(","))
+        last = data[-1]["user_key"]
+
+
+def to_table(plans: pd.DataFrame, users: pd.DataFrame, y: int, m: int) -> pa.Table:
+    df = plans.merge(users, on="user_key", how="left")
+    df["professor"] = df["professor"].fillna(df["user_key"])
+    df["escola"] = df["escola"].fillna("-")
+    df["plan_day"] = pd.to_datetime(df["plan_day"], errors="coerce").dt.date
+    df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce", utc=True)
+    df["pdf_template_version"] = pd.to_numeric(df["pdf_template_version"], errors="coerce").astype("Int32")
+    df["year"], df["month"] = y, m
+    for c in SCHEMA.names:
+        if SCHEMA.field(c).type == pa.string():
+            df[c] = df[c].astype("string")
+    return pa.Table.from_pandas(df[SCHEMA.names], schema=SCHEMA, preserve_index=False)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Acrescenta ao arquivo Parquet os meses completos em falta.")
+    ap.add_argument("--out", default="snapshot", help="pasta do dataset")
+    ap.add_argument("--from", dest="desde", help="primeiro mês (AAAA-MM) se o arquivo estiver vazio")
+    ap.add_argument("--page", type=int, default=1000)
+    ap.add_argument("--dry-run", action="store_true", help="só mostra os meses que seriam escritos")
+    args = ap.parse_args()
+
+    sb = supa()
+    done = existing_months(args.out)
+    if done:
+        y, m = month_add(*max(done))
+    elif args.desde:
+        y, m = int(args.desde[:4]), int(args.desde[5:7])
+    else:
+        first = first_plan_month(sb)
+        if first is None:
+            print("sem planos")
+            return
+        y, m = first
+    hoje = date.today()
+    limite = (hoje.year, hoje.month)  # o mês corrente ainda não está completo
+
+    users = fetch_users(sb, args.page)
+    users = users.drop_duplicates("user_key").rename(columns={"name": "professor", "school": "escola", "status": "estado"})
+
+    t0 = time.time()
+    escritos = []
+    while (y, m) < limite:
+        plans = fetch_month(sb, y, m, args.page)
+        print(f"{y:04d}-{m:02d}: {len(plans)} planos")
+        if not plans.empty and not args.dry_run:
+            ds.write_dataset(
+                to_table(plans, users, y, m), args.out, format="parquet", partitioning=PARTITIONING,
+                basename_template=f"part-{y:04d}{m:02d}-{{i}}.parquet", existing_data_behavior="overwrite_or_ignore",
+            )
+            escritos.append({"mes": f"{y:04d}-{m:02d}", "planos": len(plans)})
+        y, m = month_add(y, m)
+
+    if escritos:
+        with open(os.path.join(args.out, "_snapshots.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"em": time.strftime("%Y-%m-%dT%H:%M:%S"), "meses": escritos}) + "\n")
+    print(f"terminado: {len(escritos)} mês(es) novos em {time.time() - t0:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
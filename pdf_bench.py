@@ -0,0 +1,249 @@
+# pdf_bench.py
+# Benchmark e verificação da geração de PDF (pdf_render), sem rede nem base de dados.
+#
+# - corpus sintético e determinístico de PlanoAula: células curtas e longas, 45 e 90 min,
+#   acentos, texto fora de Latin-1, palavras sem espaços, tabelas que mudam de página
+# - por modo (dejavu / core / compacto): planos/s, p50/p95 (ms), pico de memória, bytes
+# - verificação "golden" (bench_golden.json): n.º de páginas e, por linha da tabela,
+#   página + y do fundo da linha (apanha mudanças de altura e de quebra de página)
+# - --json guarda os resultados; --compare mostra a diferença face a outro commit
+#
+# Uso:
+#   python pdf_bench.py                       # > bench_output.txt para guardar
+#   python pdf_bench.py --n 500 --json antes.json
+#   python pdf_bench.py --compare antes.json
+#   python pdf_bench.py --update-golden       # depois de uma mudança intencional de layout
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+from plan_model import PlanoAula, FUNCOES_DIDACTICAS
+from pdf_render import PDF, PDF_TEMPLATE_VERSION, create_pdf, draw_plan, is_latin1, plan_texts
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_golden.json")
+MODES = {"dejavu": ("dejavu", False), "core": ("core", False), "compacto": ("dejavu", True)}
+KINDS = ["curto", "longo", "acentos", "unicode", "palavra-longa", "muitas-linhas"]
+GOLDEN_PER_KIND = 2
+
+PALAVRAS = (
+    "a turma lê o texto e identifica as ideias principais com apoio do professor que orienta "
+    "a discussão em grupo e regista no quadro os exemplos dados pelos alunos sobre o tema"
+).split()
+ACENTOS = "acção função área período pretérito análise conclusão exercícios síntese óptica índice ângulo".split()
+UNICODE = "→ ≥ ≤ ≠ √ π ∑ ŋ ɛ Ω".split()
+
+
+def _frase(rng: random.Random, n: int, kind: str) -> str:
+    pool = PALAVRAS
+    if kind == "acentos":
+        pool = PALAVRAS + ACENTOS * 2
+    elif kind == "unicode":
+        pool = PALAVRAS + ACENTOS + UNICODE
+    words = [rng.choice(pool) for _ in range(n)]
+    if kind == "palavra-longa":
+        words.insert(rng.randrange(len(words) + 1), "".join(rng.choice(PALAVRAS) for _ in range(8)))
+    return " ".join(words).capitalize() + "."
+
+
+def make_case(i: int, kind: str) -> tuple[dict, PlanoAula]:
+    rng = random.Random(f"{kind}-{i}")
+    duracao = "45 min" if i % 2 == 0 else "90 min"
+    n_obj = 3 if duracao == "45 min" else 5
+    size = {"curto": (3, 8), "muitas-linhas": (40, 90)}.get(kind, (15, 40))
+    n_rows = 4 if kind != "muitas-linhas" else 8
+    total = 45 if duracao == "45 min" else 90
+
+    tabela = []
+    for r in range(n_rows):
+        tabela.append([
+            str(total // n_rows),
+            FUNCOES_DIDACTICAS[r % len(FUNCOES_DIDACTICAS)],
+            _frase(rng, rng.randint(*size), kind),
+            _frase(rng, rng.randint(*size), kind),
+            _frase(rng, rng.randint(1, 4), kind),
+            _frase(rng, rng.randint(1, 5), kind),
+        ])
+    ctx = {
+        "escola": "Escola Primária Completa de " + rng.choice(["Chimoio", "Nhamatanda", "Gondola", "Manica"]),
+        "data": f"2026-03-{i % 28 + 1:02d}",
+        "disciplina": rng.choice(["Português", "Matemática", "Ciências Naturais", "História"]),
+        "classe": f"{rng.randint(1, 12)}ª",
+        "turma": rng.choice("ABCD"),
+        "unidade": _frase(rng, 4, kind),
+        "tema": _frase(rng, rng.randint(2, 6), kind),
+        "duracao": duracao,
+        "tipo_aula": "Introdução de Matéria Nova",
+        "metodos": _frase(rng, 5, kind) if i % 3 == 0 else "",
+        "meios": _frase(rng, 5, kind) if i % 3 == 1 else "",
+    }
+    plano = PlanoAula(
+        objetivo_geral=_frase(rng, rng.randint(*size), kind),
+        objetivos_especificos=[_frase(rng, rng.randint(5, 15), kind) for _ in range(n_obj)],
+        tabela=tabela,
+    )
+    return ctx, plano
+
+
+def corpus(n: int) -> list[tuple[str, dict, PlanoAula]]:
+    return [(f"{KINDS[i % len(KINDS)]}-{i // len(KINDS)}", *make_case(i // len(KINDS), KINDS[i % len(KINDS)])) for i in range(n)]
+
+
+def count_pages(pdf: bytes) -> int:
+    return len(re.findall(rb"/Type /Page\b(?!s)", pdf))
+
+
+class RecordingPDF(PDF):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rows = []
+
+    def table_row(self, data, widths, cleaned: bool = False):
+        super().table_row(data, widths, cleaned)
+        self.rows.append([self.page_no(), round(self.get_y(), 2)])
+
+
+def layout_signature(ctx: dict, plano: PlanoAula, font_mode: str, compact: bool) -> dict:
+    if compact and font_mode == "dejavu" and is_latin1(plan_texts(ctx, plano)):
+        font_mode = "core"
+    pdf = RecordingPDF(font_mode=font_mode, compact=compact)
+    pdf.set_auto_page_break(auto=False)
+    pdf.add_page()
+    draw_plan(pdf, ctx, plano)
+    return {"pages": pdf.page_no(), "rows": pdf.rows}
+
+
+def pct(values: list[float], p: float) -> float:
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(p * (len(s) - 1))))] if s else 0.0
+
+
+def bench_mode(cases, font_mode: str, compact: bool, mem_sample: int) -> dict:
+    t0 = time.perf_counter()
+    create_pdf(cases[0][1], cases[0][2], font_mode=font_mode, compact=compact)
+    first_ms = (time.perf_counter() - t0) * 1000
+
+    times, sizes, pages = [], [], []
+    start = time.perf_counter()
+    for _, ctx, plano in cases:
+        t = time.perf_counter()
+        pdf = create_pdf(ctx, plano, font_mode=font_mode, compact=compact)
+        times.append((time.perf_counter() - t) * 1000)
+        sizes.append(len(pdf))
+        pages.append(count_pages(pdf))
+    wall = time.perf_counter() - start
+
+    # memória à parte: o tracemalloc abranda a medição de tempo
+    tracemalloc.start()
+    for _, ctx, plano in cases[:mem_sample]:
+        create_pdf(ctx, plano, font_mode=font_mode, compact=compact)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "planos_s": round(len(cases) / wall, 1),
+        "primeiro_ms": round(first_ms, 1),
+        "p50_ms": round(pct(times, .5), 2),
+        "p95_ms": round(pct(times, .95), 2),
+        "max_ms": round(max(times), 2),
+        "pico_mem_kb": round(peak / 1024),
+        "bytes_medio": sum(sizes) // len(sizes),
+        "bytes_p95": int(pct(sizes, .95)),
+        "paginas": sum(pages),
+    }
+
+
+def golden_current() -> dict:
+    out = {"_template_version": PDF_TEMPLATE_VERSION}
+    for name, ctx, plano in corpus(len(KINDS) * GOLDEN_PER_KIND):
+        out[name] = {m: layout_signature(ctx, plano, fm, c) for m, (fm, c) in MODES.items()}
+        out[name]["dejavu"]["pages_pdf"] = count_pages(create_pdf(ctx, plano))
+    return out
+
+
+def check_golden(cur: dict) -> list[str]:
+    if not os.path.exists(GOLDEN_PATH):
+        return [f"sem {os.path.basename(GOLDEN_PATH)}: correr com --update-golden"]
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        gold = json.load(f)
+    diffs = []
+    for name, modes in cur.items():
+        if name.startswith("_"):
+            continue
+        for m, sig in modes.items():
+            g = gold.get(name, {}).get(m)
+            if g is None:
+                diffs.append(f"{name}/{m}: sem referência")
+                continue
+            if g.get("pages") != sig["pages"] or g.get("pages_pdf") != sig.get("pages_pdf"):
+                diffs.append(f"{name}/{m}: páginas {g.get('pages')} -> {sig['pages']}")
+            for k, (a, b) in enumerate(zip(g["rows"], sig["rows"])):
+                if a != b:
+                    diffs.append(f"{name}/{m}: linha {k + 1} (página, y) {a} -> {b}")
+                    break
+            if len(g["rows"]) != len(sig["rows"]):
+                diffs.append(f"{name}/{m}: {len(g['rows'])} -> {len(sig['rows'])} linhas")
+    return diffs
+
+
+def print_results(res: dict, prev: dict | None):
+    cols = ["planos_s", "primeiro_ms", "p50_ms", "p95_ms", "max_ms", "pico_mem_kb", "bytes_medio", "bytes_p95", "paginas"]
+    print(f"{'modo':<10}" + "".join(f"{c:>13}" for c in cols))
+    for mode, r in res.items():
+        print(f"{mode:<10}" + "".join(f"{r[c]:>13}" for c in cols))
+        if prev and mode in prev:
+            cells = []
+            for c in cols:
+                a, b = prev[mode].get(c), r[c]
+                cells.append(f"{(b - a) / a:>+12.1%} " if a else f"{'-':>13}")
+            print(f"{'  vs ref':<10}" + "".join(cells))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark + verificação de layout dos PDFs dos planos.")
+    ap.add_argument("--n", type=int, default=120, help="planos no corpus")
+    ap.add_argument("--modes", default=",".join(MODES), help="modos separados por vírgula")
+    ap.add_argument("--mem-sample", type=int, default=20, help="planos medidos com tracemalloc")
+    ap.add_argument("--json", help="guardar resultados neste ficheiro")
+    ap.add_argument("--compare", help="resultados de referência (--json de outro commit)")
+    ap.add_argument("--update-golden", action="store_true", help="regravar bench_golden.json")
+    args = ap.parse_args()
+
+    cases = corpus(args.n)
+    res = {}
+    for mode in args.modes.split(","):
+        fm, compact = MODES[mode]
+        res[mode] = bench_mode(cases, fm, compact, args.mem_sample)
+
+    prev = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            prev = json.load(f).get("resultados")
+    print(f"corpus: {len(cases)} planos ({', '.join(KINDS)}); modelo v{PDF_TEMPLATE_VERSION}")
+    print_results(res, prev)
+
+    cur = golden_current()
+    if args.update_golden:
+        with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+            json.dump(cur, f, ensure_ascii=False, indent=1)
+        print(f"golden actualizado: {len(cur) - 1} casos")
+        diffs = []
+    else:
+        diffs = check_golden(cur)
+        print("golden: OK" if not diffs else f"golden: {len(diffs)} diferença(s)")
+        for d in diffs[:30]:
+            print("  " + d)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"n": len(cases), "resultados": res}, f, indent=1)
+    sys.exit(1 if diffs else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# pdf_booklet.py
+# Caderno mensal: vários planos (plan_json) num único documento FPDF, numa só passagem.
+# Fontes e recursos partilhados (cada fonte é embutida uma vez, com os glifos de todos
+# os planos), índice com ligações no início e numeração de páginas.
+# As páginas do índice são reservadas antes dos planos e preenchidas no fim, quando já
+# se sabe a página de cada plano.
+
+import math
+
+from plan_model import PlanoAula
+from pdf_render import PDF, clean_text, draw_plan, is_latin1, plan_texts
+
+TOC_TOP = 38
+TOC_LINE_H = 6
+TOC_PER_PAGE = 38
+
+
+class BookletPDF(PDF):
+    def __init__(self, titulo: str, **kwargs):
+        super().__init__(**kwargs)
+        self.titulo = clean_text(titulo)
+        self.in_toc = False
+        self.alias_nb_pages()
+
+    def header(self):
+        if not self.in_toc:
+            return super().header()
+        self.use_font("B", 14)
+        self.cell(0, 8, self.titulo, 0, 1, "C")
+        self.use_font("B", 12)
+        self.cell(0, 8, "ÍNDICE", 0, 1, "C")
+
+    def footer(self):
+        self.set_y(-15)
+        self.use_font("I", 7)
+        self.cell(0, 10, "SDEJT - Documento para validação e uso em sala de aula", 0, 0, "C")
+        self.set_x(-30)
+        self.cell(20, 10, f"{self.page_no()}/{{nb}}", 0, 0, "R")
+
+    def fit(self, txt: str, w: float) -> str:
+        if self.get_string_width(txt) <= w:
+            return txt
+        while txt and self.get_string_width(txt + "...") > w:
+            txt = txt[:-1]
+        return txt + "..."
+
+    def write_toc(self, first_page: int, entries: list[tuple[str, int, int]]):
+        last = self.page
+        for i, (label, page, link) in enumerate(entries):
+            if i % TOC_PER_PAGE == 0:
+                self.page = first_page + i // TOC_PER_PAGE
+                self.font_family = ""  # forçar a selecção da fonte no conteúdo desta página
+                self.use_font("", 9)
+                self.set_text_color(0)
+                self.set_xy(self.l_margin, TOC_TOP)
+            self.cell(170, TOC_LINE_H, self.fit(f"{i + 1}. {label}", 168), 0, 0, "L", link=link)
+            self.cell(0, TOC_LINE_H, str(page), 0, 1, "R", link=link)
+        self.page = last
+
+
+def plan_label(ctx: dict) -> str:
+    partes = [ctx.get("data", ""), ctx.get("disciplina", ""), ctx.get("classe", ""), ctx.get("turma", ""), ctx.get("tema", "")]
+    return " | ".join(clean_text(p) for p in partes if p)
+
+
+def create_booklet(planos: list[tuple[dict, PlanoAula]], titulo: str,
+                   font_mode: str = "dejavu", compact: bool = False) -> bytes:
+    if compact and font_mode == "dejavu" and is_latin1([clean_text(titulo)] + [t for c, p in planos for t in plan_texts(c, p)]):
+        font_mode = "core"
+    pdf = BookletPDF(titulo, font_mode=font_mode, compact=compact)
+    pdf.set_auto_page_break(auto=False)
+
+    pdf.in_toc = True
+    for _ in range(max(1, math.ceil(len(planos) / TOC_PER_PAGE))):
+        pdf.add_page()
+    pdf.in_toc = False
+
+    entries = []
+    for ctx, plano in planos:
+        pdf.add_page()
+        link = pdf.add_link()
+        pdf.set_link(link, 0, pdf.page_no())
+        entries.append((plan_label(ctx), pdf.page_no(), link))
+        draw_plan(pdf, ctx, plano)
+
+    pdf.write_toc(1, entries)
+    return pdf.output(dest="S").encode("latin-1", "replace")
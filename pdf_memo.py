@@ -0,0 +1,109 @@
+# pdf_memo.py
+# Cache limitado (memória + disco) de PDFs gerados a pedido a partir de plan_json.
+# Chave: id do plano + versão do modelo do PDF (+ modo de fontes/compacto).
+# Serve também para outros bytes derivados do plano (ex.: miniaturas, suffix=".png").
+
+import os
+import threading
+from collections import OrderedDict
+
+
+class PdfMemo:
+    def __init__(self, max_mem_bytes: int = 32 * 1024 * 1024, disk_dir: str | None = None,
+                 max_disk_bytes: int = 512 * 1024 * 1024, suffix: str = ".pdf"):
+        self.suffix = suffix
+        self.max_mem_bytes = max_mem_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._mem: "OrderedDict[str, bytes]" = OrderedDict()
+        self._mem_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = {"mem": 0, "disco": 0, "falhas": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def key(plan_id: int, template_version: int, variant: str = "") -> str:
+        return f"{int(plan_id)}-v{int(template_version)}" + (f"-{variant}" if variant else "")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key + self.suffix)
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            pdf = self._mem.get(key)
+            if pdf is not None:
+                self._mem.move_to_end(key)
+                self.hits["mem"] += 1
+                return pdf
+        if self.disk_dir:
+            try:
+                with open(self._path(key), "rb") as f:
+                    pdf = f.read()
+                os.utime(self._path(key))
+            except OSError:
+                pdf = None
+            if pdf is not None:
+                self._put_mem(key, pdf)
+                with self._lock:
+                    self.hits["disco"] += 1
+                return pdf
+        with self._lock:
+            self.hits["falhas"] += 1
+        return None
+
+    def put(self, key: str, pdf: bytes):
+        self._put_mem(key, pdf)
+        if self.disk_dir:
+            tmp = self._path(key) + f".{threading.get_ident()}.tmp"
+            try:
+                with open(tmp, "wb") as f:
+                    f.write(pdf)
+                os.replace(tmp, self._path(key))
+                self._trim_disk()
+            except OSError:
+                pass
+
+    def get_or_render(self, key: str, render) -> bytes:
+        pdf = self.get(key)
+        if pdf is None:
+            pdf = render()
+            self.put(key, pdf)
+        return pdf
+
+    def _put_mem(self, key: str, pdf: bytes):
+        if len(pdf) > self.max_mem_bytes:
+            return
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._mem_bytes -= len(old)
+            self._mem[key] = pdf
+            self._mem_bytes += len(pdf)
+            while self._mem_bytes > self.max_mem_bytes:
+                _, ev = self._mem.popitem(last=False)
+                self._mem_bytes -= len(ev)
+
+    def _trim_disk(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(self.suffix):
+                continue
+            p = os.path.join(self.disk_dir, name)
+            try:
+                stt = os.stat(p)
+            except OSError:
+                continue
+            entries.append((stt.st_mtime, stt.st_size, p))
+            total += stt.st_size
+        if total <= self.max_disk_bytes:
+            return
+        for _, size, p in sorted(entries):
+            try:
+                os.remove(p)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_disk_bytes:
+                break
@@ -0,0 +1,136 @@
+# pdf_pool.py
+# Renderização de PDFs num pool de processos (fora do thread do script Streamlit).
+# Recebe ctx + plano serializados (dict) e devolve bytes; fila limitada, timeout e métricas.
+# O pool é o único caminho de renderização: com a fila cheia espera até slot_wait_s por um
+# lugar e depois recusa (PdfPoolBusy). Timeout: PdfPoolTimeout, e o lugar na fila só é
+# libertado quando o trabalho acaba de facto (não se pode parar um PDF já em curso).
+# Pool partido (processo morto): é recriado, e só esse pedido é gerado no próprio processo
+# (contado em "locais").
+
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from plan_model import PlanoAula
+from pdf_render import create_pdf
+
+
+class PdfPoolBusy(RuntimeError):
+    pass
+
+
+class PdfPoolTimeout(TimeoutError):
+    pass
+
+
+def render_pdf(ctx: dict, plano: dict, font_mode: str = "dejavu", compact: bool = False) -> tuple[bytes, float]:
+    """Executa no processo do pool: devolve (pdf, ms de renderização)."""
+    t0 = time.perf_counter()
+    pdf = create_pdf(ctx, PlanoAula(**plano), font_mode=font_mode, compact=compact)
+    return pdf, (time.perf_counter() - t0) * 1000
+
+
+class PdfPool:
+    def __init__(self, workers: int | None = None, max_pending: int | None = None, timeout_s: float = 30,
+                 slot_wait_s: float = 0.5):
+        self.workers = workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.timeout_s = timeout_s
+        self.slot_wait_s = slot_wait_s
+        self._slots = threading.BoundedSemaphore(max_pending or self.workers * 4)
+        self._lock = threading.Lock()
+        self._executor = self._new_executor()
+        self._m = {"submetidos": 0, "concluidos": 0, "falhas": 0, "timeouts": 0, "recusados": 0, "reinicios": 0, "locais": 0,
+                   "em_curso": 0, "render_ms_total": 0.0, "espera_ms_total": 0.0, "espera_ms_max": 0.0}
+        atexit.register(self.shutdown)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn: não herda threads/ligações do processo Streamlit
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is not broken:
+                return  # outro pedido já o recriou
+            self._executor = self._new_executor()
+            self._m["reinicios"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, *args):
+        ex = self._executor
+        try:
+            return ex, ex.submit(render_pdf, *args)
+        except BrokenProcessPool:
+            self._restart(ex)
+            ex = self._executor
+            return ex, ex.submit(render_pdf, *args)
+
+    def _done(self, _fut):
+        self._count(em_curso=-1)
+        self._slots.release()
+
+    def _count(self, **inc):
+        with self._lock:
+            for k, v in inc.items():
+                self._m[k] += v
+
+    def _render_local(self, ctx: dict, plano: dict, font_mode: str, compact: bool) -> bytes:
+        # só com o pool partido (a ser recriado): este pedido não fica sem PDF
+        self._count(locais=1)
+        return render_pdf(ctx, plano, font_mode, compact)[0]
+
+    def render(self, ctx: dict, plano: dict, font_mode: str = "dejavu", compact: bool = False,
+               timeout_s: float | None = None, slot_wait_s: float | None = None) -> bytes:
+        timeout_s = self.timeout_s if timeout_s is None else timeout_s
+        slot_wait_s = self.slot_wait_s if slot_wait_s is None else slot_wait_s
+        if not self._slots.acquire(timeout=slot_wait_s):
+            self._count(recusados=1)
+            raise PdfPoolBusy("Fila de PDFs cheia.")
+        t0 = time.perf_counter()
+        self._count(submetidos=1, em_curso=1)
+        try:
+            ex, fut = self._submit(ctx, plano, font_mode, compact)
+        except BrokenProcessPool:
+            self._done(None)
+            return self._render_local(ctx, plano, font_mode, compact)
+        except Exception:
+            self._done(None)
+            self._count(falhas=1)
+            raise
+        fut.add_done_callback(self._done)
+        try:
+            pdf, render_ms = fut.result(timeout=timeout_s)
+        except FutureTimeout:
+            fut.cancel()  # só resulta se ainda estiver na fila
+            self._count(timeouts=1)
+            raise PdfPoolTimeout(f"PDF não ficou pronto em {timeout_s:g}s.")
+        except BrokenProcessPool:
+            self._count(falhas=1)
+            self._restart(ex)
+            return self._render_local(ctx, plano, font_mode, compact)
+        except Exception:
+            self._count(falhas=1)
+            raise
+        espera_ms = max(0.0, (time.perf_counter() - t0) * 1000 - render_ms)
+        with self._lock:
+            self._m["concluidos"] += 1
+            self._m["render_ms_total"] += render_ms
+            self._m["espera_ms_total"] += espera_ms
+            self._m["espera_ms_max"] = max(self._m["espera_ms_max"], espera_ms)
+        return pdf
+
+    def metrics(self) -> dict:
+        with self._lock:
+            m = dict(self._m)
+        n = max(1, m["concluidos"])
+        m["workers"] = self.workers
+        m["render_ms_medio"] = round(m.pop("render_ms_total") / n, 1)
+        m["espera_ms_media"] = round(m.pop("espera_ms_total") / n, 1)
+        m["espera_ms_max"] = round(m["espera_ms_max"], 1)
+        return m
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,734 @@
+# pdf_render.py
+# Geração do PDF do plano (FPDF), sem dependências do Streamlit.
+# Modo "dejavu" (padrão): fontes DejaVu do repositório (Unicode), lidas e descodificadas
+# uma vez por processo (ParsedTTF); cada documento embute só os glifos que usa, montados
+# a partir dessas tabelas (sem reler o .ttf). Modo "core": Arial.
+# compact=True: saída mais pequena (sem fontes embutidas quando o texto cabe em Latin-1,
+# um bloco de texto por célula, menos operadores e objectos).
+# A tabela de actividades é paginada numa só passagem: cada célula é quebrada em
+# linhas uma vez, com larguras de glifos em cache por fonte, e desenhada com text().
+
+import os
+import re
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+from fpdf import FPDF
+from fpdf.php import UTF8ToUTF16BE
+from fpdf.ttfonts import GF_MORE, GF_SCALE, GF_TWOBYTWO, GF_WORDS, GF_XYSCALE, TTFontFile
+
+from plan_model import PlanoAula
+
+# subir sempre que header/footer/layout do PDF mudam (planos antigos ficam para re-renderizar)
+PDF_TEMPLATE_VERSION = 1
+
+TABLE_WIDTHS = [12, 32, 52, 52, 21, 21]
+TABLE_HEADERS = ["TEMPO", "F. DIDÁTICA", "ACTIV. PROFESSOR", "ACTIV. ALUNO", "MÉTODOS", "MEIOS"]
+ROW_LINE_H = 4
+PAGE_BOTTOM = 270
+
+
+FONT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEJAVU_FILES = {"": "DejaVuSans.ttf", "B": "DejaVuSans-Bold.ttf"}
+FONT_MODES = ("dejavu", "core")
+
+
+def clean_text(text) -> str:
+    if text is None:
+        return "-"
+    t = str(text).strip()
+    for k, v in {"–": "-", "—": "-", "“": '"', "”": '"', "‘": "'", "’": "'", "…": "...", "•": "-"}.items():
+        t = t.replace(k, v)
+    return " ".join(t.replace("\r", " ").replace("\n", " ").split())
+
+
+# =========================
+# MÉTRICAS DE TEXTO (cache por processo)
+# =========================
+class GlyphWidths(dict):
+    """Largura (unidades de 1/1000 em) por carácter, preenchida à medida do uso."""
+
+    def __init__(self, font: dict):
+        super().__init__()
+        self._cw = font["cw"]
+        self._uni = font.get("type") == "TTF"
+        self._missing = (font.get("desc") or {}).get("MissingWidth") or 500
+        self.words: dict[str, int] = {}
+
+    def __missing__(self, c):
+        if self._uni:
+            o = ord(c)
+            w = self._cw[o] if o < len(self._cw) else self._missing
+        else:
+            w = self._cw.get(c, 0)
+        self[c] = w
+        return w
+
+    def word(self, word: str) -> int:
+        w = self.words.get(word)
+        if w is None:
+            w = self.words[word] = sum(map(self.__getitem__, word))
+        return w
+
+
+_GLYPH_WIDTHS: dict[str, GlyphWidths] = {}
+
+
+def glyph_widths(font: dict) -> GlyphWidths:
+    gw = _GLYPH_WIDTHS.get(font["name"])
+    if gw is None:
+        gw = _GLYPH_WIDTHS[font["name"]] = GlyphWidths(font)
+    return gw
+
+
+def _split_word(word: str, wmax: float, cw: GlyphWidths) -> list[str]:
+    # palavra maior que a célula: quebra por caracteres (como multi_cell)
+    parts = []
+    start = 0
+    l = 0
+    for i, c in enumerate(word):
+        l += cw[c]
+        if l > wmax:
+            end = i if i > start else i + 1
+            parts.append(word[start:end])
+            start = end
+            l = cw.word(word[start:i + 1]) if start <= i else 0
+    parts.append(word[start:])
+    return parts
+
+
+def wrap_lines(txt: str, wmax: float, cw: GlyphWidths) -> list[str]:
+    """Mesma quebra de linhas que FPDF.multi_cell (wmax em unidades de 1/1000 em), mas por palavras."""
+    lines = []
+    space = cw[" "]
+    for para in txt.split("\n"):
+        line = []
+        l = 0
+        for word in para.split(" "):
+            ww = cw.word(word)
+            if line and l + space + ww <= wmax:
+                line.append(word)
+                l += space + ww
+                continue
+            if line:
+                lines.append(" ".join(line))
+            if ww > wmax:
+                parts = _split_word(word, wmax, cw)
+                lines.extend(parts[:-1])
+                word = parts[-1]
+                ww = cw.word(word)
+            line = [word]
+            l = ww
+        lines.append(" ".join(line))
+    return lines
+
+
+# =========================
+# FONTES TTF (cache por processo)
+# =========================
+_TTF_METRICS: dict[str, dict] = {}
+_TTF_LOCK = threading.Lock()
+
+
+def ttf_metrics(path: str) -> dict:
+    """Métricas da fonte TTF (mesmo formato que FPDF.add_font), lidas uma vez por processo."""
+    with _TTF_LOCK:
+        font = _TTF_METRICS.get(path)
+        if font is None:
+            ttf = TTFontFile()
+            ttf.getMetrics(path)
+            font = _TTF_METRICS[path] = {
+                "name": re.sub("[ ()]", "", ttf.fullName),
+                "type": "TTF",
+                "desc": {
+                    "Ascent": int(round(ttf.ascent, 0)),
+                    "Descent": int(round(ttf.descent, 0)),
+                    "CapHeight": int(round(ttf.capHeight, 0)),
+                    "Flags": ttf.flags,
+                    "FontBBox": "[%s %s %s %s]" % tuple(int(round(b, 0)) for b in ttf.bbox),
+                    "ItalicAngle": int(ttf.italicAngle),
+                    "StemV": int(round(ttf.stemV, 0)),
+                    "MissingWidth": int(round(ttf.defaultWidth, 0)),
+                },
+                "up": round(ttf.underlinePosition),
+                "ut": round(ttf.underlineThickness),
+                "originalsize": os.stat(path).st_size,
+                "cw": ttf.charWidths,
+            }
+        return font
+
+
+class ParsedTTF:
+    """Tabelas do .ttf lidas e descodificadas uma vez (cmap, hmtx, loca, glyf e as copiadas)."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            data = f.read()
+        n = struct.unpack_from(">H", data, 4)[0]
+        self.tables = {}
+        for i in range(n):
+            tag, _, off, length = struct.unpack_from(">4sLLL", data, 12 + 16 * i)
+            self.tables[tag.decode("latin-1")] = data[off:off + length]
+        t = self.tables
+        self.index_to_loc = struct.unpack_from(">H", t["head"], 50)[0]
+        self.n_hmetrics = struct.unpack_from(">H", t["hhea"], 34)[0]
+        self.num_glyphs = struct.unpack_from(">H", t["maxp"], 4)[0]
+        self.char_to_glyph = self._cmap(data)
+        loca = t["loca"]
+        if self.index_to_loc == 0:
+            self.glyph_pos = [x * 2 for x in struct.unpack_from(f">{self.num_glyphs}H", loca)]
+        else:
+            self.glyph_pos = list(struct.unpack_from(f">{self.num_glyphs}L", loca))
+        self.glyf = t["glyf"]
+        self.hmtx = t["hmtx"]
+
+    def _cmap(self, data: bytes) -> dict[int, int]:
+        # mesma escolha de subtabela que TTFontFile.makeSubset (3/10 formato 12, senão 3/1 ou 0/* formato 4)
+        cmap = self.tables["cmap"]
+        for i in range(struct.unpack_from(">H", cmap, 2)[0]):
+            pid, eid, off = struct.unpack_from(">HHL", cmap, 4 + 8 * i)
+            fmt = struct.unpack_from(">H", cmap, off)[0]
+            if pid == 3 and eid == 10 and fmt == 12:
+                return self._cmap12(cmap, off)
+            if (pid == 3 and eid == 1 or pid == 0) and fmt == 4:
+                return self._cmap4(cmap, off)
+        raise RuntimeError("fonte sem cmap Unicode")
+
+    @staticmethod
+    def _cmap4(cmap: bytes, off: int) -> dict[int, int]:
+        limit = off + struct.unpack_from(">H", cmap, off + 2)[0]
+        seg = struct.unpack_from(">H", cmap, off + 6)[0] // 2
+        p = off + 14
+        end = struct.unpack_from(f">{seg}H", cmap, p)
+        start = struct.unpack_from(f">{seg}H", cmap, p + 2 * seg + 2)
+        delta = struct.unpack_from(f">{seg}h", cmap, p + 4 * seg + 2)
+        ro_start = p + 6 * seg + 2
+        ro = struct.unpack_from(f">{seg}H", cmap, ro_start)
+        out = {}
+        for n in range(seg):
+            for u in range(start[n], end[n] + 1):
+                if ro[n] == 0:
+                    g = (u + delta[n]) & 0xFFFF
+                else:
+                    o = ro_start + 2 * n + (u - start[n]) * 2 + ro[n]
+                    g = 0 if o >= limit else struct.unpack_from(">H", cmap, o)[0]
+                    if g:
+                        g = (g + delta[n]) & 0xFFFF
+                out[u] = g
+        return out
+
+    @staticmethod
+    def _cmap12(cmap: bytes, off: int) -> dict[int, int]:
+        out = {}
+        for i in range(struct.unpack_from(">L", cmap, off + 12)[0]):
+            a, b, g = struct.unpack_from(">LLL", cmap, off + 16 + 12 * i)
+            for u in range(a, b + 1):
+                out[u] = g + (u - a)
+        return out
+
+    def _glyph(self, gid: int) -> bytes:
+        if gid + 1 >= len(self.glyph_pos):
+            return b""  # como TTFontFile: o último glifo da loca não é lido
+        a, b = self.glyph_pos[gid], self.glyph_pos[gid + 1]
+        return self.glyf[a:b]
+
+    def _hmetric(self, gid: int) -> bytes:
+        if gid < self.n_hmetrics:
+            return self.hmtx[gid * 4:gid * 4 + 4]
+        last = (self.n_hmetrics - 1) * 4
+        return self.hmtx[last:last + 2] + self.hmtx[self.n_hmetrics * 2 + gid * 2:self.n_hmetrics * 2 + gid * 2 + 2]
+
+    def _components(self, gid: int, glyph_set: dict, glyphs: list):
+        data = self._glyph(gid)
+        if len(data) < 2 or struct.unpack_from(">h", data, 0)[0] >= 0:
+            return
+        p, flags = 10, GF_MORE
+        while flags & GF_MORE:
+            flags, comp = struct.unpack_from(">HH", data, p)
+            if comp not in glyph_set:
+                glyph_set[comp] = len(glyphs)
+                glyphs.append((comp, 1))
+            self._components(comp, glyph_set, glyphs)
+            p += 4 + (4 if flags & GF_WORDS else 2)
+            p += 2 if flags & GF_SCALE else 4 if flags & GF_XYSCALE else 8 if flags & GF_TWOBYTWO else 0
+
+    def subset(self, codes) -> tuple[dict, dict[int, int], int]:
+        """(tabelas do subconjunto, unicode -> novo glifo, maior código) — como TTFontFile.makeSubset."""
+        glyphs = [(0, 0)]
+        seen = {(0, 0)}
+        sub_c2g = {}
+        codes = set(codes)  # a lista do FPDF tem repetições; o resultado não depende da ordem
+        max_uni = max(codes, default=0)
+        for code in codes:
+            g = self.char_to_glyph.get(code)
+            if g is not None:
+                if (g, code) not in seen:
+                    seen.add((g, code))
+                    glyphs.append((g, code))
+                sub_c2g[code] = g
+        glyphs.sort()
+        glyph_set = {g: n for n, (g, _) in enumerate(glyphs)}
+        code_to_glyph = {u: glyph_set[g] for u, g in sorted(sub_c2g.items())}
+        for g, _ in list(glyphs):
+            self._components(g, glyph_set, glyphs)
+
+        t = self.tables
+        out = {"name": t["name"]}
+        for tag in ("cvt ", "fpgm", "prep", "gasp"):
+            if tag in t:
+                out[tag] = t[tag]
+        out["post"] = b"\x00\x03\x00\x00" + t["post"][4:16] + b"\x00" * 16
+
+        c2g = {u: g for u, g in code_to_glyph.items() if u != 0}
+        ranges: dict[int, list[int]] = {}
+        rid, prev_c, prev_g = 0, -2, -1
+        for c, g in sorted(c2g.items()):
+            if c == prev_c + 1 and g == prev_g + 1:
+                ranges[rid].append(g)
+            else:
+                rid = c
+                ranges[rid] = [g]
+            prev_c, prev_g = c, g
+        n_glyphs = len(glyphs)
+        seg = len(ranges) + 1
+        sr, es = 1, 0
+        while sr * 2 <= seg:
+            sr, es = sr * 2, es + 1
+        sr *= 2
+        rs = sorted(ranges.items())
+        cm = [0, 1, 3, 1, 0, 12, 4, 16 + 8 * seg + n_glyphs + 1, 0, seg * 2, sr, es, seg * 2 - sr]
+        cm += [a + len(r) - 1 for a, r in rs] + [0xFFFF, 0]
+        cm += [a for a, _ in rs] + [0xFFFF]
+        cm += [-(a - r[0]) for a, r in rs] + [1]
+        cm += [0] * len(rs) + [0]
+        for _, r in rs:
+            cm += r
+        cm.append(0)
+        out["cmap"] = b"".join(struct.pack(">H" if v >= 0 else ">h", v) for v in cm)
+
+        glyf, offsets, hmtx, pos = [], [], [], 0
+        for g, _ in glyphs:
+            hmtx.append(self._hmetric(g))
+            offsets.append(pos)
+            data = self._glyph(g)
+            if len(data) > 2 and struct.unpack_from(">H", data, 0)[0] & 0x8000:
+                data = bytearray(data)
+                p, flags = 10, GF_MORE
+                while flags & GF_MORE:
+                    flags, comp = struct.unpack_from(">HH", data, p)
+                    struct.pack_into(">H", data, p + 2, glyph_set[comp])
+                    p += 4 + (4 if flags & GF_WORDS else 2)
+                    p += 2 if flags & GF_SCALE else 4 if flags & GF_XYSCALE else 8 if flags & GF_TWOBYTWO else 0
+                data = bytes(data)
+            glyf.append(data)
+            pos += len(data)
+            if pos % 4:
+                glyf.append(b"\0" * (4 - pos % 4))
+                pos += 4 - pos % 4
+        offsets.append(pos)
+        out["glyf"] = b"".join(glyf)
+        out["hmtx"] = b"".join(hmtx)
+        if (pos + 1) >> 1 > 0xFFFF:
+            loc_fmt, out["loca"] = 1, struct.pack(f">{len(offsets)}L", *offsets)
+        else:
+            loc_fmt, out["loca"] = 0, struct.pack(f">{len(offsets)}H", *(o // 2 for o in offsets))
+        head = bytearray(t["head"])
+        struct.pack_into(">H", head, 50, loc_fmt)
+        head[8:12] = b"\0\0\0\0"
+        out["head"] = bytes(head)
+        hhea = bytearray(t["hhea"])
+        struct.pack_into(">H", hhea, 34, n_glyphs)
+        out["hhea"] = bytes(hhea)
+        maxp = bytearray(t["maxp"])
+        struct.pack_into(">H", maxp, 4, n_glyphs)
+        out["maxp"] = bytes(maxp)
+        out["OS/2"] = t["OS/2"]
+        return out, code_to_glyph, max_uni
+
+
+def _checksum(data: bytes) -> int:
+    data += b"\0" * (-len(data) % 4)
+    return sum(struct.unpack(f">{len(data) // 4}L", data)) & 0xFFFFFFFF
+
+
+def ttf_stream(tables: dict) -> bytes:
+    """Ficheiro TTF a partir das tabelas (como TTFontFile.endTTFile, com as somas em struct)."""
+    n = len(tables)
+    sr, es = 1, 0
+    while sr * 2 <= n:
+        sr, es = sr * 2, es + 1
+    sr *= 16
+    out = [struct.pack(">LHHHH", 0x00010000, n, sr, es, n * 16 - sr)]
+    offset = 12 + n * 16
+    items = sorted(tables.items())
+    for tag, data in items:
+        if tag == "head":
+            head_start = offset
+        out.append(tag.encode("latin-1") + struct.pack(">LLL", _checksum(data), offset, len(data)))
+        offset += (len(data) + 3) & ~3
+    for _, data in items:
+        out.append(data + b"\0" * (-len(data) % 4))
+    stm = bytearray(b"".join(out))
+    struct.pack_into(">L", stm, head_start + 8, (0xB1B0AFBA - _checksum(bytes(stm))) & 0xFFFFFFFF)
+    return bytes(stm)
+
+
+_PARSED_TTF: dict[str, ParsedTTF] = {}
+
+
+def parsed_ttf(path: str) -> ParsedTTF:
+    with _TTF_LOCK:
+        f = _PARSED_TTF.get(path)
+        if f is None:
+            f = _PARSED_TTF[path] = ParsedTTF(path)
+        return f
+
+
+_SUBSETS: "OrderedDict[tuple, tuple]" = OrderedDict()
+SUBSET_CACHE = 128
+
+
+def ttf_subset(path: str, codes) -> tuple[bytes, dict, int]:
+    """(ficheiro TTF do subconjunto, unicode -> glifo, maior código) a partir da fonte já
+    lida (ParsedTTF); cache por conjunto de caracteres (a ordem/repetições da lista do
+    FPDF não contam)."""
+    key = (path, frozenset(codes))
+    with _TTF_LOCK:
+        hit = _SUBSETS.get(key)
+        if hit is not None:
+            _SUBSETS.move_to_end(key)
+            return hit
+    tables, code_to_glyph, max_uni = parsed_ttf(path).subset(codes)
+    hit = (ttf_stream(tables), code_to_glyph, max_uni)
+    with _TTF_LOCK:
+        _SUBSETS[key] = hit
+        while len(_SUBSETS) > SUBSET_CACHE:
+            _SUBSETS.popitem(last=False)
+    return hit
+
+
+TO_UNICODE = (
+    "/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n/CIDSystemInfo\n"
+    "<</Registry (Adobe)\n/Ordering (UCS)\n/Supplement 0\n>> def\n"
+    "/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n"
+    "1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n"
+    "1 beginbfrange\n<0000> <FFFF> <0000>\nendbfrange\n"
+    "endcmap\nCMapName currentdict /CMap defineresource pop\nend\nend"
+)
+
+
+def is_latin1(texts) -> bool:
+    try:
+        for t in texts:
+            t.encode("latin-1")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+class PDF(FPDF):
+    def __init__(self, *args, font_mode: str = "dejavu", compact: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.compact = compact
+        self.family = "Arial"
+        if font_mode == "dejavu" and all(os.path.exists(os.path.join(FONT_DIR, f)) for f in DEJAVU_FILES.values()):
+            for style, fname in DEJAVU_FILES.items():
+                self.add_cached_ttf("DejaVu", style, os.path.join(FONT_DIR, fname))
+            self.family = "DejaVu"
+
+    def add_cached_ttf(self, family: str, style: str, path: str):
+        """Como add_font(..., uni=True), mas com as métricas em cache (sem ler o .ttf nem criar .pkl)."""
+        fontkey = family.lower() + style
+        if fontkey in self.fonts:
+            return
+        font = ttf_metrics(path)
+        self.fonts[fontkey] = {
+            "i": len(self.fonts) + 1, "type": "TTF",
+            "name": font["name"], "desc": font["desc"],
+            "up": font["up"], "ut": font["ut"],
+            "cw": font["cw"],
+            "ttffile": path, "fontkey": fontkey,
+            "subset": list(range(0, 57 if hasattr(self, "str_alias_nb_pages") else 32)),
+            "unifilename": None,
+        }
+        self.font_files[fontkey] = {"length1": font["originalsize"], "type": "TTF", "ttffile": path}
+        self.font_files[path] = {"type": "TTF"}
+
+    def _putfonts(self):
+        # Mesmos objectos que FPDF._putfonts, mas o subconjunto TTF vem de ttf_subset (fonte
+        # lida uma vez por processo) em vez de TTFontFile.makeSubset. Só nesta classe: o
+        # módulo fpdf fica como está. Fontes que este PDF não usa: caminho original.
+        if self.diffs or any(f["type"] not in ("core", "TTF") for f in self.fonts.values()) \
+                or any(f.get("type") != "TTF" for f in self.font_files.values()):
+            return super()._putfonts()
+        for _, k, font in sorted(((f["i"], k, f) for k, f in self.fonts.items()), key=lambda t: t[:2]):
+            self.fonts[k]["n"] = self.n + 1
+            if font["type"] == "core":
+                self._newobj()
+                self._out("<</Type /Font")
+                self._out("/BaseFont /" + font["name"])
+                self._out("/Subtype /Type1")
+                if font["name"] not in ("Symbol", "ZapfDingbats"):
+                    self._out("/Encoding /WinAnsiEncoding")
+                self._out(">>")
+                self._out("endobj")
+            else:
+                self._put_ttf(font)
+
+    def _put_ttf(self, font):
+        fontname = "MPDFAA+" + font["name"]
+        subset = font["subset"]
+        del subset[0]
+        ttfontstream, code_to_glyph, max_uni = ttf_subset(font["ttffile"], subset)
+        fontstream = zlib.compress(ttfontstream)
+
+        # Type0 + CIDFontType2
+        self._newobj()
+        self._out("<</Type /Font")
+        self._out("/Subtype /Type0")
+        self._out("/BaseFont /" + fontname)
+        self._out("/Encoding /Identity-H")
+        self._out("/DescendantFonts [" + str(self.n + 1) + " 0 R]")
+        self._out("/ToUnicode " + str(self.n + 2) + " 0 R")
+        self._out(">>")
+        self._out("endobj")
+        self._newobj()
+        self._out("<</Type /Font")
+        self._out("/Subtype /CIDFontType2")
+        self._out("/BaseFont /" + fontname)
+        self._out("/CIDSystemInfo " + str(self.n + 2) + " 0 R")
+        self._out("/FontDescriptor " + str(self.n + 3) + " 0 R")
+        if font["desc"].get("MissingWidth"):
+            self._out("/DW %d" % font["desc"]["MissingWidth"])
+        self._putTTfontwidths(font, max_uni)
+        self._out("/CIDToGIDMap " + str(self.n + 4) + " 0 R")
+        self._out(">>")
+        self._out("endobj")
+
+        # ToUnicode, CIDSystemInfo, FontDescriptor
+        self._newobj()
+        self._out("<</Length " + str(len(TO_UNICODE)) + ">>")
+        self._putstream(TO_UNICODE)
+        self._out("endobj")
+        self._newobj()
+        self._out("<</Registry (Adobe)")
+        self._out("/Ordering (UCS)")
+        self._out("/Supplement 0")
+        self._out(">>")
+        self._out("endobj")
+        self._newobj()
+        self._out("<</Type /FontDescriptor")
+        self._out("/FontName /" + fontname)
+        for kd in ("Ascent", "Descent", "CapHeight", "Flags", "FontBBox", "ItalicAngle", "StemV", "MissingWidth"):
+            v = font["desc"][kd]
+            if kd == "Flags":
+                v = (v | 4) & ~32  # sem a flag SYMBOLIC
+            self._out(" /%s %s" % (kd, v))
+        self._out("/FontFile2 " + str(self.n + 2) + " 0 R")
+        self._out(">>")
+        self._out("endobj")
+
+        # CIDToGIDMap
+        cidtogid = bytearray(256 * 256 * 2)
+        for cc, glyph in code_to_glyph.items():
+            cidtogid[cc * 2] = glyph >> 8
+            cidtogid[cc * 2 + 1] = glyph & 0xFF
+        cidtogid = zlib.compress(bytes(cidtogid))
+        self._newobj()
+        self._out("<</Length " + str(len(cidtogid)))
+        self._out("/Filter /FlateDecode")
+        self._out(">>")
+        self._putstream(cidtogid)
+        self._out("endobj")
+
+        # ficheiro da fonte
+        self._newobj()
+        self._out("<</Length " + str(len(fontstream)))
+        self._out("/Filter /FlateDecode")
+        self._out("/Length1 " + str(len(ttfontstream)))
+        self._out(">>")
+        self._putstream(fontstream)
+        self._out("endobj")
+
+    def _putTTfontwidths(self, font, maxUni):
+        # o FPDF testa "cid in font['subset']" (lista) para cada código até maxUni
+        super()._putTTfontwidths({**font, "subset": set(font["subset"])}, maxUni)
+
+    def normalize_text(self, txt):
+        # fontes core só têm Latin-1: o resto vira "?" em vez de falhar no output
+        if not self.unifontsubset and isinstance(txt, str):
+            return txt.encode("latin-1", "replace").decode("latin-1")
+        return super().normalize_text(txt)
+
+    def use_font(self, style: str, size: float):
+        if style == "I" and self.family == "DejaVu":
+            style = ""  # sem itálico nas fontes do repositório
+        self.set_font(self.family, style, size)
+
+    def header(self):
+        self.use_font("B", 12)
+        self.cell(0, 5, "REPÚBLICA DE MOÇAMBIQUE", 0, 1, "C")
+        self.use_font("B", 10)
+        self.cell(0, 5, "GOVERNO DO DISTRITO", 0, 1, "C")
+        self.cell(0, 5, "SERVIÇO DISTRITAL DE EDUCAÇÃO, JUVENTUDE E TECNOLOGIA", 0, 1, "C")
+        self.ln(5)
+        self.use_font("B", 14)
+        self.cell(0, 10, "PLANO DE AULA", 0, 1, "C")
+        self.ln(2)
+
+    def footer(self):
+        self.set_y(-15)
+        self.use_font("I", 7)
+        self.cell(0, 10, "SDEJT - Documento para validação e uso em sala de aula", 0, 0, "C")
+
+    def draw_table_header(self, widths):
+        self.use_font("B", 7)
+        self.set_fill_color(220, 220, 220)
+        for i, h in enumerate(TABLE_HEADERS):
+            self.cell(widths[i], 6, h, 1, 0, "C", True)
+        self.ln()
+        if self.compact:
+            # cor de preenchimento = cor do texto: evita "q ... Q" em cada texto
+            self.set_fill_color(0)
+            self.set_text_color(0)
+
+    def layout_row(self, row: list[str], widths) -> tuple[list[list[str]], float]:
+        """Quebra as células (já limpas) na fonte actual; devolve (linhas, altura)."""
+        cw = glyph_widths(self.current_font)
+        scale = 1000.0 / self.font_size
+        cells = [wrap_lines(txt, (w - 2 * self.c_margin) * scale, cw) for txt, w in zip(row, widths)]
+        height = max(1, max(len(c) for c in cells)) * ROW_LINE_H + 4
+        return cells, height
+
+    def table_row(self, data, widths, cleaned: bool = False):
+        row = data if cleaned else [clean_text(x) for x in data]
+        self.use_font("", 8)
+        cells, height = self.layout_row(row, widths)
+
+        if self.get_y() + height > PAGE_BOTTOM:
+            self.add_page()
+            self.draw_table_header(widths)
+            self.use_font("", 8)
+
+        x0 = 10
+        y0 = self.get_y()
+        dy = 0.5 * ROW_LINE_H + 0.3 * self.font_size
+        if self.compact:
+            self._compact_row(cells, widths, x0, y0, dy, height)
+            self.set_y(y0 + height)
+            return
+
+        x = x0
+        for lines, w in zip(cells, widths):
+            tx = x + self.c_margin
+            for n, line in enumerate(lines):
+                if line:
+                    self.text(tx, y0 + n * ROW_LINE_H + dy, line)
+            x += w
+
+        x = x0
+        for w in widths:
+            self.rect(x, y0, w, height)
+            x += w
+
+        self.set_y(y0 + height)
+
+    def _tj(self, txt: str) -> str:
+        txt = self.normalize_text(txt)
+        if self.unifontsubset:
+            self.current_font["subset"].extend(ord(c) for c in txt)
+            return self._escape(UTF8ToUTF16BE(txt, False))
+        return self._escape(txt)
+
+    def _compact_row(self, cells, widths, x0, y0, dy, height):
+        # um BT por célula (linhas com T*) e um só traço para as 6 bordas
+        k = self.k
+        ops = []
+        x = x0
+        for lines, w in zip(cells, widths):
+            while lines and not lines[-1]:
+                lines = lines[:-1]
+            if lines:
+                ops.append("BT %.2f %.2f Td %.2f TL" % ((x + self.c_margin) * k, (self.h - (y0 + dy)) * k, ROW_LINE_H * k))
+                for n, line in enumerate(lines):
+                    ops.append(("T* " if n else "") + (f"({self._tj(line)}) Tj" if line else ""))
+                ops.append("ET")
+            x += w
+        s = " ".join(op for op in ops if op)
+        if self.color_flag:
+            s = "q " + self.text_color + " " + s + " Q"
+        self._out(s)
+
+        rects = []
+        x = x0
+        for w in widths:
+            rects.append("%.2f %.2f %.2f %.2f re" % (x * k, (self.h - y0) * k, w * k, -height * k))
+            x += w
+        self._out(" ".join(rects) + " S")
+
+
+def plan_texts(ctx: dict, plano: PlanoAula) -> list[str]:
+    texts = [clean_text(v) for v in ctx.values() if isinstance(v, str)]
+    texts += [clean_text(plano.objetivo_geral)] + [clean_text(x) for x in plano.objetivos_especificos]
+    texts += [clean_text(c) for row in plano.tabela for c in row]
+    return texts
+
+
+def create_pdf(ctx: dict, plano: PlanoAula, font_mode: str = "dejavu", compact: bool = False) -> bytes:
+    if compact and font_mode == "dejavu" and is_latin1(plan_texts(ctx, plano)):
+        # fontes core não são embutidas: usar quando todo o texto é Latin-1
+        font_mode = "core"
+    pdf = PDF(font_mode=font_mode, compact=compact)
+    pdf.set_auto_page_break(auto=False)
+    pdf.add_page()
+    draw_plan(pdf, ctx, plano)
+    return pdf.output(dest="S").encode("latin-1", "replace")
+
+
+def draw_plan(pdf: PDF, ctx: dict, plano: PlanoAula):
+    """Desenha o plano a partir da posição actual (página já aberta)."""
+    pdf.use_font("", 10)
+    pdf.cell(130, 7, f"Escola: {clean_text(ctx['escola'])}", 0, 0)
+    pdf.cell(0, 7, f"Data: {clean_text(ctx['data'])}", 0, 1)
+
+    pdf.cell(
+        0, 7,
+        f"Disciplina: {clean_text(ctx['disciplina'])}   Classe: {clean_text(ctx['classe'])}   Turma: {clean_text(ctx['turma'])}",
+        0, 1
+    )
+    pdf.cell(0, 7, f"Unidade Temática: {clean_text(ctx['unidade'])}", 0, 1)
+    pdf.use_font("B", 10)
+    pdf.cell(0, 7, f"Tema: {clean_text(ctx['tema'])}", 0, 1)
+
+    pdf.use_font("", 10)
+    pdf.cell(0, 7, f"Duração: {clean_text(ctx['duracao'])}   Tipo: {clean_text(ctx['tipo_aula'])}", 0, 1)
+
+    if ctx.get("metodos"):
+        pdf.multi_cell(0, 6, f"Métodos sugeridos: {clean_text(ctx['metodos'])}")
+    if ctx.get("meios"):
+        pdf.multi_cell(0, 6, f"Meios/Materiais sugeridos: {clean_text(ctx['meios'])}")
+    if ctx.get("upload_details"):
+        pdf.multi_cell(0, 6, f"Detalhes do ficheiro (opcional): {clean_text(ctx['upload_details'])}")
+
+    pdf.line(10, pdf.get_y() + 2, 200, pdf.get_y() + 2)
+    pdf.ln(5)
+
+    pdf.use_font("B", 10)
+    pdf.cell(0, 6, "OBJECTIVO GERAL:", 0, 1)
+    pdf.use_font("", 10)
+    pdf.multi_cell(0, 6, clean_text(plano.objetivo_geral))
+    pdf.ln(2)
+
+    pdf.use_font("B", 10)
+    pdf.cell(0, 6, "OBJECTIVOS ESPECÍFICOS:", 0, 1)
+    pdf.use_font("", 10)
+    for i, oe in enumerate(plano.objetivos_especificos, 1):
+        pdf.multi_cell(0, 6, f"{i}. {clean_text(oe)}")
+    pdf.ln(4)
+
+    widths = TABLE_WIDTHS
+    pdf.draw_table_header(widths)
+    for row in plano.tabela:
+        pdf.table_row([clean_text(x) for x in row], widths, cleaned=True)
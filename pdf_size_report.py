@@ -0,0 +1,86 @@
+# pdf_size_report.py
+# Relatório: bytes por plano do PDF guardado (pdf_b64) vs. re-gerado normal vs. compacto,
+# a partir dos plan_json reais de user_plans.
+#
+# Uso (com .streamlit/secrets.toml):
+#   python pdf_size_report.py --limit 500 --font-mode dejavu
+
+import argparse
+import base64
+import json
+import math
+
+from utils import supa
+from plan_model import PlanoAula
+from pdf_render import create_pdf
+
+
+def iter_plans(limit: int, page: int):
+    sb = supa()
+    done = 0
+    while done < limit:
+        n = min(page, limit - done)
+        r = (
+            sb.table("user_plans")
+            .select("id,plan_json,pdf_b64")
+            .order("id")
+            .range(done, done + n - 1)
+            .execute()
+        )
+        rows = r.data or []
+        yield from rows
+        done += len(rows)
+        if len(rows) < n:
+            return
+
+
+def b64_len(n: int) -> int:
+    return 4 * math.ceil(n / 3)
+
+
+def pct(values: list[int], p: float) -> int:
+    if not values:
+        return 0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(p * (len(s) - 1))))]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Tamanho dos PDFs por plano (guardado vs normal vs compacto).")
+    ap.add_argument("--limit", type=int, default=500)
+    ap.add_argument("--page", type=int, default=200)
+    ap.add_argument("--font-mode", default="dejavu", choices=["dejavu", "core"])
+    args = ap.parse_args()
+
+    sizes = {"guardado": [], "normal": [], "compacto": []}
+    skipped = 0
+    for row in iter_plans(args.limit, args.page):
+        pj = row.get("plan_json")
+        if isinstance(pj, str):
+            pj = json.loads(pj)
+        try:
+            ctx = pj["ctx"]
+            plano = PlanoAula(**pj["plano"])
+        except Exception:
+            skipped += 1
+            continue
+        if row.get("pdf_b64"):
+            sizes["guardado"].append(len(base64.b64decode(row["pdf_b64"])))
+        sizes["normal"].append(len(create_pdf(ctx, plano, font_mode=args.font_mode)))
+        sizes["compacto"].append(len(create_pdf(ctx, plano, font_mode=args.font_mode, compact=True)))
+
+    print(f"planos: {len(sizes['normal'])}  (ignorados sem plan_json válido: {skipped})")
+    print(f"{'modo':<10}{'média':>10}{'p50':>10}{'p95':>10}{'total':>14}{'total b64':>14}")
+    for k, v in sizes.items():
+        if not v:
+            continue
+        total = sum(v)
+        print(f"{k:<10}{total // len(v):>10}{pct(v, .5):>10}{pct(v, .95):>10}{total:>14}{sum(b64_len(x) for x in v):>14}")
+    if sizes["normal"] and sizes["compacto"]:
+        base = sizes["guardado"] if len(sizes["guardado"]) == len(sizes["compacto"]) else sizes["normal"]
+        ganho = 1 - sum(sizes["compacto"]) / max(1, sum(base))
+        print(f"redução do compacto: {ganho:.1%}")
+
+
+if __name__ == "__main__":
+    main()
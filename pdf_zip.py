@@ -0,0 +1,105 @@
+# pdf_zip.py
+# Exportação em ZIP dos PDFs de um conjunto de planos (ex.: todos os de uma escola).
+# Os PDFs são obtidos em paralelo (número limitado de pedidos em curso) e escritos no
+# ZIP pela ordem pedida, à medida que chegam; o ZIP vai para um ficheiro temporário em
+# disco e é publicado no Storage (URL assinado), sem ficar todo em memória. Se o Storage
+# falhar, o ficheiro fica em disco até ser descarregado uma vez (serve_once).
+
+import os
+import re
+import tempfile
+import unicodedata
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def safe_name(s: str, max_len: int = 120) -> str:
+    s = unicodedata.normalize("NFKD", str(s)).encode("ascii", "ignore").decode("ascii")
+    s = re.sub(r"[^A-Za-z0-9._-]+", "_", s).strip("_")
+    return s[:max_len] or "plano"
+
+
+def write_pdf_zip(items: list[dict], fetch, path: str, workers: int = 4, on_progress=None) -> dict:
+    """items: [{"nome": ..., ...}]; fetch(item) -> bytes | None.
+    No máximo workers * 2 PDFs em memória de cada vez."""
+    stats = {"ok": 0, "falhas": []}
+    usados = set()
+    todo = iter(items)
+    pending = deque()
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED, allowZip64=True) as z, ThreadPoolExecutor(max_workers=workers) as ex:
+        def submit_next():
+            item = next(todo, None)
+            if item is not None:
+                pending.append((item, ex.submit(fetch, item)))
+
+        for _ in range(workers * 2):
+            submit_next()
+        done = 0
+        while pending:
+            item, fut = pending.popleft()
+            try:
+                pdf = fut.result()
+            except Exception:
+                pdf = None
+            submit_next()
+
+            nome = safe_name(item["nome"])
+            if pdf:
+                base, n = nome, 2
+                while nome in usados:
+                    nome, n = f"{base}_{n}", n + 1
+                usados.add(nome)
+                z.writestr(nome + ".pdf", pdf)  # PDFs já vêm comprimidos: ZIP sem compressão
+                stats["ok"] += 1
+            else:
+                stats["falhas"].append(item["nome"])
+            done += 1
+            if on_progress:
+                on_progress(done, len(items))
+
+        if stats["falhas"]:
+            z.writestr("_em_falta.txt", "PDFs que não foi possível obter:\n" + "\n".join(stats["falhas"]) + "\n")
+    return stats
+
+
+def publish_zip(sb, path: str, bucket: str, dest: str, expires_s: int = 3600) -> str | None:
+    """Envia o ZIP (lido do disco) para o Storage e devolve um URL assinado."""
+    sb.storage.from_(bucket).upload(dest, path, {"content-type": "application/zip", "upsert": "true"})
+    signed = sb.storage.from_(bucket).create_signed_url(dest, expires_s)
+    return signed.get("signedURL") or signed.get("signedUrl") or signed.get("signed_url")
+
+
+def export_pdf_zip(sb, items: list[dict], fetch, bucket: str, dest: str, workers: int = 4,
+                   on_progress=None) -> tuple[str | None, str | None, dict]:
+    """(url, None, stats) se o Storage aceitar o ZIP; senão (None, caminho, stats) para
+    download directo do ficheiro temporário (ver serve_once)."""
+    fd, path = tempfile.mkstemp(prefix="planos_", suffix=".zip")
+    os.close(fd)
+    try:
+        stats = write_pdf_zip(items, fetch, path, workers=workers, on_progress=on_progress)
+        stats["bytes"] = os.path.getsize(path)
+    except Exception:
+        os.remove(path)
+        raise
+    try:
+        url = publish_zip(sb, path, bucket, dest)
+    except Exception:
+        url = None
+    if url:
+        os.remove(path)
+        return url, None, stats
+    return None, path, stats
+
+
+def serve_once(path: str):
+    """data= para st.download_button: lê o ZIP só no clique e apaga-o a seguir."""
+    def read() -> bytes:
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+    return read
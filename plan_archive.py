@@ -0,0 +1,40 @@
+# plan_archive.py
+# Arquivo frio dos planos antigos (archive_job.py, sql/008_plan_archive.sql).
+# Os campos pesados (plan_json, pdf_b64, upload_b64) de cada plano vão para um objecto
+# JSON comprimido no bucket "plans" (archive/AAAA-MM/<id>.json.gz); em user_plans ficam
+# só os metadados + archive_path. Um objecto por plano: ao apagar o plano, o trigger de
+# sql/007_storage_gc.sql põe o objecto na fila de limpeza como faz com o pdf_path.
+# with_cold() devolve a linha completa, indo ao arquivo só quando os campos faltam.
+
+import gzip
+import json
+
+BUCKET_PLANS = "plans"
+ARCHIVE_PREFIX = "archive/"
+COLD_COLS = ["plan_json", "pdf_b64", "upload_b64"]
+
+
+def archive_path(row: dict) -> str:
+    return f"{ARCHIVE_PREFIX}{str(row['created_at'])[:7]}/{row['id']}.json.gz"
+
+
+def pack(row: dict) -> bytes:
+    data = json.dumps({c: row.get(c) for c in COLD_COLS}, ensure_ascii=False).encode("utf-8")
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def read_cold(sb, path: str) -> dict | None:
+    try:
+        return json.loads(gzip.decompress(sb.storage.from_(BUCKET_PLANS).download(path)))
+    except Exception:
+        return None
+
+
+def with_cold(sb, row: dict) -> dict:
+    """Linha com os campos frios pedidos preenchidos a partir do arquivo, se estiver arquivada."""
+    path = row.get("archive_path")
+    cols = [c for c in COLD_COLS if c in row and row[c] is None]
+    if not path or not cols:
+        return row
+    cold = read_cold(sb, path) or {}
+    return {**row, **{c: cold.get(c) for c in cols}}
@@ -0,0 +1,280 @@
+# plan_catalog.py
+# Catálogo em memória dos planos para as vistas do administrador.
+# Uma só tabela: planos + professor/escola (merge vectorizado com app_users), campos
+# repetitivos como categorias, plan_day como datetime64, indexada por id do plano.
+# Os filtros devolvem máscaras; as vistas são selecções de colunas/linhas (sem cópias
+# intermédias de toda a tabela) e as etiquetas só se constroem para o que se mostra.
+#
+# CatalogSync mantém o catálogo entre reruns e só pede à base de dados o que mudou:
+# - planos novos: marca de água (created_at, id; created_at dado pelo servidor, sql/009),
+#   lidos por páginas em ordem crescente
+# - apagados: tabela user_plans_deleted (sql/003_plan_tombstones.sql), se existir
+# - de RECONCILE_S em RECONCILE_S, sempre: utilizadores (nome/escola/estado alterados) e
+#   ids (só a coluna id), para o que escapou às marcas de água (transacções que terminam
+#   fora de ordem); o catálogo só é refeito se algo mudou
+# - apagados nesta instância (delete_plan / delete_user_and_data): forget*() imediato
+
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+PLAN_COLS = "id,created_at,plan_day,disciplina,classe,unidade,tema,turma,tipo_aula,duracao,metodos,meios,upload_name,upload_type,upload_details,user_key"
+USER_COLS = "user_key,name,school"
+RECONCILE_S = 300
+
+CATEGORIAS = ["user_key", "professor", "escola", "disciplina", "classe", "turma", "tipo_aula", "duracao"]
+
+
+class PlanCatalog:
+    def __init__(self, plans: pd.DataFrame, users: pd.DataFrame):
+        self.df = self._build(plans, users)
+
+    @staticmethod
+    def _build(plans: pd.DataFrame, users: pd.DataFrame) -> pd.DataFrame:
+        if plans.empty:
+            return pd.DataFrame(columns=["id", "plan_day", "created_at", *CATEGORIAS]).set_index("id", drop=False)
+        if users.empty:
+            users = pd.DataFrame(columns=["user_key", "name", "school"])
+        u = users[["user_key", "name", "school"]].drop_duplicates("user_key")
+        u = u.rename(columns={"name": "professor", "school": "escola"})
+        df = plans.merge(u, on="user_key", how="left")
+        df["professor"] = df["professor"].fillna(df["user_key"])
+        df["escola"] = df["escola"].fillna("-")
+        df["plan_day"] = pd.to_datetime(df["plan_day"], errors="coerce")
+        df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce")
+        for c in CATEGORIAS:
+            if c in df.columns:
+                df[c] = df[c].astype(str).astype("category")
+        df = df.sort_values("created_at", ascending=False, kind="stable")
+        return df.set_index("id", drop=False)
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    @property
+    def empty(self) -> bool:
+        return self.df.empty
+
+    def options(self, col: str) -> list[str]:
+        s = self.df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            return sorted(s.cat.remove_unused_categories().cat.categories.tolist())
+        return sorted(s.dropna().astype(str).unique().tolist())
+
+    def days(self) -> list[str]:
+        d = pd.DatetimeIndex(self.df["plan_day"].dropna().unique()).sort_values()
+        return d.strftime("%Y-%m-%d").tolist()
+
+    def mask(self, escola: str | None = None, dia: str | None = None, professor: str | None = None) -> np.ndarray:
+        m = np.ones(len(self.df), dtype=bool)
+        if escola is not None:
+            m &= (self.df["escola"] == escola).to_numpy()
+        if dia is not None:
+            m &= (self.df["plan_day"] == pd.Timestamp(dia)).to_numpy()
+        if professor is not None:
+            m &= (self.df["professor"] == professor).to_numpy()
+        return m
+
+    def month_mask(self, ano: int, mes: int, base: np.ndarray | None = None) -> np.ndarray:
+        d = self.df["plan_day"]
+        m = ((d.dt.year == int(ano)) & (d.dt.month == int(mes))).to_numpy()
+        return m if base is None else m & base
+
+    def view(self, mask: np.ndarray | None = None, cols: list[str] | None = None) -> pd.DataFrame:
+        cols = [c for c in cols if c in self.df.columns] if cols else None
+        out = self.df if mask is None or mask.all() else self.df[mask]
+        return out[cols] if cols else out
+
+    def monthly_report(self, ano: int, mes: int) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """Relatório por escola e por escola + professor (alternativa local ao RPC da base de dados)."""
+        df = self.view(self.month_mask(ano, mes), ["id", "user_key", "escola", "professor", "plan_day"])
+        rep = (
+            df.groupby("escola", observed=True)
+            .agg(
+                total_planos=("id", "count"),
+                professores_ativos=("user_key", "nunique"),
+                primeiro_plano=("plan_day", "min"),
+                ultimo_plano=("plan_day", "max"),
+            )
+            .reset_index()
+            .sort_values(["total_planos", "escola"], ascending=[False, True])
+        )
+        rep["media_planos_por_prof"] = (rep["total_planos"] / rep["professores_ativos"]).round(2)
+        rep_prof = (
+            df.groupby(["escola", "professor"], observed=True)
+            .agg(total_planos=("id", "count"))
+            .reset_index()
+            .sort_values(["escola", "total_planos", "professor"], ascending=[True, False, True])
+        )
+        return rep, rep_prof
+
+    def row(self, plan_id: int) -> pd.Series:
+        return self.df.loc[plan_id]
+
+    def labels(self, mask: np.ndarray | None = None) -> dict:
+        v = self.view(mask, ["plan_day", "escola", "professor", "disciplina", "classe", "tema"])
+        lab = v["plan_day"].dt.strftime("%Y-%m-%d").fillna("-")
+        for c in ["escola", "professor", "disciplina", "classe", "tema"]:
+            lab = lab + " | " + v[c].astype(str)
+        return dict(zip(v.index, lab))
+
+
+class CatalogSync:
+    def __init__(self, sb, page: int = 1000, reconcile_s: float = RECONCILE_S):
+        self.sb = sb
+        self.page = page
+        self.reconcile_s = reconcile_s
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.plans = pd.DataFrame()
+        self.users = pd.DataFrame(columns=USER_COLS.split(","))
+        self.hw: tuple[str, int] | None = None
+        self.tomb_hw: str | None = None
+        self.has_tombstones = True
+        self.last_reconcile = 0.0
+        self.stats = {"novos": 0, "apagados": 0, "linhas_lidas": 0, "ultima_sync": None}
+        self._catalog: PlanCatalog | None = None
+
+    def catalog(self) -> PlanCatalog:
+        with self._lock:
+            changed = self._catalog is None
+            if self.hw is None:
+                self._init_tombstone_mark()
+            if time.monotonic() - self.last_reconcile > self.reconcile_s:
+                changed |= self._reconcile()
+            changed |= self._fetch_new()
+            changed |= self._fetch_tombstones()
+            if changed:
+                self._catalog = PlanCatalog(self.plans, self.users)
+            self.stats["ultima_sync"] = time.strftime("%H:%M:%S")
+            return self._catalog
+
+    def forget(self, plan_ids: list[int]):
+        with self._lock:
+            if self.plans.empty:
+                return
+            keep = ~self.plans["id"].isin(plan_ids)
+            if not keep.all():
+                self.plans = self.plans[keep]
+                self._catalog = None
+
+    def forget_user(self, user_key: str, plans: bool = True):
+        with self._lock:
+            if plans and not self.plans.empty:
+                self.plans = self.plans[self.plans["user_key"] != user_key]
+            self.users = self.users[self.users["user_key"] != user_key]
+            self._catalog = None
+
+    def _fetch_new(self) -> bool:
+        novos = []
+        while True:
+            q = self.sb.table("user_plans").select(PLAN_COLS)
+            if self.hw:
+                ts, pid = self.hw
+                q = q.or_(f'created_at.gt."{ts}",and(created_at.eq."{ts}",id.gt.{pid})')
+            rows = q.order("created_at").order("id").limit(self.page).execute().data or []
+            if not rows:
+                break
+            novos.extend(rows)
+            self.hw = (rows[-1]["created_at"], int(rows[-1]["id"]))
+            if len(rows) < self.page:
+                break
+        self.stats["linhas_lidas"] += len(novos)
+        if not novos:
+            return False
+        new = pd.DataFrame(novos)
+        self.plans = new if self.plans.empty else pd.concat([self.plans, new], ignore_index=True)
+        self.plans = self.plans.drop_duplicates("id", keep="last")
+        self.stats["novos"] += len(novos)
+        self._fetch_users(set(new["user_key"].dropna()) - set(self.users["user_key"]))
+        return True
+
+    def _fetch_users(self, keys: set | None = None) -> bool:
+        """Utilizadores destas chaves, ou todos (keyset por user_key); True se o mapa mudou."""
+        cols = USER_COLS.split(",")
+        if keys is not None:
+            if not keys:
+                return False
+            rows = self.sb.table("app_users").select(USER_COLS).in_("user_key", sorted(keys)).execute().data or []
+        else:
+            rows, last = [], ""
+            while True:
+                page = (
+                    self.sb.table("app_users").select(USER_COLS).gt("user_key", last)
+                    .order("user_key").limit(self.page).execute().data or []
+                )
+                rows.extend(page)
+                if len(page) < self.page:
+                    break
+                last = page[-1]["user_key"]
+        self.stats["linhas_lidas"] += len(rows)
+        new = pd.DataFrame(rows, columns=cols)
+        if keys is not None:
+            self.users = pd.concat([self.users, new], ignore_index=True).drop_duplicates("user_key", keep="last")
+            return not new.empty
+        old = self.users.sort_values("user_key", ignore_index=True).astype(object)
+        new = new.sort_values("user_key", ignore_index=True)
+        self.users = new
+        return not old.equals(new.astype(object))
+
+    def _init_tombstone_mark(self):
+        # carga inicial já é consistente: só interessam apagamentos a partir de agora
+        try:
+            rows = self.sb.table("user_plans_deleted").select("deleted_at").order("deleted_at", desc=True).limit(1).execute().data
+            self.tomb_hw = rows[0]["deleted_at"] if rows else "1970-01-01T00:00:00"
+        except Exception:
+            self.has_tombstones = False
+
+    def _fetch_tombstones(self) -> bool:
+        if not self.has_tombstones:
+            return False
+        try:
+            q = self.sb.table("user_plans_deleted").select("id,deleted_at")
+            if self.tomb_hw:
+                q = q.gt("deleted_at", self.tomb_hw)
+            rows = q.order("deleted_at").execute().data or []
+        except Exception:
+            self.has_tombstones = False  # tabela não criada: fica só a reconciliação periódica
+            return False
+        if not rows:
+            return False
+        self.tomb_hw = rows[-1]["deleted_at"]
+        self.stats["linhas_lidas"] += len(rows)
+        before = len(self.plans)
+        if before:
+            self.plans = self.plans[~self.plans["id"].isin([r["id"] for r in rows])]
+        self.stats["apagados"] += before - len(self.plans)
+        return before != len(self.plans)
+
+    def _reconcile(self) -> bool:
+        """Utilizadores + ids existentes (só a coluna id): tira o que já não existe e lê
+        planos que escaparam à marca de água. True só se os ids ou os utilizadores mudaram."""
+        self.last_reconcile = time.monotonic()
+        changed = self._fetch_users()
+        if self.plans.empty:
+            return changed
+        ids, last = [], 0
+        while True:
+            rows = self.sb.table("user_plans").select("id").gt("id", last).order("id").limit(self.page * 10).execute().data or []
+            ids.extend(r["id"] for r in rows)
+            self.stats["linhas_lidas"] += len(rows)
+            if len(rows) < self.page * 10:
+                break
+            last = rows[-1]["id"]
+        before = len(self.plans)
+        self.plans = self.plans[self.plans["id"].isin(ids)]
+        self.stats["apagados"] += before - len(self.plans)
+        changed |= before != len(self.plans)
+
+        missing = sorted(set(ids) - set(self.plans["id"]))
+        for i in range(0, len(missing), 200):
+            rows = self.sb.table("user_plans").select(PLAN_COLS).in_("id", missing[i:i + 200]).execute().data or []
+            self.stats["linhas_lidas"] += len(rows)
+            if rows:
+                self.plans = pd.concat([self.plans, pd.DataFrame(rows)], ignore_index=True)
+                changed = True
+        return changed
@@ -0,0 +1,70 @@
+# plan_cube.py
+# Cubo de utilização (mês × escola × disciplina × classe × tipo_aula -> n_planos) e
+# agregações vectorizadas para as tendências do administrador.
+# Na base de dados é a tabela plan_cube (sql/005_plan_cube.sql, mantida por trigger);
+# sem ela, cube_from_catalog() constrói o mesmo cubo a partir do catálogo em memória.
+
+import pandas as pd
+
+DIMS = ["escola", "disciplina", "classe", "tipo_aula"]
+
+
+def normalize_cube(df: pd.DataFrame) -> pd.DataFrame:
+    if df.empty:
+        return pd.DataFrame({"mes": pd.Series(dtype="datetime64[ns]"), **{d: pd.Series(dtype="category") for d in DIMS},
+                             "n_planos": pd.Series(dtype="int64")})
+    df = df.copy()
+    df["mes"] = pd.to_datetime(df["mes"], errors="coerce").dt.to_period("M").dt.to_timestamp()
+    for d in DIMS:
+        df[d] = df[d].fillna("-").astype(str).astype("category")
+    df["n_planos"] = df["n_planos"].astype("int64")
+    return df[df["n_planos"] > 0]
+
+
+def cube_from_catalog(plans: pd.DataFrame) -> pd.DataFrame:
+    df = plans[plans["plan_day"].notna()]
+    cube = (
+        df.assign(mes=df["plan_day"].dt.to_period("M").dt.to_timestamp())
+        .groupby(["mes", *DIMS], observed=True)
+        .size()
+        .rename("n_planos")
+        .reset_index()
+    )
+    return normalize_cube(cube)
+
+
+def slice_cube(cube: pd.DataFrame, filtros: dict | None = None) -> pd.DataFrame:
+    for k, v in (filtros or {}).items():
+        cube = cube[cube[k] == v]
+    return cube
+
+
+def monthly_series(cube: pd.DataFrame, dim: str, top: int = 8) -> pd.DataFrame:
+    """Planos por mês (linhas) para os `top` valores de `dim` (colunas); meses sem planos = 0."""
+    c = cube
+    if c.empty:
+        return pd.DataFrame()
+    tops = c.groupby(dim, observed=True)["n_planos"].sum().nlargest(top).index
+    c = c[c[dim].isin(tops)]
+    pv = c.pivot_table(index="mes", columns=dim, values="n_planos", aggfunc="sum", observed=True, fill_value=0)
+    meses = pd.date_range(pv.index.min(), pv.index.max(), freq="MS")
+    pv = pv.reindex(meses, fill_value=0)
+    pv.columns = pv.columns.astype(str)
+    return pv
+
+
+def rolling(series: pd.DataFrame, window: int) -> pd.DataFrame:
+    return series.rolling(window, min_periods=1).mean().round(1)
+
+
+def year_over_year(cube: pd.DataFrame, dim: str, ano: int, ate_mes: int) -> pd.DataFrame:
+    """Total de jan..ate_mes de `ano` vs o mesmo período do ano anterior, por valor de `dim`."""
+    m = cube["mes"]
+    periodo = m.dt.month <= ate_mes
+    actual = cube[periodo & (m.dt.year == ano)].groupby(dim, observed=True)["n_planos"].sum()
+    anterior = cube[periodo & (m.dt.year == ano - 1)].groupby(dim, observed=True)["n_planos"].sum()
+    out = pd.DataFrame({str(ano): actual, str(ano - 1): anterior}).fillna(0).astype("int64")
+    base = out[str(ano - 1)].where(out[str(ano - 1)] > 0)
+    out["variacao_%"] = ((out[str(ano)] - base) / base * 100).round(1)
+    out.index = out.index.astype(str)
+    return out.sort_values(str(ano), ascending=False).rename_axis(dim).reset_index()
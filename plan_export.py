@@ -0,0 +1,147 @@
+# plan_export.py
+# Exportação dos planos (CSV, Parquet, XLSX) gerada só quando é pedida.
+# Os planos vêm da base de dados por páginas (por id crescente, ou por blocos de ids
+# quando há filtros) e cada página é escrita logo no ficheiro de saída: nunca há um
+# DataFrame com a tabela toda. O XLSX é escrito linha a linha (zip + XML), sem openpyxl.
+
+import re
+import tempfile
+import zipfile
+from xml.sax.saxutils import escape
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+EXPORT_COLS = [
+    "plan_day", "escola", "professor", "disciplina", "classe", "unidade", "tema", "turma",
+    "tipo_aula", "duracao", "metodos", "meios", "upload_details", "created_at", "user_key", "id",
+]
+DB_COLS = "id,created_at,plan_day,disciplina,classe,unidade,tema,turma,tipo_aula,duracao,metodos,meios,upload_details,user_key"
+
+FORMATOS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Excel (XLSX)": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def iter_plan_pages(sb, ids: list[int] | None = None, page: int = 1000):
+    """Páginas de user_plans: todas (keyset por id) ou só os ids pedidos (blocos de 200)."""
+    if ids is not None:
+        for i in range(0, len(ids), 200):
+            rows = sb.table("user_plans").select(DB_COLS).in_("id", ids[i:i + 200]).order("id").execute().data or []
+            if rows:
+                yield pd.DataFrame(rows)
+        return
+    last = 0
+    while True:
+        rows = sb.table("user_plans").select(DB_COLS).gt("id", last).order("id").limit(page).execute().data or []
+        if not rows:
+            return
+        yield pd.DataFrame(rows)
+        if len(rows) < page:
+            return
+        last = rows[-1]["id"]
+
+
+def with_users(pages, users: pd.DataFrame):
+    """Junta professor/escola a cada página e põe as colunas na ordem da exportação."""
+    u = users[["user_key", "name", "school"]].drop_duplicates("user_key").rename(columns={"name": "professor", "school": "escola"})
+    for df in pages:
+        df = df.merge(u, on="user_key", how="left")
+        df["professor"] = df["professor"].fillna(df["user_key"])
+        df["escola"] = df["escola"].fillna("-")
+        yield df.reindex(columns=EXPORT_COLS)
+
+
+def _write_csv(pages, f):
+    f.write("\ufeff".encode("utf-8"))
+    header = True
+    for df in pages:
+        f.write(df.to_csv(index=False, header=header).encode("utf-8"))
+        header = False
+    if header:
+        f.write((",".join(EXPORT_COLS) + "\n").encode("utf-8"))
+
+
+def _write_parquet(pages, f):
+    schema = pa.schema([(c, pa.int64() if c == "id" else pa.string()) for c in EXPORT_COLS])
+    with pq.ParquetWriter(f, schema, compression="zstd") as w:
+        for df in pages:
+            df = df.astype({c: "string" for c in EXPORT_COLS if c != "id"}).astype({"id": "int64"})
+            w.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+
+
+XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="planos" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        "</Relationships>"
+    ),
+}
+
+
+XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _xlsx_row(values) -> str:
+    cells = []
+    for v in values:
+        if isinstance(v, int) and not isinstance(v, bool):
+            cells.append(f"<c t=\"n\"><v>{v}</v></c>")
+        elif v is None or (isinstance(v, float) and v != v):
+            cells.append("<c/>")
+        else:
+            cells.append(f"<c t=\"inlineStr\"><is><t xml:space=\"preserve\">{escape(XML_INVALID.sub('', str(v)))}</t></is></c>")
+    return "<row>" + "".join(cells) + "</row>"
+
+
+def _write_xlsx(pages, f):
+    with zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED) as z:
+        for name, xml in XLSX_PARTS.items():
+            z.writestr(name, xml)
+        with z.open("xl/worksheets/sheet1.xml", "w") as s:
+            s.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            s.write(_xlsx_row(EXPORT_COLS).encode("utf-8"))
+            for df in pages:
+                df = df.astype(object).where(df.notna(), None)
+                s.write("".join(_xlsx_row(r) for r in df.itertuples(index=False, name=None)).encode("utf-8"))
+            s.write(b"</sheetData></worksheet>")
+
+
+WRITERS = {"csv": _write_csv, "parquet": _write_parquet, "xlsx": _write_xlsx}
+
+
+def export_plans(pages, formato: str) -> bytes:
+    """Escreve as páginas num ficheiro temporário (em disco acima de 16 MB) e devolve os bytes."""
+    ext, _ = FORMATOS[formato]
+    with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024) as f:
+        WRITERS[ext](pages, f)
+        f.seek(0)
+        return f.read()
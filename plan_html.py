@@ -0,0 +1,66 @@
+# plan_html.py
+# Vista HTML leve do plano (poucos KB), gerada a partir de plan_json: mesmo cabeçalho,
+# objectivos e tabela de actividades do PDF (pdf_render.create_pdf). Para telemóveis
+# com pouca rede: mostra-se no histórico sem descarregar o PDF.
+
+from html import escape
+
+from plan_model import PlanoAula
+from pdf_render import TABLE_HEADERS, TABLE_WIDTHS
+
+CSS = (
+    ".plano{font-size:14px;line-height:1.35;max-width:900px}"
+    ".plano .cab{text-align:center;font-weight:bold;margin-bottom:6px}"
+    ".plano .cab small{display:block;font-size:11px}"
+    ".plano h4{margin:8px 0 4px;color:inherit!important}"
+    ".plano p{margin:2px 0}"
+    ".plano ol{margin:2px 0 8px 18px;padding:0}"
+    ".plano .tab{overflow-x:auto}"
+    ".plano table{border-collapse:collapse;width:100%;font-size:12px}"
+    ".plano th,.plano td{border:1px solid #777;padding:3px;vertical-align:top}"
+    ".plano th{background:rgba(128,128,128,.25);font-size:11px}"
+)
+
+
+def _t(v) -> str:
+    return escape(str(v or "")).replace("\n", "<br>")
+
+
+def plan_html(ctx: dict, plano: PlanoAula | dict) -> str:
+    if isinstance(plano, dict):
+        plano = PlanoAula(**plano)
+    total_w = sum(TABLE_WIDTHS)
+
+    h = [f"<style>{CSS}</style><div class='plano'>"]
+    h.append(
+        "<div class='cab'><small>REPÚBLICA DE MOÇAMBIQUE · GOVERNO DO DISTRITO</small>"
+        "<small>SERVIÇO DISTRITAL DE EDUCAÇÃO, JUVENTUDE E TECNOLOGIA</small>PLANO DE AULA</div>"
+    )
+    h.append(f"<p><b>Escola:</b> {_t(ctx.get('escola'))} &nbsp; <b>Data:</b> {_t(ctx.get('data'))}</p>")
+    h.append(
+        f"<p><b>Disciplina:</b> {_t(ctx.get('disciplina'))} &nbsp; <b>Classe:</b> {_t(ctx.get('classe'))}"
+        f" &nbsp; <b>Turma:</b> {_t(ctx.get('turma'))}</p>"
+    )
+    h.append(f"<p><b>Unidade Temática:</b> {_t(ctx.get('unidade'))}</p>")
+    h.append(f"<p><b>Tema: {_t(ctx.get('tema'))}</b></p>")
+    h.append(f"<p><b>Duração:</b> {_t(ctx.get('duracao'))} &nbsp; <b>Tipo:</b> {_t(ctx.get('tipo_aula'))}</p>")
+    if ctx.get("metodos"):
+        h.append(f"<p><b>Métodos sugeridos:</b> {_t(ctx['metodos'])}</p>")
+    if ctx.get("meios"):
+        h.append(f"<p><b>Meios/Materiais sugeridos:</b> {_t(ctx['meios'])}</p>")
+    if ctx.get("upload_details"):
+        h.append(f"<p><b>Detalhes do ficheiro:</b> {_t(ctx['upload_details'])}</p>")
+
+    h.append(f"<h4>OBJECTIVO GERAL</h4><p>{_t(plano.objetivo_geral)}</p>")
+    h.append("<h4>OBJECTIVOS ESPECÍFICOS</h4><ol>")
+    h.extend(f"<li>{_t(oe)}</li>" for oe in plano.objetivos_especificos)
+    h.append("</ol>")
+
+    h.append("<div class='tab'><table><tr>")
+    h.extend(f"<th style='width:{w * 100 / total_w:.0f}%'>{escape(t)}</th>" for t, w in zip(TABLE_HEADERS, TABLE_WIDTHS))
+    h.append("</tr>")
+    for row in plano.tabela:
+        h.append("<tr>" + "".join(f"<td>{_t(c)}</td>" for c in row) + "</tr>")
+    h.append("</table></div></div>")
+    # numa só linha: st.markdown não trata linhas indentadas como código
+    return "".join(h)
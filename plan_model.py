@@ -0,0 +1,28 @@
+# plan_model.py
+# Estrutura do plano de aula (partilhada pela app, gerador local e PDF).
+# Sem dependências do Streamlit: pode ser importado fora da app.
+
+from pydantic import BaseModel, Field, conlist
+
+
+class PlanoAula(BaseModel):
+    objetivo_geral: str
+    objetivos_especificos: list[str] = Field(min_length=1)
+    tabela: list[conlist(str, min_length=6, max_length=6)]
+
+
+TABLE_COLS = ["Tempo", "Função Didáctica", "Actividade do Professor", "Actividade do Aluno", "Métodos", "Meios"]
+
+FUNCOES_DIDACTICAS = [
+    "Introdução e Motivação",
+    "Mediação e Assimilação",
+    "Domínio e Consolidação",
+    "Controlo e Avaliação",
+]
+
+
+def objetivos_alvo_por_duracao(duracao: str) -> int:
+    d = (duracao or "").strip().lower()
+    if "45" in d:
+        return 3
+    return 5
@@ -0,0 +1,65 @@
+# plan_pdf.py
+# PDF de um plano guardado, partilhado pelas páginas (app.py, plans.py, admin.py):
+# pdf_b64 guardado (ou no arquivo frio) se existir; senão gerado a partir de plan_json
+# no pool de processos e guardado no PdfMemo (modo PDF_STORAGE="on_demand").
+# Um só pool e um só memo por processo, seja qual for a página que os pede.
+
+import base64
+import json
+import os
+import tempfile
+
+import streamlit as st
+
+from pdf_memo import PdfMemo
+from pdf_pool import PdfPool
+from pdf_render import PDF_TEMPLATE_VERSION
+from plan_archive import with_cold
+from utils import secret_flag
+
+# fontes do PDF: "dejavu" (Unicode, fontes do repositório) ou "core" (Arial, só Latin-1)
+PDF_FONT_MODE = st.secrets.get("PDF_FONT_MODE", "dejavu")
+# PDF compacto (menos bytes guardados em pdf_b64 e descarregados); ver pdf_size_report.py
+PDF_COMPACT = secret_flag("PDF_COMPACT", True)
+
+
+@st.cache_resource
+def pdf_pool() -> PdfPool:
+    # o script espera no máximo slot_wait_s por um lugar na fila; depois PdfPoolBusy
+    return PdfPool(timeout_s=30, slot_wait_s=3)
+
+
+@st.cache_resource
+def pdf_memo() -> PdfMemo:
+    return PdfMemo(disk_dir=st.secrets.get("PDF_MEMO_DIR", os.path.join(tempfile.gettempdir(), "sdejt_pdf_memo")))
+
+
+def pdf_memo_key(plan_id: int) -> str:
+    return PdfMemo.key(plan_id, PDF_TEMPLATE_VERSION, PDF_FONT_MODE + ("-c" if PDF_COMPACT else ""))
+
+
+def fetch_plan_pdf(sb, plan_id: int, memo: PdfMemo, pool: PdfPool, user_key: str | None = None,
+                   slot_wait_s: float | None = None) -> bytes | None:
+    """PDF do plano (None se o plano não existir). Fora do thread do script, passar memo e
+    pool já resolvidos. Erros do pool (PdfPoolBusy/PdfPoolTimeout) sobem para quem chama."""
+    def query(cols: str):
+        q = sb.table("user_plans").select(cols + ",archive_path").eq("id", plan_id)
+        if user_key is not None:
+            q = q.eq("user_key", user_key)
+        r = q.limit(1).execute()
+        return with_cold(sb, r.data[0]) if r.data else None
+
+    row = query("pdf_b64")
+    if row is None:
+        return None
+    if row.get("pdf_b64"):
+        return base64.b64decode(row["pdf_b64"])
+
+    def render():
+        pj = (query("plan_json") or {}).get("plan_json")
+        if not pj:
+            raise LookupError(f"plano {plan_id} sem plan_json")
+        pj = json.loads(pj) if isinstance(pj, str) else pj
+        return pool.render(pj["ctx"], pj["plano"], font_mode=PDF_FONT_MODE, compact=PDF_COMPACT, slot_wait_s=slot_wait_s)
+
+    return memo.get_or_render(pdf_memo_key(plan_id), render)
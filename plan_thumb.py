@@ -0,0 +1,170 @@
+# plan_thumb.py
+# Miniaturas da 1.ª página do plano (PNG de poucos KB) para a galeria do histórico.
+# Desenhadas com Pillow directamente a partir de plan_json, com a mesma disposição do
+# PDF (pdf_render.create_pdf): cabeçalho, dados da aula, objectivos e tabela. O texto
+# miúdo aparece como barras; o tema fica legível no lugar do título.
+# Geradas só quando são vistas e guardadas num PdfMemo (chave: id + versão do modelo).
+# thumb_memo/iter_plan_jsons/render_plan_gallery servem as duas páginas com histórico
+# (app.py e plans.py): um só memo por processo para a mesma pasta em disco.
+
+import io
+import json
+import math
+import os
+import tempfile
+import textwrap
+
+import pandas as pd
+import streamlit as st
+from PIL import Image, ImageDraw, ImageFont
+
+from plan_model import PlanoAula
+from plan_archive import with_cold
+from pdf_memo import PdfMemo
+from pdf_render import FONT_DIR, PAGE_BOTTOM, PDF_TEMPLATE_VERSION, ROW_LINE_H, TABLE_WIDTHS, clean_text
+
+THUMB_W = 150
+GALERIA_N = 8  # miniaturas por página da galeria ("Mostrar mais" acrescenta outras tantas)
+PAGE_W, PAGE_H = 210, 297  # mm
+CHAR_MM = {10: 1.8, 8: 1.45}  # largura média de um carácter por tamanho de letra
+
+INK = (60, 60, 60)
+BAR = (175, 175, 175)
+GRID = (120, 120, 120)
+HEAD_FILL = (220, 220, 220)
+
+
+def _font(size: int):
+    try:
+        return ImageFont.truetype(os.path.join(FONT_DIR, "DejaVuSans-Bold.ttf"), size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def _lines(txt: str, width_mm: float, size: int) -> int:
+    per_line = max(1, int(width_mm / CHAR_MM[size]))
+    return max(1, math.ceil(len(clean_text(txt)) / per_line))
+
+
+def plan_thumbnail(ctx: dict, plano: PlanoAula | dict, width: int = THUMB_W) -> bytes:
+    if isinstance(plano, dict):
+        plano = PlanoAula(**plano)
+    s = width / PAGE_W
+    img = Image.new("RGB", (width, round(PAGE_H * s)), "white")
+    d = ImageDraw.Draw(img)
+
+    def bar(x, y, w_mm, h=2.0, color=BAR):
+        d.rectangle([x * s, y * s, (x + max(2, min(w_mm, 190))) * s, (y + h) * s], fill=color)
+
+    def text_bars(txt, y, size=10, step=6, x=10, w=190):
+        n = _lines(txt, w, size)
+        total = len(clean_text(txt)) * CHAR_MM[size]
+        for i in range(n):
+            bar(x, y + i * step + 1.5, w if i < n - 1 else total - (n - 1) * w)
+        return y + n * step
+
+    # cabeçalho institucional (3 linhas centradas)
+    for y, w in ((10, 62), (15, 44), (20, 110)):
+        bar(105 - w / 2, y + 1.5, w, color=INK)
+
+    # título: o tema, legível
+    f = _font(max(8, round(width / 14)))
+    tema = "\n".join(textwrap.wrap(clean_text(ctx.get("tema", "")) or "PLANO DE AULA", 22)[:2])
+    d.multiline_text((width / 2, 30 * s), tema, font=f, fill=(0, 0, 0), anchor="ma", align="center", spacing=1)
+    top = d.multiline_textbbox((width / 2, 30 * s), tema, font=f, anchor="ma", align="center", spacing=1)[3]
+
+    # dados da aula, objectivos
+    y = max(44, top / s + 4)
+    for _ in range(5):
+        bar(10, y + 1.5, 100)
+        y += 7
+    for txt in (ctx.get("metodos"), ctx.get("meios"), ctx.get("upload_details")):
+        if txt:
+            y = text_bars(txt, y)
+    d.line([10 * s, (y + 2) * s, 200 * s, (y + 2) * s], fill=GRID)
+    y += 5
+    bar(10, y + 1.5, 32, color=INK)
+    y = text_bars(plano.objetivo_geral, y + 6) + 2
+    bar(10, y + 1.5, 45, color=INK)
+    y += 6
+    for oe in plano.objetivos_especificos:
+        y = text_bars(oe, y)
+    y += 4
+
+    # tabela
+    xs = [10]
+    for w in TABLE_WIDTHS:
+        xs.append(xs[-1] + w)
+    d.rectangle([xs[0] * s, y * s, xs[-1] * s, (y + 6) * s], fill=HEAD_FILL, outline=GRID)
+    y += 6
+    for row in plano.tabela:
+        h = max(_lines(c, w - 2, 8) for c, w in zip(row, TABLE_WIDTHS)) * ROW_LINE_H + 4
+        if y + h > PAGE_BOTTOM:
+            break
+        for c, x0, x1 in zip(row, xs, xs[1:]):
+            d.rectangle([x0 * s, y * s, x1 * s, (y + h) * s], outline=GRID)
+            for i in range(_lines(c, x1 - x0 - 2, 8)):
+                bar(x0 + 1.5, y + 2.5 + i * ROW_LINE_H, x1 - x0 - 3, h=1.5)
+        y += h
+
+    out = io.BytesIO()
+    img.quantize(colors=16).save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+
+def plan_thumbnails(memo, ids: list[int], template_version: int, fetch_plan_jsons) -> dict[int, bytes]:
+    """Miniaturas por id: as que faltam no memo são geradas (plan_json lido só para essas)."""
+    out, miss = {}, []
+    for pid in ids:
+        png = memo.get(memo.key(pid, template_version, "thumb"))
+        if png:
+            out[pid] = png
+        else:
+            miss.append(pid)
+    for pid, pj in zip(miss, fetch_plan_jsons(miss)):
+        try:
+            png = plan_thumbnail(pj["ctx"], pj["plano"])
+        except Exception:
+            continue
+        memo.put(memo.key(pid, template_version, "thumb"), png)
+        out[pid] = png
+    return out
+
+
+@st.cache_resource
+def thumb_memo() -> PdfMemo:
+    base = st.secrets.get("PDF_MEMO_DIR", os.path.join(tempfile.gettempdir(), "sdejt_pdf_memo"))
+    return PdfMemo(max_mem_bytes=8 * 1024 * 1024, disk_dir=os.path.join(base, "thumbs"),
+                   max_disk_bytes=64 * 1024 * 1024, suffix=".png")
+
+
+def iter_plan_jsons(sb, ids: list[int], user_key: str | None = None, chunk: int = 50):
+    """plan_json dos planos pedidos, por ordem, lidos em blocos (só os de user_key, se dado)."""
+    for i in range(0, len(ids), chunk):
+        part = ids[i:i + chunk]
+        q = sb.table("user_plans").select("id,plan_json,archive_path").in_("id", part)
+        if user_key is not None:
+            q = q.eq("user_key", user_key)
+        by_id = {x["id"]: with_cold(sb, x).get("plan_json") for x in (q.execute().data or [])}
+        for pid in part:
+            pj = by_id.get(pid)
+            yield json.loads(pj) if isinstance(pj, str) else pj
+
+
+def render_plan_gallery(df: pd.DataFrame, sel_key: str, key: str, fetch_plan_jsons):
+    """Miniaturas dos planos (geradas só para os que aparecem); 'Abrir' selecciona o plano."""
+    n = st.session_state.get(f"{key}_n", GALERIA_N)
+    vis = df.head(n)
+    thumbs = plan_thumbnails(thumb_memo(), [int(x) for x in vis["id"]], PDF_TEMPLATE_VERSION, fetch_plan_jsons)
+    cols = st.columns(4)
+    for i, (_, r) in enumerate(vis.iterrows()):
+        with cols[i % 4]:
+            png = thumbs.get(int(r["id"]))
+            if png:
+                st.image(png, width=THUMB_W)
+            st.caption(f"{r['plan_day']} · {r['disciplina']} · {r['classe']}")
+            st.button("Abrir", key=f"{key}_open_{int(r['id'])}",
+                      on_click=lambda lbl=r["label"]: st.session_state.update({sel_key: lbl}))
+    if len(df) > n:
+        st.button("Mostrar mais", key=f"{key}_more",
+                  on_click=lambda: st.session_state.update({f"{key}_n": n + GALERIA_N}))
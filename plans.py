@@ -1,9 +1,10 @@
-import base64
 import pandas as pd
 import streamlit as st
 import requests
 
 from utils import supa
+from plan_thumb import iter_plan_jsons, render_plan_gallery
+from plan_pdf import fetch_plan_pdf, pdf_memo, pdf_pool
 
 BUCKET_PLANS = "plans"
 
@@ -12,7 +13,7 @@ def list_user_plans(user_key: str) -> pd.DataFrame:
     sb = supa()
     r = (
         sb.table("user_plans")
-        .select("id,created_at,plan_day,disciplina,classe,tema,unidade,turma,pdf_path,pdf_b64")
+        .select("id,created_at,plan_day,disciplina,classe,tema,unidade,turma")
         .eq("user_key", user_key)
         .order("created_at", desc=True)
         .execute()
@@ -29,7 +30,7 @@ def get_plan_pdf_bytes(user_key: str, plan_id: int) -> bytes | None:
     sb = supa()
     r = (
         sb.table("user_plans")
-        .select("pdf_path,pdf_b64")
+        .select("pdf_path")
         .eq("user_key", user_key)
         .eq("id", plan_id)
         .limit(1)
@@ -39,7 +40,6 @@ def get_plan_pdf_bytes(user_key: str, plan_id: int) -> bytes | None:
         return None
 
     pdf_path = r.data[0].get("pdf_path")
-    pdf_b64 = r.data[0].get("pdf_b64")
 
     if pdf_path:
         signed = sb.storage.from_(BUCKET_PLANS).create_signed_url(pdf_path, 600)
@@ -49,13 +49,11 @@ def get_plan_pdf_bytes(user_key: str, plan_id: int) -> bytes | None:
             if resp.status_code == 200:
                 return resp.content
 
-    if pdf_b64:
-        try:
-            return base64.b64decode(pdf_b64)
-        except Exception:
-            return None
-
-    return None
+    # pdf_b64 (também de planos arquivados) ou, no modo on_demand, gerado de plan_json
+    try:
+        return fetch_plan_pdf(sb, plan_id, pdf_memo(), pdf_pool(), user_key=user_key)
+    except Exception:
+        return None
 
 
 def plans_ui(user: dict):
@@ -101,7 +99,11 @@ def plans_ui(user: dict):
         use_container_width=True
     )
 
-    sel = st.selectbox("Selecionar plano para baixar", out["label"].tolist())
+    with st.expander("🖼️ Galeria", expanded=True):
+        render_plan_gallery(out, "pl_sel_plan", "pl_gal",
+                            lambda ids: iter_plan_jsons(supa(), ids, user_key=user["user_key"]))
+
+    sel = st.selectbox("Selecionar plano para baixar", out["label"].tolist(), key="pl_sel_plan")
     plan_id = int(out[out["label"] == sel].iloc[0]["id"])
 
     pdf_bytes = get_plan_pdf_bytes(user["user_key"], plan_id)
@@ -0,0 +1,153 @@
+# rerender_job.py
+# Re-renderiza os PDFs guardados a partir de plan_json quando o modelo do PDF muda
+# (PDF_TEMPLATE_VERSION em pdf_render.py).
+#
+# - lê user_plans por páginas (id crescente), só planos com versão diferente da actual
+# - renderiza em paralelo (processos), escreve pdf_b64 + pdf_template_version
+# - escritas limitadas (--writes-per-sec) para não pesar no tráfego normal
+# - retomável: checkpoint com o último id tratado; e planos já actualizados não voltam
+#
+# Uso (com .streamlit/secrets.toml):
+#   python rerender_job.py --workers 3 --writes-per-sec 5
+#   python rerender_job.py --dry-run --limit 50
+
+import argparse
+import base64
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import streamlit as st
+
+from utils import secret_flag, supa
+from pdf_pool import render_pdf
+from pdf_render import PDF_TEMPLATE_VERSION
+
+BUCKET_PLANS = "plans"
+
+
+class Throttle:
+    def __init__(self, per_sec: float):
+        self.interval = 1.0 / per_sec if per_sec > 0 else 0
+        self._next = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if now < self._next:
+            time.sleep(self._next - now)
+        self._next = max(now, self._next) + self.interval
+
+
+def load_checkpoint(path: str) -> int:
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == PDF_TEMPLATE_VERSION:
+            return int(data.get("last_id", 0))
+    return 0
+
+
+def save_checkpoint(path: str, last_id: int, stats: dict):
+    if not path:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": PDF_TEMPLATE_VERSION, "last_id": last_id, **stats}, f)
+    os.replace(tmp, path)
+
+
+def stale_filter(q):
+    # planos sem pdf_b64 (PDF_STORAGE = "on_demand") são gerados a pedido com o modelo actual
+    return q.not_.is_("pdf_b64", "null").or_(f"pdf_template_version.is.null,pdf_template_version.neq.{PDF_TEMPLATE_VERSION}")
+
+
+def count_stale(sb) -> int:
+    r = stale_filter(sb.table("user_plans").select("id", count="exact")).limit(1).execute()
+    return int(getattr(r, "count", 0) or 0)
+
+
+def fetch_page(sb, after_id: int, page: int) -> list[dict]:
+    q = sb.table("user_plans").select("id,plan_json,pdf_path").gt("id", after_id)
+    r = stale_filter(q).order("id").limit(page).execute()
+    return r.data or []
+
+
+def render_row(row: dict, font_mode: str, compact: bool) -> tuple[int, bytes | None, str]:
+    pj = row.get("plan_json")
+    try:
+        if isinstance(pj, str):
+            pj = json.loads(pj)
+        pdf, _ = render_pdf(pj["ctx"], pj["plano"], font_mode, compact)
+        return row["id"], pdf, ""
+    except Exception as e:
+        return row["id"], None, f"{type(e).__name__}: {e}"
+
+
+def write_back(sb, row: dict, pdf: bytes):
+    if row.get("pdf_path"):
+        sb.storage.from_(BUCKET_PLANS).update(row["pdf_path"], pdf, {"content-type": "application/pdf"})
+    (
+        sb.table("user_plans")
+        .update({"pdf_b64": base64.b64encode(pdf).decode("utf-8"), "pdf_template_version": PDF_TEMPLATE_VERSION})
+        .eq("id", row["id"])
+        .execute()
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Re-renderiza PDFs guardados com o modelo actual.")
+    ap.add_argument("--page", type=int, default=100, help="planos por página")
+    ap.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    ap.add_argument("--writes-per-sec", type=float, default=5.0)
+    ap.add_argument("--limit", type=int, default=0, help="máximo de planos (0 = todos)")
+    ap.add_argument("--checkpoint", default="rerender_checkpoint.json")
+    ap.add_argument("--dry-run", action="store_true", help="renderiza mas não escreve")
+    args = ap.parse_args()
+
+    font_mode = st.secrets.get("PDF_FONT_MODE", "dejavu")
+    compact = secret_flag("PDF_COMPACT", True)
+
+    sb = supa()
+    total = count_stale(sb)
+    last_id = load_checkpoint(args.checkpoint)
+    stats = {"feitos": 0, "falhas": 0}
+    throttle = Throttle(args.writes_per_sec)
+    t0 = time.time()
+    print(f"modelo v{PDF_TEMPLATE_VERSION}: {total} planos desactualizados; a partir do id {last_id}")
+
+    with ProcessPoolExecutor(max_workers=args.workers) as ex:
+        while True:
+            rows = fetch_page(sb, last_id, args.page)
+            if args.limit:
+                rows = rows[: max(0, args.limit - stats["feitos"] - stats["falhas"])]
+            if not rows:
+                break
+            by_id = {r["id"]: r for r in rows}
+            results = ex.map(render_row, rows, [font_mode] * len(rows), [compact] * len(rows))
+            for plan_id, pdf, err in results:
+                if pdf is None:
+                    stats["falhas"] += 1
+                    print(f"  id {plan_id}: {err}")
+                elif not args.dry_run:
+                    throttle.wait()
+                    write_back(sb, by_id[plan_id], pdf)
+                    stats["feitos"] += 1
+                else:
+                    stats["feitos"] += 1
+            last_id = rows[-1]["id"]
+            if not args.dry_run:
+                save_checkpoint(args.checkpoint, last_id, stats)
+
+            n = stats["feitos"] + stats["falhas"]
+            rate = n / max(1e-6, time.time() - t0)
+            eta = (total - n) / rate if rate else 0
+            print(f"{n}/{total} ({stats['falhas']} falhas) — {rate:.1f} planos/s, ETA {eta:.0f}s, último id {last_id}")
+
+    print(f"terminado: {stats['feitos']} re-renderizados, {stats['falhas']} falhas, {time.time() - t0:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
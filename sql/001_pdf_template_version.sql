@@ -0,0 +1,6 @@
+-- Versão do modelo (layout) com que o PDF guardado foi gerado.
+-- NULL = gerado antes do carimbo; rerender_job.py actualiza os planos desactualizados.
+alter table user_plans add column if not exists pdf_template_version integer;
+
+create index if not exists user_plans_tpl_version_id_idx
+    on user_plans (pdf_template_version, id);
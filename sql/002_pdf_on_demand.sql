@@ -0,0 +1,2 @@
+-- Modo PDF_STORAGE = "on_demand": o PDF não é guardado, só plan_json + pdf_template_version.
+alter table user_plans alter column pdf_b64 drop not null;
@@ -0,0 +1,28 @@
+-- Registo de planos apagados, para a sincronização incremental do catálogo do
+-- administrador (plan_catalog.CatalogSync). Sem esta tabela, os apagamentos feitos
+-- noutras instâncias só aparecem na reconciliação periódica.
+create table if not exists user_plans_deleted (
+    id bigint not null,
+    deleted_at timestamptz not null default now()
+);
+
+create index if not exists user_plans_deleted_at_idx on user_plans_deleted (deleted_at);
+
+create or replace function user_plans_tombstone() returns trigger
+language plpgsql as $$
+begin
+    insert into user_plans_deleted (id) values (old.id);
+    return old;
+end;
+$$;
+
+drop trigger if exists user_plans_tombstone_trg on user_plans;
+create trigger user_plans_tombstone_trg
+    after delete on user_plans
+    for each row execute function user_plans_tombstone();
+
+-- marca de água da sincronização incremental
+create index if not exists user_plans_created_at_id_idx on user_plans (created_at, id);
+
+-- limpeza ocasional (as instâncias reconciliam de 5 em 5 minutos):
+-- delete from user_plans_deleted where deleted_at < now() - interval '30 days';
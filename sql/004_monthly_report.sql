@@ -0,0 +1,49 @@
+-- Relatório mensal por escola calculado na base de dados (app.py: monthly_report).
+-- Lê só as linhas do mês pedido (índice em plan_day::date), independentemente de quantos
+-- anos de planos existam. plan_day comparado sempre como date, como em 005_plan_cube.sql.
+drop index if exists user_plans_plan_day_idx;
+create index if not exists user_plans_plan_day_date_idx on user_plans ((plan_day::date));
+
+create or replace function report_month_escola(p_year int, p_month int)
+returns table (
+    escola text,
+    total_planos bigint,
+    professores_ativos bigint,
+    media_planos_por_prof numeric,
+    primeiro_plano date,
+    ultimo_plano date
+)
+language sql stable as $$
+    select
+        coalesce(u.school, '-') as escola,
+        count(*) as total_planos,
+        count(distinct p.user_key) as professores_ativos,
+        round(count(*)::numeric / nullif(count(distinct p.user_key), 0), 2) as media_planos_por_prof,
+        min(p.plan_day::date) as primeiro_plano,
+        max(p.plan_day::date) as ultimo_plano
+    from user_plans p
+    left join app_users u on u.user_key = p.user_key
+    where p.plan_day::date >= make_date(p_year, p_month, 1)
+      and p.plan_day::date < (make_date(p_year, p_month, 1) + interval '1 month')::date
+    group by 1
+    order by total_planos desc, escola;
+$$;
+
+create or replace function report_month_escola_prof(p_year int, p_month int)
+returns table (
+    escola text,
+    professor text,
+    total_planos bigint
+)
+language sql stable as $$
+    select
+        coalesce(u.school, '-') as escola,
+        coalesce(u.name, p.user_key) as professor,
+        count(*) as total_planos
+    from user_plans p
+    left join app_users u on u.user_key = p.user_key
+    where p.plan_day::date >= make_date(p_year, p_month, 1)
+      and p.plan_day::date < (make_date(p_year, p_month, 1) + interval '1 month')::date
+    group by 1, 2
+    order by escola, total_planos desc, professor;
+$$;
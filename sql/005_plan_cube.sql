@@ -0,0 +1,67 @@
+-- Cubo de utilização: n.º de planos por mês × escola × disciplina × classe × tipo_aula.
+-- Mantido por trigger a cada insert/delete em user_plans (save_plan, delete_plan,
+-- delete_user_and_data, outras instâncias); plan_cube_rebuild() refaz tudo de raiz
+-- (ex.: depois de mudar a escola de um professor). Lido por app.py: load_cube().
+-- A escola de cada plano passa a ficar em user_plans.cube_escola: ver sql/011_plan_cube_escola.sql.
+create table if not exists plan_cube (
+    mes date not null,
+    escola text not null,
+    disciplina text not null,
+    classe text not null,
+    tipo_aula text not null,
+    n_planos bigint not null default 0,
+    primary key (mes, escola, disciplina, classe, tipo_aula)
+);
+
+create or replace function plan_cube_bump(p_user_key text, p_day date, p_disciplina text,
+                                          p_classe text, p_tipo text, p_delta int)
+returns void language sql as $$
+    insert into plan_cube (mes, escola, disciplina, classe, tipo_aula, n_planos)
+    select date_trunc('month', p_day)::date,
+           coalesce((select school from app_users where user_key = p_user_key), '-'),
+           coalesce(p_disciplina, '-'), coalesce(p_classe, '-'), coalesce(p_tipo, '-'),
+           p_delta
+    where p_day is not null
+    on conflict (mes, escola, disciplina, classe, tipo_aula)
+    do update set n_planos = plan_cube.n_planos + excluded.n_planos;
+$$;
+
+create or replace function plan_cube_trg() returns trigger
+language plpgsql as $$
+begin
+    if tg_op = 'INSERT' then
+        perform plan_cube_bump(new.user_key, new.plan_day::date, new.disciplina, new.classe, new.tipo_aula, 1);
+        return new;
+    end if;
+    perform plan_cube_bump(old.user_key, old.plan_day::date, old.disciplina, old.classe, old.tipo_aula, -1);
+    return old;
+end;
+$$;
+
+-- before delete: a escola do professor ainda existe quando os planos saem com o utilizador
+drop trigger if exists plan_cube_ins_trg on user_plans;
+create trigger plan_cube_ins_trg after insert on user_plans
+    for each row execute function plan_cube_trg();
+drop trigger if exists plan_cube_del_trg on user_plans;
+create trigger plan_cube_del_trg before delete on user_plans
+    for each row execute function plan_cube_trg();
+
+create or replace function plan_cube_rebuild() returns bigint
+language plpgsql as $$
+declare n bigint;
+begin
+    delete from plan_cube where true;
+    insert into plan_cube (mes, escola, disciplina, classe, tipo_aula, n_planos)
+    select date_trunc('month', p.plan_day)::date,
+           coalesce(u.school, '-'), coalesce(p.disciplina, '-'), coalesce(p.classe, '-'),
+           coalesce(p.tipo_aula, '-'), count(*)
+    from user_plans p
+    left join app_users u on u.user_key = p.user_key
+    where p.plan_day is not null
+    group by 1, 2, 3, 4, 5;
+    get diagnostics n = row_count;
+    return n;
+end;
+$$;
+
+select plan_cube_rebuild();
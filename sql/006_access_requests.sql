@@ -0,0 +1,31 @@
+-- Processamento de pedidos de acesso em lote (admin.py: process_requests).
+-- Numa só transacção: marca os pedidos pendentes como aprovados/rejeitados e muda o
+-- estado dos utilizadores correspondentes. Pedidos já processados são ignorados.
+-- Devolve o número de pedidos processados.
+create or replace function process_access_requests(p_ids bigint[], p_decision text, p_by text)
+returns int
+language plpgsql as $$
+declare
+    n int;
+begin
+    if p_decision not in ('approved', 'rejected') then
+        raise exception 'decisão inválida: %', p_decision;
+    end if;
+
+    with done as (
+        update access_requests
+           set status = p_decision, processed_at = now(), processed_by = p_by
+         where id = any(p_ids) and status = 'pending'
+        returning user_key
+    ), users as (
+        update app_users u
+           set status = case when p_decision = 'approved' then 'approved' else 'trial' end,
+               approved_at = case when p_decision = 'approved' then now() end,
+               approved_by = case when p_decision = 'approved' then p_by end
+          from (select distinct user_key from done) d
+         where u.user_key = d.user_key
+    )
+    select count(*) into n from done;
+    return n;
+end;
+$$;
@@ -0,0 +1,35 @@
+-- Fila de limpeza do Storage (storage_gc.py).
+-- Cada plano apagado com pdf_path fica registado como trabalho pendente, seja qual for
+-- o caminho do apagamento (delete_plan, delete_user_and_data, admin.delete_user, SQL
+-- directo). O ficheiro no bucket é removido depois, em lote, pelo storage_gc.py.
+create table if not exists storage_gc_jobs (
+    id bigserial primary key,
+    bucket text not null default 'plans',
+    path text not null,
+    plan_id bigint,
+    user_key text,
+    created_at timestamptz not null default now(),
+    done_at timestamptz,
+    error text
+);
+
+create index if not exists storage_gc_jobs_pending_idx on storage_gc_jobs (id) where done_at is null;
+create index if not exists user_plans_pdf_path_idx on user_plans (pdf_path) where pdf_path is not null;
+
+create or replace function user_plans_storage_gc() returns trigger
+language plpgsql as $$
+begin
+    if old.pdf_path is not null then
+        insert into storage_gc_jobs (path, plan_id, user_key) values (old.pdf_path, old.id, old.user_key);
+    end if;
+    return old;
+end;
+$$;
+
+drop trigger if exists user_plans_storage_gc_trg on user_plans;
+create trigger user_plans_storage_gc_trg
+    after delete on user_plans
+    for each row execute function user_plans_storage_gc();
+
+-- limpeza ocasional dos trabalhos feitos:
+-- delete from storage_gc_jobs where done_at < now() - interval '30 days';
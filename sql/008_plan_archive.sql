@@ -0,0 +1,31 @@
+-- Arquivo frio dos planos antigos (archive_job.py, plan_archive.py).
+-- Planos arquivados: plan_json/pdf_b64/upload_b64 a null, conteúdo em archive_path
+-- (um objecto por plano no bucket "plans"). A app lê de lá quando os campos faltam.
+-- Aplicar antes de instalar a versão da app que lê archive_path.
+alter table user_plans add column if not exists archived_at timestamptz;
+alter table user_plans add column if not exists archive_path text;
+alter table user_plans alter column plan_json drop not null;
+alter table user_plans alter column upload_b64 drop not null;
+
+-- candidatos ao arquivo (só planos ainda "quentes")
+create index if not exists user_plans_hot_idx on user_plans (id) where archived_at is null;
+create index if not exists user_plans_archive_path_idx on user_plans (archive_path) where archive_path is not null;
+
+-- ao apagar um plano arquivado, o objecto do arquivo também vai para a fila de limpeza
+-- (substitui a função de sql/007_storage_gc.sql; o trigger continua o mesmo)
+create or replace function user_plans_storage_gc() returns trigger
+language plpgsql as $$
+begin
+    if old.pdf_path is not null then
+        insert into storage_gc_jobs (path, plan_id, user_key) values (old.pdf_path, old.id, old.user_key);
+    end if;
+    if old.archive_path is not null then
+        insert into storage_gc_jobs (path, plan_id, user_key) values (old.archive_path, old.id, old.user_key);
+    end if;
+    return old;
+end;
+$$;
+
+-- o espaço dos campos apagados (TOAST) só volta a ser reutilizado depois do vacuum;
+-- para devolver o espaço ao disco, fora das horas de uso:
+-- vacuum (full, analyze) user_plans;
@@ -0,0 +1,5 @@
+-- created_at dos planos atribuído pela base de dados (relógio do servidor), não pela app.
+-- É a marca de água da sincronização incremental (plan_catalog.CatalogSync): com o
+-- relógio de cada cliente, um plano gravado "no passado" ficava atrás da marca.
+-- Aplicar antes de instalar a versão da app que deixa de enviar created_at.
+alter table user_plans alter column created_at set default now();
@@ -0,0 +1,25 @@
+-- Tecto diário das pré-gerações (app.py: spec_submit), partilhado por todos os processos
+-- e réplicas e mantido entre reinícios. Como o daily_limit, conta na base de dados.
+create table if not exists spec_usage (
+    user_key text not null,
+    day date not null default current_date,
+    n int not null default 0,
+    primary key (user_key, day)
+);
+
+-- Reserva uma pré-geração: true se ainda havia margem (e conta-a), false se não.
+create or replace function spec_usage_take(p_user_key text, p_max int)
+returns boolean
+language plpgsql as $$
+declare
+    got int;
+begin
+    insert into spec_usage as s (user_key, day, n) values (p_user_key, current_date, 1)
+    on conflict (user_key, day) do update set n = s.n + 1 where s.n < p_max
+    returning n into got;
+    return got is not null;
+end;
+$$;
+
+-- limpeza ocasional:
+-- delete from spec_usage where day < current_date - 30;
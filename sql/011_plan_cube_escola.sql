@@ -0,0 +1,71 @@
+-- Escola do cubo guardada no próprio plano (user_plans.cube_escola), preenchida no insert.
+-- O -1 do delete usa old.cube_escola: cai na mesma chave do +1 mesmo que o professor já
+-- tenha sido apagado (delete_user_and_data) ou mudado de escola entretanto.
+-- Substitui plan_cube_bump / plan_cube_trg / plan_cube_rebuild de sql/005_plan_cube.sql.
+alter table user_plans add column if not exists cube_escola text;
+
+update user_plans p
+set cube_escola = coalesce((select u.school from app_users u where u.user_key = p.user_key), '-')
+where p.cube_escola is null;
+
+drop function if exists plan_cube_bump(text, date, text, text, text, int);
+create or replace function plan_cube_bump(p_escola text, p_day date, p_disciplina text,
+                                          p_classe text, p_tipo text, p_delta int)
+returns void language sql as $$
+    insert into plan_cube (mes, escola, disciplina, classe, tipo_aula, n_planos)
+    select date_trunc('month', p_day)::date, coalesce(p_escola, '-'),
+           coalesce(p_disciplina, '-'), coalesce(p_classe, '-'), coalesce(p_tipo, '-'),
+           p_delta
+    where p_day is not null
+    on conflict (mes, escola, disciplina, classe, tipo_aula)
+    do update set n_planos = plan_cube.n_planos + excluded.n_planos;
+$$;
+
+create or replace function plan_cube_escola_trg() returns trigger
+language plpgsql as $$
+begin
+    new.cube_escola := coalesce((select school from app_users where user_key = new.user_key), '-');
+    return new;
+end;
+$$;
+
+create or replace function plan_cube_trg() returns trigger
+language plpgsql as $$
+begin
+    if tg_op = 'INSERT' then
+        perform plan_cube_bump(new.cube_escola, new.plan_day::date, new.disciplina, new.classe, new.tipo_aula, 1);
+        return new;
+    end if;
+    perform plan_cube_bump(old.cube_escola, old.plan_day::date, old.disciplina, old.classe, old.tipo_aula, -1);
+    return old;
+end;
+$$;
+
+drop trigger if exists plan_cube_escola_trg on user_plans;
+create trigger plan_cube_escola_trg before insert on user_plans
+    for each row execute function plan_cube_escola_trg();
+
+-- plan_cube_rebuild: a escola actual de cada professor passa para os planos e o cubo
+-- é refeito a partir de cube_escola (os deletes seguintes batem certo com o cubo novo)
+create or replace function plan_cube_rebuild() returns bigint
+language plpgsql as $$
+declare n bigint;
+begin
+    update user_plans p
+    set cube_escola = coalesce(u.school, '-')
+    from app_users u
+    where u.user_key = p.user_key and p.cube_escola is distinct from coalesce(u.school, '-');
+    delete from plan_cube where true;
+    insert into plan_cube (mes, escola, disciplina, classe, tipo_aula, n_planos)
+    select date_trunc('month', p.plan_day)::date,
+           coalesce(p.cube_escola, '-'), coalesce(p.disciplina, '-'), coalesce(p.classe, '-'),
+           coalesce(p.tipo_aula, '-'), count(*)
+    from user_plans p
+    where p.plan_day is not null
+    group by 1, 2, 3, 4, 5;
+    get diagnostics n = row_count;
+    return n;
+end;
+$$;
+
+select plan_cube_rebuild();
@@ -0,0 +1,189 @@
+# storage_gc.py
+# Limpeza do bucket "plans": remove os PDFs que já não pertencem a nenhum plano.
+#
+# - fila: trabalhos em storage_gc_jobs (sql/007_storage_gc.sql), registados por trigger
+#   sempre que um plano com pdf_path ou archive_path é apagado; removidos em lotes
+# - reconciliação: lista o bucket e compara com os pdf_path de user_plans; apaga os
+#   objectos sem plano com mais de --grace-h horas (o upload acontece antes do insert)
+# - archive/: objectos do arquivo frio (archive_job.py) contam como usados por archive_path
+# - exports/: ZIPs de PDFs (pdf_zip.py) com mais de --exports-ttl-h horas
+# - --dry-run: só o relatório (objectos e bytes recuperáveis), sem apagar nada
+#
+# Uso (com .streamlit/secrets.toml), p.ex. no cron de hora a hora:
+#   python storage_gc.py --dry-run
+#   python storage_gc.py
+#   python storage_gc.py --every 30      # em contínuo, uma passagem a cada 30 minutos
+
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+
+from utils import supa
+
+BUCKET_PLANS = "plans"
+EXPORTS_PREFIX = "exports/"
+ARCHIVE_PREFIX = "archive/"
+LIST_PAGE = 1000
+
+
+def list_objects(sb, bucket: str, prefix: str = ""):
+    """Todos os objectos do bucket (recursivo): dicts com path, size e updated_at."""
+    offset = 0
+    while True:
+        items = sb.storage.from_(bucket).list(prefix, {"limit": LIST_PAGE, "offset": offset, "sortBy": {"column": "name", "order": "asc"}}) or []
+        for it in items:
+            path = f"{prefix}/{it['name']}" if prefix else it["name"]
+            if it.get("id") is None:  # pasta
+                yield from list_objects(sb, bucket, path)
+            else:
+                meta = it.get("metadata") or {}
+                yield {"path": path, "size": int(meta.get("size") or 0), "updated_at": it.get("updated_at") or it.get("created_at")}
+        if len(items) < LIST_PAGE:
+            return
+        offset += LIST_PAGE
+
+
+def referenced_paths(sb, col: str = "pdf_path", page: int = 1000) -> set[str]:
+    refs, last = set(), 0
+    while True:
+        rows = (
+            sb.table("user_plans").select(f"id,{col}").not_.is_(col, "null")
+            .gt("id", last).order("id").limit(page).execute().data or []
+        )
+        refs.update(r[col] for r in rows)
+        if len(rows) < page:
+            return refs
+        last = rows[-1]["id"]
+
+
+def older_than(ts: str | None, hours: float) -> bool:
+    if not ts:
+        return True
+    t = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - t > timedelta(hours=hours)
+
+
+def remove_batch(sb, bucket: str, paths: list[str], dry_run: bool):
+    if paths and not dry_run:
+        sb.storage.from_(bucket).remove(paths)
+
+
+def run_jobs(sb, batch: int, dry_run: bool) -> dict:
+    """Trabalhos pendentes da fila; um caminho ainda usado por outro plano não é apagado.
+    Se a remoção falhar, o trabalho fica pendente (com o erro) para a próxima passagem."""
+    stats = {"trabalhos": 0, "ficheiros": 0, "falhas": 0}
+    last = 0
+    while True:
+        try:
+            rows = (
+                sb.table("storage_gc_jobs").select("id,bucket,path").is_("done_at", "null")
+                .gt("id", last).order("id").limit(batch).execute().data or []
+            )
+        except Exception as e:
+            print(f"fila indisponível ({type(e).__name__}); ver sql/007_storage_gc.sql")
+            return stats
+        if not rows:
+            return stats
+        last = rows[-1]["id"]
+        stats["trabalhos"] += len(rows)
+        paths = sorted({r["path"] for r in rows})
+        in_use = {r["pdf_path"] for r in sb.table("user_plans").select("pdf_path").in_("pdf_path", paths).execute().data or []}
+        arch = [p for p in paths if p.startswith(ARCHIVE_PREFIX)]
+        if arch:
+            in_use |= {r["archive_path"] for r in sb.table("user_plans").select("archive_path").in_("archive_path", arch).execute().data or []}
+
+        for bucket in sorted({r["bucket"] for r in rows}):
+            ids = [r["id"] for r in rows if r["bucket"] == bucket]
+            todo = sorted({r["path"] for r in rows if r["bucket"] == bucket} - in_use)
+            try:
+                remove_batch(sb, bucket, todo, dry_run)
+                stats["ficheiros"] += len(todo)
+                payload = {"done_at": datetime.now(timezone.utc).isoformat(), "error": None}
+            except Exception as e:
+                stats["falhas"] += len(todo)
+                payload = {"error": f"{type(e).__name__}: {e}"[:500]}
+            if not dry_run:
+                sb.table("storage_gc_jobs").update(payload).in_("id", ids).execute()
+        if len(rows) < batch:
+            return stats
+
+
+def reconcile(sb, batch: int, grace_h: float, exports_ttl_h: float, dry_run: bool) -> dict:
+    """Objectos do bucket sem plano (fora de exports/) e ZIPs de exports/ expirados.
+    Lista primeiro e só depois remove (remover durante a listagem desloca o offset)."""
+    refs = referenced_paths(sb)
+    try:
+        refs |= referenced_paths(sb, "archive_path")  # arquivo frio (sql/008_plan_archive.sql)
+        keep_prefix = None
+    except Exception:
+        keep_prefix = ARCHIVE_PREFIX  # sem saber que objectos estão em uso, não se toca no arquivo
+    stats = {"objectos": 0, "bytes": 0, "orfaos": 0, "bytes_orfaos": 0, "exports": 0, "bytes_exports": 0, "falhas": 0}
+    lixo = []
+    for o in list_objects(sb, BUCKET_PLANS):
+        stats["objectos"] += 1
+        stats["bytes"] += o["size"]
+        if keep_prefix and o["path"].startswith(keep_prefix):
+            continue
+        if o["path"].startswith(EXPORTS_PREFIX):
+            if older_than(o["updated_at"], exports_ttl_h):
+                stats["exports"] += 1
+                stats["bytes_exports"] += o["size"]
+                lixo.append(o["path"])
+        elif o["path"] not in refs and older_than(o["updated_at"], grace_h):
+            stats["orfaos"] += 1
+            stats["bytes_orfaos"] += o["size"]
+            lixo.append(o["path"])
+
+    for i in range(0, len(lixo), batch):
+        try:
+            remove_batch(sb, BUCKET_PLANS, lixo[i:i + batch], dry_run)
+        except Exception as e:
+            stats["falhas"] += len(lixo[i:i + batch])
+            print(f"  falha ao remover {len(lixo[i:i + batch])} objectos: {type(e).__name__}: {e}")
+    return stats
+
+
+def mb(n: int) -> str:
+    return f"{n / 1024 / 1024:.1f} MB"
+
+
+def run_once(sb, args) -> None:
+    t0 = time.time()
+    modo = "relatório (dry-run)" if args.dry_run else "limpeza"
+    print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} — {modo}")
+
+    j = run_jobs(sb, args.batch, args.dry_run)
+    print(f"fila: {j['trabalhos']} trabalhos, {j['ficheiros']} ficheiros a remover, {j['falhas']} falhas")
+
+    if args.no_reconcile:
+        return
+    r = reconcile(sb, args.batch, args.grace_h, args.exports_ttl_h, args.dry_run)
+    print(f"bucket: {r['objectos']} objectos, {mb(r['bytes'])}")
+    print(f"  sem plano: {r['orfaos']} ({mb(r['bytes_orfaos'])})")
+    print(f"  exports expirados: {r['exports']} ({mb(r['bytes_exports'])})")
+    verbo = "recuperáveis" if args.dry_run else "libertados"
+    print(f"{mb(r['bytes_orfaos'] + r['bytes_exports'])} {verbo}; {r['falhas']} falhas; {time.time() - t0:.0f}s")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Remove do Storage os PDFs sem plano e os ZIPs expirados.")
+    ap.add_argument("--batch", type=int, default=100, help="objectos por pedido de remoção")
+    ap.add_argument("--grace-h", type=float, default=24, help="idade mínima de um objecto sem plano")
+    ap.add_argument("--exports-ttl-h", type=float, default=24, help="idade máxima dos ZIPs em exports/")
+    ap.add_argument("--no-reconcile", action="store_true", help="só a fila (sem listar o bucket)")
+    ap.add_argument("--every", type=float, default=0, help="repetir a cada N minutos (0 = uma vez)")
+    ap.add_argument("--dry-run", action="store_true", help="só mostra o que seria removido")
+    args = ap.parse_args()
+
+    sb = supa()
+    while True:
+        run_once(sb, args)
+        if not args.every:
+            return
+        time.sleep(args.every * 60)
+
+
+if __name__ == "__main__":
+    main()
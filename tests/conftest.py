@@ -0,0 +1,8 @@
+# conftest.py
+# Os módulos da aplicação estão na raiz do repositório (sem pacote).
+# Uso: python -m pytest -q   (na raiz do repositório)
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,191 @@
+# fake_sb.py
+# Cliente Supabase em memória para os testes: tabelas como listas de dicts e buckets
+# como dicts caminho -> (bytes, updated_at). Cobre só os filtros usados pela app
+# (eq, gt, gte, lt, in_, is_/not_.is_ null, or_ da marca de água do catálogo).
+# Funções SQL (rpc) são funções Python registadas em FakeSB.functions.
+
+import re
+import types
+from datetime import datetime, timezone
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class MissingTable(Exception):
+    pass
+
+
+class _Not:
+    def __init__(self, q):
+        self.q = q
+
+    def is_(self, col, value):
+        assert value == "null"
+        return self.q._where(lambda r: r.get(col) is not None)
+
+
+class Query:
+    def __init__(self, sb, table: str):
+        self.sb = sb
+        self.table = table
+        self.filters = []
+        self.orders = []
+        self.cols = None
+        self.n = None
+        self.op = "select"
+        self.payload = None
+
+    def _where(self, f):
+        self.filters.append(f)
+        return self
+
+    def select(self, cols: str = "*", count=None):
+        self.cols = None if cols == "*" else [c.strip() for c in cols.split(",")]
+        return self
+
+    def update(self, payload: dict):
+        self.op, self.payload = "update", payload
+        return self
+
+    def insert(self, payload):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def eq(self, col, v):
+        return self._where(lambda r: r.get(col) == v)
+
+    def gt(self, col, v):
+        return self._where(lambda r: r.get(col) is not None and r[col] > v)
+
+    def gte(self, col, v):
+        return self._where(lambda r: r.get(col) is not None and r[col] >= v)
+
+    def lt(self, col, v):
+        return self._where(lambda r: r.get(col) is not None and r[col] < v)
+
+    def in_(self, col, values):
+        values = set(values)
+        return self._where(lambda r: r.get(col) in values)
+
+    def is_(self, col, value):
+        assert value == "null"
+        return self._where(lambda r: r.get(col) is None)
+
+    @property
+    def not_(self):
+        return _Not(self)
+
+    def or_(self, expr: str):
+        # só a forma de CatalogSync._fetch_new: created_at > ts ou (created_at = ts e id > n)
+        m = re.fullmatch(r'created_at\.gt\."(.+?)",and\(created_at\.eq\."(.+?)",id\.gt\.(\d+)\)', expr)
+        assert m, expr
+        ts, pid = m.group(1), int(m.group(3))
+        return self._where(lambda r: r["created_at"] > ts or (r["created_at"] == ts and r["id"] > pid))
+
+    def order(self, col, desc=False):
+        self.orders.append((col, desc))
+        return self
+
+    def limit(self, n: int):
+        self.n = n
+        return self
+
+    def execute(self):
+        if self.table in self.sb.missing or self.table not in self.sb.tables:
+            raise MissingTable(f'relation "{self.table}" does not exist')
+        rows = self.sb.tables[self.table]
+        if self.op == "insert":
+            new = [dict(r) for r in (self.payload if isinstance(self.payload, list) else [self.payload])]
+            rows.extend(new)
+            return types.SimpleNamespace(data=new)
+        hit = [r for r in rows if all(f(r) for f in self.filters)]
+        if self.op == "update":
+            for r in hit:
+                r.update(self.payload)
+            return types.SimpleNamespace(data=[dict(r) for r in hit])
+        if self.op == "delete":
+            self.sb.tables[self.table] = [r for r in rows if r not in hit]
+            return types.SimpleNamespace(data=hit)
+        for col, desc in reversed(self.orders):
+            hit.sort(key=lambda r: r[col], reverse=desc)
+        if self.n is not None:
+            hit = hit[:self.n]
+        self.sb.reads[self.table] = self.sb.reads.get(self.table, 0) + len(hit)
+        cols = self.cols
+        return types.SimpleNamespace(data=[dict(r) if cols is None else {c: r.get(c) for c in cols} for r in hit])
+
+
+class Bucket:
+    """Listagem como a do Storage: um nível por pedido, pastas com id None, limit/offset."""
+
+    def __init__(self):
+        self.objects: dict[str, tuple[bytes, str]] = {}
+        self.removed: list[str] = []
+        self.fail_remove = False
+
+    def put(self, path: str, data: bytes = b"x", updated_at: str | None = None):
+        self.objects[path] = (bytes(data), updated_at or now_iso())
+
+    def upload(self, path: str, data: bytes, options=None):
+        self.put(path, data)
+
+    def download(self, path: str) -> bytes:
+        if path not in self.objects:
+            raise FileNotFoundError(path)
+        return self.objects[path][0]
+
+    def remove(self, paths: list[str]):
+        if self.fail_remove:
+            raise RuntimeError("storage indisponível")
+        for p in paths:
+            if self.objects.pop(p, None) is not None:
+                self.removed.append(p)
+
+    def list(self, prefix: str = "", options=None):
+        options = options or {}
+        base = prefix + "/" if prefix else ""
+        names = {}
+        for p, (data, ts) in self.objects.items():
+            if not p.startswith(base):
+                continue
+            rest = p[len(base):]
+            if "/" in rest:
+                names.setdefault(rest.split("/")[0], None)
+            else:
+                names[rest] = {"name": rest, "id": p, "updated_at": ts, "metadata": {"size": len(data)}}
+        items = [v or {"name": k, "id": None} for k, v in sorted(names.items())]
+        offset = options.get("offset", 0)
+        return items[offset:offset + options.get("limit", 100)]
+
+
+class FakeSB:
+    def __init__(self, tables: dict | None = None, missing=()):
+        self.tables = {k: [dict(r) for r in v] for k, v in (tables or {}).items()}
+        self.missing = set(missing)
+        self.functions: dict = {}
+        self.calls: list[tuple[str, dict]] = []
+        self.reads: dict[str, int] = {}
+        self.buckets: dict[str, Bucket] = {}
+        self.storage = types.SimpleNamespace(from_=self.bucket)
+
+    def bucket(self, name: str) -> Bucket:
+        return self.buckets.setdefault(name, Bucket())
+
+    def table(self, name: str) -> Query:
+        return Query(self, name)
+
+    def rpc(self, name: str, params: dict):
+        self.calls.append((name, params))
+        fn = self.functions.get(name)
+        if fn is None:
+            raise MissingTable(f"function {name} does not exist")
+        return types.SimpleNamespace(execute=lambda: types.SimpleNamespace(data=fn(self, **params)))
+
+    def rows(self, name: str) -> list[dict]:
+        return self.tables[name]
@@ -0,0 +1,62 @@
+# test_admin.py
+# Alterações em lote de utilizadores e pedidos de acesso (RPC process_access_requests
+# de sql/006, ou dois UPDATE em lote sem a função).
+# admin.py importa plan_pdf, que lê st.secrets: sem .streamlit/secrets.toml não corre.
+
+import pytest
+from streamlit.errors import StreamlitSecretNotFoundError
+
+from fake_sb import FakeSB
+
+try:
+    import admin
+except StreamlitSecretNotFoundError:
+    pytest.skip("sem .streamlit/secrets.toml", allow_module_level=True)
+
+
+@pytest.fixture
+def sb(monkeypatch):
+    sb = FakeSB({
+        "app_users": [
+            {"user_key": k, "status": "trial", "approved_at": None, "approved_by": None, "daily_limit": 2}
+            for k in ("u1", "u2", "u3")
+        ],
+        "access_requests": [
+            {"id": 1, "user_key": "u1", "status": "pending"},
+            {"id": 2, "user_key": "u2", "status": "pending"},
+            {"id": 3, "user_key": "u3", "status": "rejected"},
+        ],
+    })
+    monkeypatch.setattr(admin, "supa", lambda: sb)
+    return sb
+
+
+def users(sb):
+    return {u["user_key"]: u for u in sb.rows("app_users")}
+
+
+def test_set_users_status_e_limites(sb):
+    admin.set_users_status(["u1", "u2"], "approved", approved_by="Admin")
+    assert users(sb)["u1"]["status"] == "approved" and users(sb)["u2"]["approved_by"] == "Admin"
+    assert users(sb)["u3"]["status"] == "trial"
+    admin.set_users_status(["u1"], "blocked")
+    assert users(sb)["u1"]["approved_at"] is None and users(sb)["u1"]["approved_by"] is None
+    admin.set_daily_limits(["u2", "u3"], "5")
+    assert [u["daily_limit"] for u in sb.rows("app_users")] == [2, 5, 5]
+    admin.set_users_status([], "approved")  # nada a fazer, sem pedido
+
+
+def test_process_requests_sem_rpc(sb):
+    assert admin.process_requests([1, 2, 3], True, "Admin") == 2
+    assert [r["status"] for r in sb.rows("access_requests")] == ["approved", "approved", "rejected"]
+    assert users(sb)["u1"]["status"] == "approved" and users(sb)["u3"]["status"] == "trial"
+    # já processados não contam outra vez
+    assert admin.process_requests([1], False, "Admin") == 0
+
+
+def test_process_requests_com_rpc(sb):
+    sb.functions["process_access_requests"] = lambda sb, p_ids, p_decision, p_by: len(p_ids)
+    assert admin.process_requests(["1", 2], False, "Admin") == 2
+    assert sb.calls == [("process_access_requests", {"p_ids": [1, 2], "p_decision": "rejected", "p_by": "Admin"})]
+    # a função faz tudo na base de dados: sem os UPDATE de recurso
+    assert [r["status"] for r in sb.rows("access_requests")] == ["pending", "pending", "rejected"]
@@ -0,0 +1,73 @@
+# test_pdf_memo.py
+# PdfMemo: chaves, memória limitada (LRU), disco partilhado entre instâncias.
+
+import os
+
+from pdf_memo import PdfMemo
+
+
+def test_key():
+    assert PdfMemo.key(7, 3) == "7-v3"
+    assert PdfMemo.key("7", 3, "dejavu-c") == "7-v3-dejavu-c"
+    assert PdfMemo.key(7, 3) != PdfMemo.key(7, 4)
+
+
+def test_get_or_render_renderiza_uma_vez():
+    memo = PdfMemo()
+    chamadas = []
+
+    def render():
+        chamadas.append(1)
+        return b"%PDF-a"
+
+    assert memo.get_or_render("1-v1", render) == b"%PDF-a"
+    assert memo.get_or_render("1-v1", render) == b"%PDF-a"
+    assert len(chamadas) == 1
+    assert memo.hits == {"mem": 1, "disco": 0, "falhas": 1}
+
+
+def test_erro_no_render_nao_fica_em_cache():
+    memo = PdfMemo()
+
+    def falha():
+        raise RuntimeError("pool ocupado")
+
+    try:
+        memo.get_or_render("1-v1", falha)
+    except RuntimeError:
+        pass
+    assert memo.get("1-v1") is None
+    assert memo.get_or_render("1-v1", lambda: b"ok") == b"ok"
+
+
+def test_lru_em_memoria():
+    memo = PdfMemo(max_mem_bytes=10)
+    memo.put("a", b"aaaa")
+    memo.put("b", b"bbbb")
+    memo.get("a")
+    memo.put("c", b"cccc")  # sai o menos usado (b)
+    assert list(memo._mem) == ["a", "c"]
+    assert memo._mem_bytes == 8
+    memo.put("grande", b"x" * 11)  # maior que a memória: não entra
+    assert "grande" not in memo._mem
+
+
+def test_disco_entre_instancias_e_limite(tmp_path):
+    a = PdfMemo(disk_dir=str(tmp_path), max_disk_bytes=25)
+    a.put("1-v1", b"x" * 10)
+    b = PdfMemo(disk_dir=str(tmp_path), max_disk_bytes=25)
+    assert b.get("1-v1") == b"x" * 10
+    assert b.hits["disco"] == 1
+
+    os.utime(tmp_path / "1-v1.pdf", (1, 1))  # o mais antigo sai primeiro
+    a.put("2-v1", b"y" * 10)
+    a.put("3-v1", b"z" * 10)
+    assert sorted(os.listdir(tmp_path)) == ["2-v1.pdf", "3-v1.pdf"]
+
+
+def test_sufixo_separa_miniaturas(tmp_path):
+    pdfs = PdfMemo(disk_dir=str(tmp_path))
+    thumbs = PdfMemo(disk_dir=str(tmp_path), suffix=".png", max_disk_bytes=0)
+    pdfs.put("1-v1", b"%PDF")
+    thumbs.put("1-v1", b"PNG")  # limpar as miniaturas não apaga PDFs
+    assert os.listdir(tmp_path) == ["1-v1.pdf"]
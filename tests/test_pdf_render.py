@@ -0,0 +1,98 @@
+# test_pdf_render.py
+# Subconjunto TTF em cache (ttf_subset / PDF._putfonts) contra o fpdf original.
+
+import io
+import random
+import re
+
+import pytest
+from fpdf import FPDF
+from fpdf.ttfonts import TTFontFile
+
+from pdf_bench import make_case
+from pdf_render import FONT_DIR, PDF, TABLE_WIDTHS, create_pdf, glyph_widths, ttf_subset, wrap_lines
+
+FONTS = ["DejaVuSans.ttf", "DejaVuSans-Bold.ttf"]
+TEXTOS = [
+    "Plano de aula",
+    "Educação, avaliação e condições — “aspas” … 1º/2ª",
+    "ŁŚŻ ĀĒĪ ΑΒΓ Жизнь ∑∞≤ ‰ €",
+]
+PALAVRAS = ("a turma lê o texto e identifica as ideias principais acção função área período "
+            "AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA iiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiiii").split()
+
+
+def sem_data(b: bytes) -> bytes:
+    return re.sub(rb"/CreationDate \(D:\d+\)", b"", b)
+
+
+@pytest.mark.parametrize("fname", FONTS)
+@pytest.mark.parametrize("texto", TEXTOS)
+def test_ttf_subset_igual_ao_fpdf(fname, texto):
+    path = f"{FONT_DIR}/{fname}"
+    codes = list(range(32, 57)) + [ord(c) for c in texto]
+    ttf = TTFontFile()
+    stream = ttf.makeSubset(path, list(codes))
+    assert ttf_subset(path, codes) == (stream, ttf.codeToGlyph, ttf.maxUni)
+    # ordem e repetições não contam para a cache
+    assert ttf_subset(path, sorted(set(codes), reverse=True))[0] == stream
+
+
+@pytest.mark.parametrize("font_mode", ["dejavu", "core"])
+@pytest.mark.parametrize("kind", ["curto", "acentos", "latin"])
+def test_pdf_igual_ao_fpdf(monkeypatch, font_mode, kind):
+    ctx, plano = make_case(0, kind)
+    novo = sem_data(create_pdf(ctx, plano, font_mode=font_mode))
+    monkeypatch.setattr(PDF, "_putfonts", FPDF._putfonts)
+    original = sem_data(create_pdf(ctx, plano, font_mode=font_mode))
+    assert novo == original
+
+
+@pytest.mark.parametrize("font_mode", ["dejavu", "core"])
+def test_texto_extraido_igual(monkeypatch, font_mode):
+    pypdf = pytest.importorskip("pypdf")
+
+    def texto(b: bytes) -> str:
+        return "\n".join(p.extract_text() for p in pypdf.PdfReader(io.BytesIO(b)).pages)
+
+    ctx, plano = make_case(1, "acentos")
+    novo = texto(create_pdf(ctx, plano, font_mode=font_mode))
+    monkeypatch.setattr(PDF, "_putfonts", FPDF._putfonts)
+    assert novo == texto(create_pdf(ctx, plano, font_mode=font_mode))
+    assert "MOÇAMBIQUE" in novo
+
+
+def test_fpdf_do_modulo_intacto():
+    # a cache é só da subclasse PDF: o FPDF e o TTFontFile do fpdf ficam os originais
+    import fpdf.fpdf as fpdf_mod
+
+    assert fpdf_mod.TTFontFile is TTFontFile
+    assert PDF._putfonts is not FPDF._putfonts
+
+
+@pytest.mark.parametrize("font_mode", ["dejavu", "core"])
+def test_wrap_lines_igual_a_multi_cell(font_mode):
+    pdf = PDF(font_mode=font_mode)
+    pdf.add_page()
+    pdf.use_font("", 8)
+    rng = random.Random(31)
+    for _ in range(300):
+        txt = " ".join(rng.choice(PALAVRAS) for _ in range(rng.randint(1, 30)))
+        if rng.random() < 0.2:
+            txt = txt.replace(" ", "  ", 1)
+        for w in TABLE_WIDTHS:
+            ref = pdf.multi_cell(w, 4, txt, split_only=True)
+            cells, _ = pdf.layout_row([txt], [w])
+            assert cells[0] == ref, (w, txt)
+
+
+def test_wrap_lines_paragrafos_e_palavra_longa():
+    pdf = PDF(font_mode="core")
+    pdf.add_page()
+    pdf.use_font("", 8)
+    cw = glyph_widths(pdf.current_font)
+    assert wrap_lines("um\ndois", 10_000, cw) == ["um", "dois"]
+    assert wrap_lines("", 10_000, cw) == [""]
+    partes = wrap_lines("x" * 200, 5_000, cw)
+    assert "".join(partes) == "x" * 200
+    assert all(cw.word(p) <= 5_000 for p in partes)
@@ -0,0 +1,93 @@
+# test_plan_archive.py
+# Arquivo frio: plan_archive (objecto por plano, with_cold) e archive_job
+# (archive_plan com UPDATE condicional, restore).
+
+import base64
+import gzip
+import json
+
+import pytest
+
+import archive_job
+from fake_sb import FakeSB
+from plan_archive import BUCKET_PLANS, archive_path, pack, read_cold, with_cold
+
+PDF = b"%PDF-1.4 " + b"x" * 5000
+
+
+def linha(i, versao=3):
+    return {"id": i, "created_at": f"2024-0{i % 9 + 1}-15T08:00:00", "pdf_template_version": versao,
+            "plan_json": {"ctx": {"tema": f"T{i}"}, "plano": {"objetivos": ["ler"]}},
+            "pdf_b64": base64.b64encode(PDF).decode(), "upload_b64": None,
+            "archived_at": None, "archive_path": None}
+
+
+@pytest.fixture
+def sb():
+    return FakeSB({"user_plans": [linha(i) for i in range(1, 5)]})
+
+
+def test_pack_deterministico_e_legivel(sb):
+    row = linha(1)
+    assert archive_path(row) == "archive/2024-02/1.json.gz"
+    blob = pack(row)
+    assert blob == pack(dict(row))
+    assert json.loads(gzip.decompress(blob))["plan_json"] == row["plan_json"]
+    sb.bucket(BUCKET_PLANS).upload("a.json.gz", blob)
+    assert read_cold(sb, "a.json.gz")["pdf_b64"] == row["pdf_b64"]
+    assert read_cold(sb, "nao/existe.json.gz") is None
+
+
+def test_archive_plan_e_with_cold(sb):
+    rows = archive_job.fetch_batch(sb, 0, "2025-01-01", 10)
+    assert [r["id"] for r in rows] == [1, 2, 3, 4]
+    for r in rows:
+        assert archive_job.archive_plan(sb, r) == len(pack(r))
+
+    guardado = sb.rows("user_plans")[1]
+    assert guardado["pdf_b64"] is None and guardado["plan_json"] is None
+    assert guardado["archived_at"] and guardado["archive_path"] == "archive/2024-03/2.json.gz"
+    assert archive_job.fetch_batch(sb, 0, "2025-01-01", 10) == []
+
+    meta = {"id": 2, "pdf_b64": None, "archive_path": guardado["archive_path"]}
+    assert base64.b64decode(with_cold(sb, meta)["pdf_b64"]) == PDF
+    # campos não pedidos não vêm do arquivo; linha não arquivada fica igual
+    assert "plan_json" not in with_cold(sb, meta)
+    quente = {"id": 9, "pdf_b64": "abc", "archive_path": None}
+    assert with_cold(sb, quente) is quente
+
+
+def test_archive_plan_alterado_entretanto(sb):
+    row = archive_job.fetch_batch(sb, 0, "2025-01-01", 1)[0]
+    sb.rows("user_plans")[0]["pdf_template_version"] = 4  # rerender_job.py entre a leitura e o UPDATE
+    assert archive_job.archive_plan(sb, row) is None
+    assert sb.rows("user_plans")[0]["pdf_b64"] is not None
+    assert sb.rows("user_plans")[0]["archived_at"] is None
+    assert sb.bucket(BUCKET_PLANS).objects == {}
+
+
+def test_archive_plan_sem_versao(sb):
+    sb.tables["user_plans"] = [linha(1, versao=None)]
+    row = archive_job.fetch_batch(sb, 0, "2025-01-01", 1)[0]
+    assert archive_job.archive_plan(sb, row)
+    assert sb.rows("user_plans")[0]["archived_at"]
+
+
+def test_archive_plan_upload_corrompido(sb, monkeypatch):
+    row = archive_job.fetch_batch(sb, 0, "2025-01-01", 1)[0]
+    bucket = sb.bucket(BUCKET_PLANS)
+    monkeypatch.setattr(bucket, "download", lambda path: b"outra coisa")
+    with pytest.raises(RuntimeError):
+        archive_job.archive_plan(sb, row)
+    assert sb.rows("user_plans")[0]["archived_at"] is None
+
+
+def test_restore(sb):
+    original = dict(sb.rows("user_plans")[2])
+    archive_job.archive_plan(sb, archive_job.fetch_batch(sb, 2, "2025-01-01", 1)[0])
+    path = sb.rows("user_plans")[2]["archive_path"]
+    archive_job.restore(sb, [3, 99])
+    r = sb.rows("user_plans")[2]
+    assert r["plan_json"] == original["plan_json"] and r["pdf_b64"] == original["pdf_b64"]
+    assert r["archived_at"] is None and r["archive_path"] is None
+    assert path not in sb.bucket(BUCKET_PLANS).objects
@@ -0,0 +1,119 @@
+# test_plan_catalog.py
+# CatalogSync: carga inicial, reruns sem leituras, marca de água, tombstones e
+# reconciliação periódica (com ou sem a tabela user_plans_deleted).
+
+import pytest
+
+from fake_sb import FakeSB
+from plan_catalog import CatalogSync
+
+
+def plano(i, ts, user="u1"):
+    return {"id": i, "created_at": ts, "plan_day": ts[:10], "disciplina": "Português", "classe": "7ª",
+            "unidade": "U1", "tema": f"T{i}", "turma": "A", "tipo_aula": "Nova", "duracao": "45",
+            "metodos": "", "meios": "", "upload_name": None, "upload_type": None,
+            "upload_details": None, "user_key": user}
+
+
+@pytest.fixture
+def sb():
+    return FakeSB({
+        "user_plans": [plano(i, f"2026-03-0{i}T10:00:00") for i in range(1, 6)],
+        "app_users": [{"user_key": "u1", "name": "Ana", "school": "EP1"},
+                      {"user_key": "u2", "name": "Rui", "school": "EP2"}],
+        "user_plans_deleted": [],
+    })
+
+
+def sync_sem_reconciliar(sb, **kw):
+    s = CatalogSync(sb, **kw)
+    s.last_reconcile = float("inf")  # só marca de água e tombstones
+    return s
+
+
+def test_carga_inicial_e_rerun_sem_leituras(sb):
+    s = sync_sem_reconciliar(sb, page=2)
+    cat = s.catalog()
+    assert sorted(cat.df["id"]) == [1, 2, 3, 4, 5]
+    assert cat.row(3)["escola"] == "EP1" and cat.row(3)["professor"] == "Ana"
+
+    sb.reads.clear()
+    assert s.catalog() is cat
+    assert sb.reads.get("user_plans", 0) == 0
+
+
+def test_plano_novo_le_uma_linha(sb):
+    s = sync_sem_reconciliar(sb)
+    s.catalog()
+    sb.rows("user_plans").append(plano(6, "2026-03-09T10:00:00", user="u2"))
+    sb.reads.clear()
+    cat = s.catalog()
+    assert sb.reads["user_plans"] == 1
+    assert cat.row(6)["escola"] == "EP2"
+    assert s.stats["novos"] == 6
+
+
+def test_mesmo_created_at_desempata_por_id(sb):
+    s = sync_sem_reconciliar(sb, page=2)
+    s.catalog()
+    ts = sb.rows("user_plans")[-1]["created_at"]
+    sb.rows("user_plans").append(plano(7, ts))
+    assert 7 in s.catalog().df["id"].tolist()
+
+
+def test_tombstones(sb):
+    s = sync_sem_reconciliar(sb)
+    s.catalog()
+    sb.tables["user_plans"] = [r for r in sb.rows("user_plans") if r["id"] != 2]
+    sb.rows("user_plans_deleted").append({"id": 2, "deleted_at": "2999-01-01T00:00:00"})
+    assert 2 not in s.catalog().df["id"].tolist()
+    assert s.stats["apagados"] == 1
+
+
+def test_reconciliacao_sem_tombstones(sb):
+    sb.missing.add("user_plans_deleted")
+    s = sync_sem_reconciliar(sb)
+    cat = s.catalog()
+    assert not s.has_tombstones
+
+    # apagado noutra instância + plano que ficou atrás da marca de água
+    sb.tables["user_plans"] = [r for r in sb.rows("user_plans") if r["id"] != 4]
+    sb.rows("user_plans").append(plano(9, "2026-01-01T00:00:00", user="u2"))
+    assert s.catalog() is cat
+
+    s.last_reconcile = float("-inf")
+    ids = sorted(s.catalog().df["id"])
+    assert ids == [1, 2, 3, 5, 9]
+
+
+def test_reconciliacao_periodica_com_tombstones(sb):
+    s = CatalogSync(sb, reconcile_s=0)
+    s.catalog()
+    sb.rows("user_plans").append(plano(9, "2026-01-01T00:00:00"))
+    assert 9 in s.catalog().df["id"].tolist()
+
+
+def test_reconciliacao_sem_mudancas_nao_refaz(sb):
+    s = sync_sem_reconciliar(sb)
+    s.catalog()
+    s.last_reconcile = float("-inf")
+    cat = s.catalog()  # primeira: o mapa passa a ter todos os utilizadores (u2 sem planos)
+    s.last_reconcile = float("-inf")
+    assert s.catalog() is cat
+
+
+def test_escola_alterada(sb):
+    s = sync_sem_reconciliar(sb)
+    s.catalog()
+    sb.rows("app_users")[0]["school"] = "EP9"
+    s.last_reconcile = float("-inf")
+    assert s.catalog().row(1)["escola"] == "EP9"
+
+
+def test_forget(sb):
+    s = sync_sem_reconciliar(sb)
+    s.catalog()
+    s.forget([1, 2])
+    assert sorted(s.catalog().df["id"]) == [3, 4, 5]
+    s.forget_user("u1")
+    assert s.catalog().empty
@@ -0,0 +1,71 @@
+# test_plan_pdf.py
+# fetch_plan_pdf: pdf_b64 guardado, arquivo frio, ou render a pedido (PDF_STORAGE="on_demand").
+# plan_pdf lê st.secrets ao importar: sem .streamlit/secrets.toml estes testes não correm.
+
+import base64
+import json
+
+import pytest
+from streamlit.errors import StreamlitSecretNotFoundError
+
+from fake_sb import FakeSB
+from pdf_memo import PdfMemo
+from plan_archive import BUCKET_PLANS, pack
+
+try:
+    from plan_pdf import fetch_plan_pdf, pdf_memo_key
+except StreamlitSecretNotFoundError:
+    pytest.skip("sem .streamlit/secrets.toml", allow_module_level=True)
+
+PJ = {"ctx": {"tema": "Frações"}, "plano": {"objetivos": ["somar"]}}
+
+
+class Pool:
+    def __init__(self, pdf=b"%PDF-render"):
+        self.pdf = pdf
+        self.calls = []
+
+    def render(self, ctx, plano, **kw):
+        self.calls.append((ctx, plano, kw))
+        return self.pdf
+
+
+@pytest.fixture
+def sb():
+    return FakeSB({"user_plans": [
+        {"id": 1, "user_key": "u1", "pdf_b64": base64.b64encode(b"%PDF-guardado").decode(),
+         "plan_json": PJ, "archive_path": None},
+        {"id": 2, "user_key": "u1", "pdf_b64": None, "plan_json": json.dumps(PJ), "archive_path": None},
+        {"id": 3, "user_key": "u2", "pdf_b64": None, "plan_json": None, "archive_path": "archive/2024-01/3.json.gz"},
+        {"id": 4, "user_key": "u1", "pdf_b64": None, "plan_json": None, "archive_path": None},
+    ]})
+
+
+def test_pdf_guardado(sb):
+    pool = Pool()
+    assert fetch_plan_pdf(sb, 1, PdfMemo(), pool) == b"%PDF-guardado"
+    assert pool.calls == []
+
+
+def test_render_a_pedido_uma_vez(sb):
+    memo, pool = PdfMemo(), Pool()
+    assert fetch_plan_pdf(sb, 2, memo, pool) == b"%PDF-render"
+    assert fetch_plan_pdf(sb, 2, memo, pool) == b"%PDF-render"
+    assert len(pool.calls) == 1
+    assert pool.calls[0][:2] == (PJ["ctx"], PJ["plano"])
+    assert memo.get(pdf_memo_key(2)) == b"%PDF-render"
+
+
+def test_arquivo_frio(sb):
+    sb.bucket(BUCKET_PLANS).upload("archive/2024-01/3.json.gz", pack({"plan_json": PJ, "pdf_b64": None}))
+    assert fetch_plan_pdf(sb, 3, PdfMemo(), Pool()) == b"%PDF-render"
+
+
+def test_dono_e_plano_inexistente(sb):
+    assert fetch_plan_pdf(sb, 3, PdfMemo(), Pool(), user_key="u1") is None
+    assert fetch_plan_pdf(sb, 99, PdfMemo(), Pool()) is None
+
+
+def test_sem_plan_json_nao_devolve_pdf_vazio(sb):
+    with pytest.raises(LookupError):
+        fetch_plan_pdf(sb, 4, PdfMemo(), Pool())
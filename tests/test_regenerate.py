@@ -0,0 +1,89 @@
+# test_regenerate.py
+# Regenerar um objectivo / uma linha do rascunho (app.py): chamada nova ao modelo a cada
+# pedido, nunca a resposta em cache de cached_generate.
+# app.py é o script da página (login, Secrets, Gemini no import): daqui só se carregam
+# as funções da regeneração, a partir do código-fonte, com um registo Gemini falso.
+
+import ast
+import json
+import os
+
+import pytest
+from pydantic import BaseModel, Field, conlist
+
+from plan_model import TABLE_COLS
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+FUNCS = {"safe_extract_json", "_ctx_resumo", "build_prompt_objetivo", "build_prompt_linha",
+         "regenerate_objetivo", "regenerate_linha", "generate_with_fallback"}
+CLASSES = {"ObjectivoRegenerado", "LinhaRegenerada"}
+
+CTX = {"disciplina": "Matemática", "classe": "6ª", "unidade": "Frações", "tema": "Soma",
+       "duracao": "45", "tipo_aula": "Nova"}
+PLAN = {"objetivo_geral": "Somar frações", "objetivos_especificos": ["Somar", "Comparar"],
+        "tabela": [["5", "Introdução e Motivação", "a", "b", "c", "d"],
+                   ["20", "Mediação e Assimilação", "a", "b", "c", "d"]]}
+
+
+class Registry:
+    def __init__(self, falha=()):
+        self.falha = set(falha)
+        self.calls = []
+
+    def generate(self, prompt, model_name, system_instruction=None):
+        self.calls.append(model_name)
+        if model_name in self.falha:
+            raise RuntimeError("quota")
+        n = len(self.calls)
+        if '"linha"' in prompt:
+            return json.dumps({"linha": ["99", "Outra", f"prof {n}", f"aluno {n}", "m", "x"]})
+        return f'Resposta: {{"objetivo": "objectivo {n}"}}'
+
+
+def cached_generate(*a, **k):
+    raise AssertionError("regenerar não pode usar cached_generate")
+
+
+@pytest.fixture
+def app():
+    tree = ast.parse(open(APP, encoding="utf-8").read())
+    nodes = [n for n in tree.body
+             if (isinstance(n, ast.FunctionDef) and n.name in FUNCS)
+             or (isinstance(n, ast.ClassDef) and n.name in CLASSES)]
+    assert {n.name for n in nodes} == FUNCS | CLASSES
+    for n in nodes:
+        n.decorator_list = []
+    reg = Registry()
+    ns = {"json": json, "BaseModel": BaseModel, "Field": Field, "conlist": conlist, "TABLE_COLS": TABLE_COLS,
+          "GEMINI_MODELS": ["models/m1", "models/m2"], "cached_generate": cached_generate,
+          "gemini_registry": lambda: reg, "reg": reg}
+    # generate_with_fallback usa cached_generate como valor por omissão: tem de existir antes
+    exec(compile(ast.Module(body=nodes, type_ignores=[]), APP, "exec"), ns)
+    return ns
+
+
+def test_regenerar_objectivo_chama_o_modelo_de_novo(app):
+    a = app["regenerate_objetivo"](CTX, PLAN, 1)
+    b = app["regenerate_objetivo"](CTX, PLAN, 1)
+    assert (a, b) == ("objectivo 1", "objectivo 2")
+    assert app["reg"].calls == ["models/m1", "models/m1"]
+
+
+def test_regenerar_com_modelo_alternativo(app):
+    app["reg"].falha.add("models/m1")
+    assert app["regenerate_objetivo"](CTX, PLAN, 0) == "objectivo 2"
+    assert app["reg"].calls == ["models/m1", "models/m2"]
+
+
+def test_regenerar_linha_mantem_tempo_e_funcao(app):
+    nova = app["regenerate_linha"](CTX, PLAN, 1)
+    assert nova[:2] == ["20", "Mediação e Assimilação"]
+    assert nova[2:4] == ["prof 1", "aluno 1"]
+    assert app["regenerate_linha"](CTX, PLAN, 1)[2] == "prof 2"
+
+
+def test_prompts(app):
+    p = app["build_prompt_objetivo"](CTX, PLAN, 1)
+    assert "Objectivo a substituir: Comparar" in p and "- Somar" in p
+    p = app["build_prompt_linha"](CTX, PLAN, 0)
+    assert "Mediação e Assimilação" in p and "Tempo: 5" in p
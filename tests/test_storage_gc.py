@@ -0,0 +1,100 @@
+# test_storage_gc.py
+# storage_gc.run_jobs (fila de sql/007) e storage_gc.reconcile (bucket vs user_plans).
+
+import pytest
+
+import storage_gc
+from fake_sb import FakeSB
+
+OLD = "2020-01-01T00:00:00Z"
+
+
+def job(i, path, bucket="plans"):
+    return {"id": i, "bucket": bucket, "path": path, "done_at": None, "error": None}
+
+
+@pytest.fixture
+def sb():
+    sb = FakeSB({
+        "user_plans": [
+            {"id": 1, "pdf_path": "u1/1.pdf", "archive_path": None},
+            {"id": 2, "pdf_path": None, "archive_path": "archive/2024-01/2.json.gz"},
+            {"id": 3, "pdf_path": None, "archive_path": None},
+        ],
+        "storage_gc_jobs": [],
+    })
+    b = sb.bucket("plans")
+    for p in ["u1/1.pdf", "u1/old.pdf", "u2/sub/x.pdf", "archive/2024-01/2.json.gz", "archive/2024-01/9.json.gz", "exports/a.zip"]:
+        b.put(p, b"%PDF" + p.encode(), OLD)
+    b.put("u3/fresh.pdf", b"novo")
+    b.put("exports/fresh.zip", b"zip")
+    return sb
+
+
+def test_run_jobs_remove_so_o_que_nao_esta_em_uso(sb):
+    sb.rows("storage_gc_jobs").extend([
+        job(1, "u1/old.pdf"), job(2, "u1/1.pdf"),
+        job(3, "archive/2024-01/2.json.gz"), job(4, "archive/2024-01/9.json.gz"),
+    ])
+    stats = storage_gc.run_jobs(sb, batch=3, dry_run=False)
+    assert stats == {"trabalhos": 4, "ficheiros": 2, "falhas": 0}
+    assert sorted(sb.bucket("plans").removed) == ["archive/2024-01/9.json.gz", "u1/old.pdf"]
+    assert all(j["done_at"] for j in sb.rows("storage_gc_jobs"))
+    assert storage_gc.run_jobs(sb, batch=3, dry_run=False)["trabalhos"] == 0
+
+
+def test_run_jobs_falha_fica_pendente(sb):
+    sb.rows("storage_gc_jobs").append(job(1, "u1/old.pdf"))
+    sb.bucket("plans").fail_remove = True
+    assert storage_gc.run_jobs(sb, batch=10, dry_run=False)["falhas"] == 1
+    j = sb.rows("storage_gc_jobs")[0]
+    assert j["done_at"] is None and "storage indisponível" in j["error"]
+    sb.bucket("plans").fail_remove = False
+    assert storage_gc.run_jobs(sb, batch=10, dry_run=False)["ficheiros"] == 1
+    assert sb.rows("storage_gc_jobs")[0]["done_at"]
+
+
+def test_run_jobs_dry_run_nao_altera_nada(sb):
+    sb.rows("storage_gc_jobs").append(job(1, "u1/old.pdf"))
+    assert storage_gc.run_jobs(sb, batch=10, dry_run=True)["ficheiros"] == 1
+    assert sb.bucket("plans").removed == []
+    assert sb.rows("storage_gc_jobs")[0]["done_at"] is None
+
+
+def test_run_jobs_sem_fila():
+    sb = FakeSB({"user_plans": []}, missing={"storage_gc_jobs"})
+    assert storage_gc.run_jobs(sb, batch=10, dry_run=False)["trabalhos"] == 0
+
+
+def test_reconcile(sb, monkeypatch):
+    monkeypatch.setattr(storage_gc, "LIST_PAGE", 2)  # várias páginas por pasta
+    stats = storage_gc.reconcile(sb, batch=2, grace_h=24, exports_ttl_h=24, dry_run=False)
+    assert stats["objectos"] == 8
+    assert stats["orfaos"] == 3 and stats["exports"] == 1 and stats["falhas"] == 0
+    assert sorted(sb.bucket("plans").removed) == [
+        "archive/2024-01/9.json.gz", "exports/a.zip", "u1/old.pdf", "u2/sub/x.pdf",
+    ]
+    assert sorted(sb.bucket("plans").objects) == [
+        "archive/2024-01/2.json.gz", "exports/fresh.zip", "u1/1.pdf", "u3/fresh.pdf",
+    ]
+
+
+def test_reconcile_dry_run(sb):
+    stats = storage_gc.reconcile(sb, batch=100, grace_h=24, exports_ttl_h=24, dry_run=True)
+    assert stats["orfaos"] == 3 and stats["bytes_orfaos"] > 0
+    assert sb.bucket("plans").removed == []
+
+
+def test_reconcile_sem_archive_path_nao_toca_no_arquivo(sb, monkeypatch):
+    for r in sb.rows("user_plans"):
+        del r["archive_path"]
+
+    def referenced_paths(sb, col="pdf_path", page=1000):
+        if col != "pdf_path":
+            raise RuntimeError('column "archive_path" does not exist')
+        return {"u1/1.pdf"}
+
+    monkeypatch.setattr(storage_gc, "referenced_paths", referenced_paths)
+    storage_gc.reconcile(sb, batch=100, grace_h=24, exports_ttl_h=24, dry_run=False)
+    assert not any(p.startswith("archive/") for p in sb.bucket("plans").removed)
+    assert "u1/old.pdf" in sb.bucket("plans").removed
@@ -15,6 +15,14 @@ def supa():
     )
 
 
+# ----------------
+# Secrets
+# ----------------
+def secret_flag(name: str, default: bool = False) -> bool:
+    # secrets escritos como texto ("false", "0") também desligam
+    return str(st.secrets.get(name, default)).strip().lower() in ("1", "true", "yes", "sim", "on")
+
+
 # ----------------
 # Normalização
 # ----------------